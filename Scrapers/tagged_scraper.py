@@ -1,4 +1,7 @@
 import json
+import os
+import re
+import hashlib
 from pprint import pprint
 import time
 import requests
@@ -7,43 +10,147 @@ import random
 import logging
 import traceback
 from mysql.connector import Error
-import mysql.connector
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 import threading
-from mysql.connector.pooling import MySQLConnectionPool
 from db_utils import (
     get_database_connection,
+    get_pool,
     get_accounts_from_database,
     prepare_account_data,
     update_account_last_checked,
-    mark_account_invalid
+    mark_account_invalid,
+    bulk_lookup,
+    bulk_upsert
 )
+from metrics import REGISTRY, SummaryReporter, record_writer_stats
+from write_behind import WriteBehindQueue
+from state_journal import JournaledIdSet
+from feed_cache import FeedCache
+from log_setup import setup_logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class TagTargetIndex:
+    """Target accounts a post can be attributed to, matched in one pass per post.
+
+    Tags and coauthors are looked up in a set of target IDs; caption mentions
+    are found with one precompiled alternation over every target username.
+    """
+
+    def __init__(self, targets):
+        self.targets = {str(target_id): target_username.lower() for target_id, target_username in targets.items()}
+        self.username_to_id = {target_username: target_id for target_id, target_username in self.targets.items()}
+        # Longest names first, and a mention must not continue into a longer handle
+        usernames = sorted(self.username_to_id, key=len, reverse=True)
+        self.mention_pattern = re.compile(
+            '@(' + '|'.join(re.escape(username) for username in usernames) + r')(?![a-z0-9_]|\.[a-z0-9_])'
+        )
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __iter__(self):
+        return iter(self.targets)
+
+    def match_ids(self, ids):
+        return {str(id_) for id_ in ids} & self.targets.keys()
+
+    def match_mentions(self, text):
+        return {self.username_to_id[username] for username in self.mention_pattern.findall(text.lower())}
+
+    def match_post(self, post):
+        """Return the IDs of every target the post tags, coauthors with or mentions."""
+        if not isinstance(post, dict):
+            logger.warning("Invalid post data structure")
+            return set()
+
+        # Check 'usertags'
+        usertags = (post.get('usertags') or {}).get('in', [])
+        matched = self.match_ids(tag['user']['pk'] for tag in usertags)
+
+        # Check 'coauthor_producers' and 'invited_coauthor_producers'
+        coauthors = (post.get('coauthor_producers') or []) + (post.get('invited_coauthor_producers') or [])
+        matched |= self.match_ids(coauthor['id'] for coauthor in coauthors)
+
+        # Check mentions in 'caption'
+        caption = post.get('caption')
+        if caption and isinstance(caption, dict):
+            caption_text = caption.get('text') or ''
+            if caption_text:
+                matched |= self.match_mentions(caption_text)
+        # If 'caption' is None or not a dict, skip this check
+
+        return matched
+
+    def match_feed(self, posts):
+        """Group a feed's post IDs by the targets they tag: {target_user_id: [post_id, ...]}."""
+        tagged_posts = {}
+        for post in posts:
+            if not post:
+                logger.warning("Encountered None post in feed")
+                continue
+            for target_id in self.match_post(post):
+                tagged_posts.setdefault(target_id, []).append(post['id'])
+        return tagged_posts
+
+_worker_target_index = None
+_worker_feed_cache = None
+
+def _init_reanalysis_worker(targets, feed_cache):
+    global _worker_target_index, _worker_feed_cache
+    _worker_target_index = TagTargetIndex(targets)
+    _worker_feed_cache = feed_cache
+
+def _reanalyze_cached_feed(user_id):
+    items = _worker_feed_cache.latest(user_id)
+    if items is None:
+        return user_id, None
+    return user_id, _worker_target_index.match_feed(items)
+
 class InstagramTaggedScraper:
-    def __init__(self, user_data, target_user_id, target_username, csv_filename, account_data, db_config):
+    def __init__(self, user_data, target_user_id, target_username, csv_filename, account_data, db_config, metrics=None, targets=None, feed_cache=None,
+                 work_queue=None, run_id=None):
         self.user_data = user_data
         self.target_user_id = str(target_user_id)
         self.target_username = target_username.lower()
+        # Extra {target_user_id: target_username} campaigns verified from the same feed fetches
+        self.target_index = TagTargetIndex({**(targets or {}), self.target_user_id: self.target_username})
         self.csv_filename = csv_filename
         self.account_data = json.loads(account_data)
         self.db_config = json.loads(db_config)
-        self.db_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="mypool", pool_size=5, **self.db_config)
+        # One connection per request thread, plus one for the write-behind flush
+        self.db_pool = get_pool(self.db_config, workers=len(self.account_data) + 1)
         self.account_id_to_index = {}
         self.setup_accounts()
         self.account_timeouts = {}
         self.account_lock = threading.Lock()
         self.processed_users = set()
-        self.tagged_posts = {}
+        self.tagged_posts = {}  # user_id -> {target_user_id: [post_id, ...]}
         self.last_response_text = ""
         self.account_jitter_info = {}
         self.successful_fetches = 0
         self.user_tried_accounts = {}
-        self.successful_taggers = set()
+        self.successful_taggers = set()  # Users tagging any target
+        self.taggers_by_target = {target_id: set() for target_id in self.target_index}
+        self.metrics = metrics or REGISTRY
+        self.metric_labels = {'target': self.target_user_id}
+        self.requests_counter = self.metrics.counter('tagged_feed_requests_total', 'User feed requests by outcome')
+        self.request_latency = self.metrics.histogram('tagged_feed_request_seconds', 'User feed request latency')
+        self.summary_interval = 60
+        # Users whose results are committed in this run, so a restart with the same run_id (by default
+        # the results CSV) skips them. Removed once the run completes; later runs check everyone again.
+        self.run_id = run_id or os.path.splitext(os.path.basename(self.csv_filename))[0]
+        # With a shared work queue the jobs table is the resume state, so the set stays in memory
+        run_key = hashlib.sha1(','.join([self.run_id, *sorted(self.target_index)]).encode('utf-8')).hexdigest()[:12]
+        self.verified_users = JournaledIdSet(f'Files/States/tagged_{run_key}_verified_users' if work_queue is None else None)
+        self.checkpoint_users = True  # Off for offline re-analysis, which must not touch the run's checkpoint
+        self.feed_cache = feed_cache or FeedCache()
+        self.work_queue = work_queue  # Shares the feed fetches with other workers when set
+        self.results_file = None
+        self.results_writer = None
+        self.result_writer = WriteBehindQueue(self.save_user_results, name=f"tagged-{self.target_user_id}", batch_size=200)
+        self.metrics.register_collector(self.collect_metrics)
 
     def setup_accounts(self):
         for i, account in enumerate(self.account_data):
@@ -61,7 +168,7 @@ class InstagramTaggedScraper:
                     soonest_available = min(self.account_timeouts.values())
                     wait_time = max(0, (soonest_available - current_time).total_seconds())
                     if wait_time > 0:
-                        logger.info(f"All accounts on timeout. Waiting {wait_time:.2f} seconds for next available account.")
+                        logger.info("All accounts on timeout. Waiting %.2f seconds for next available account.", wait_time)
                         self.display_account_status()
                         time.sleep(wait_time)
                     available_accounts = [account for account in self.account_data 
@@ -74,6 +181,16 @@ class InstagramTaggedScraper:
             
             return None
 
+    def collect_metrics(self):
+        current_time = datetime.now()
+        with self.account_lock:
+            cooling_down = sum(1 for timeout in self.account_timeouts.values() if current_time <= timeout)
+        self.metrics.gauge('accounts_available', 'Accounts able to make a request now').set(len(self.account_data) - cooling_down, scraper='tagged')
+        self.metrics.gauge('accounts_cooling_down', 'Accounts on timeout').set(cooling_down, scraper='tagged')
+        self.metrics.gauge('tagged_users_processed', 'Processed users').set(len(self.processed_users), **self.metric_labels)
+        record_writer_stats(self.metrics, self.result_writer)
+        self.metrics.gauge('tagged_users_found', 'Users with posts tagging the target').set(len(self.successful_taggers), **self.metric_labels)
+
     def display_account_status(self):
         current_time = datetime.now()
         active_accounts = []
@@ -88,7 +205,7 @@ class InstagramTaggedScraper:
                     cooldown_accounts[account_id] = self.account_timeouts[account_id]
         
         logger.info("Account Status:")
-        logger.info(f"Active accounts: {', '.join(map(str, active_accounts))}")
+        logger.info("Active accounts: %s", ', '.join(map(str, active_accounts)))
         
         if active_accounts:
             logger.info("Active account details:")
@@ -96,15 +213,15 @@ class InstagramTaggedScraper:
                 if account_id in self.account_jitter_info:
                     last_jitter_wait, last_jitter_time = self.account_jitter_info[account_id]
                     remaining_wait = max(0, last_jitter_wait - (time.time() - last_jitter_time))
-                    logger.info(f"  Account {account_id}: Jitter wait remaining: {remaining_wait:.2f} seconds")
+                    logger.info("  Account %s: Jitter wait remaining: %.2f seconds", account_id, remaining_wait)
                 else:
-                    logger.info(f"  Account {account_id}: No current jitter wait")
+                    logger.info("  Account %s: No current jitter wait", account_id)
         
         if cooldown_accounts:
             logger.info("Accounts in cooldown:")
             for account_id, timeout in cooldown_accounts.items():
                 remaining_time = max(0, (timeout - current_time).total_seconds())
-                logger.info(f"  Account {account_id}: {remaining_time:.2f} seconds remaining")
+                logger.info("  Account %s: %.2f seconds remaining", account_id, remaining_time)
         else:
             logger.info("No accounts in cooldown")
 
@@ -124,13 +241,13 @@ class InstagramTaggedScraper:
             cursor.execute(query, (account_id,))
             result = cursor.fetchone()
             if result:
-                logger.debug(f"Retrieved latest cookie for account ID {account_id}")
+                logger.debug("Retrieved latest cookie for account ID %s", account_id)
                 return result['cookies']
             else:
-                logger.debug(f"No cookie found for account ID {account_id}")
+                logger.debug("No cookie found for account ID %s", account_id)
                 return None
         except Error as e:
-            logger.error(f"Error fetching new cookie from database: {e}")
+            logger.error("Error fetching new cookie from database: %s", e)
         finally:
             if cursor:
                 cursor.close()
@@ -140,15 +257,15 @@ class InstagramTaggedScraper:
 
     def check_and_update_cookie(self, account):
         account_id = account['id']
-        logger.debug(f"Checking for new cookie for account ID {account_id}")
+        logger.debug("Checking for new cookie for account ID %s", account_id)
         new_cookie = self.get_new_cookie_from_db(account_id, account['cookies'])
         if new_cookie and new_cookie != account['cookies']:
-            logger.info(f"New cookie found for account ID {account_id}. Updating.")
-            logger.info(f'New cookie: {new_cookie}')
-            logger.info(f'Current cookie: {account["cookies"]}')
+            logger.info("New cookie found for account ID %s. Updating.", account_id)
+            logger.info("New cookie: %s", new_cookie)
+            logger.info("Current cookie: %s", account["cookies"])
             account['cookies'] = new_cookie
         else:
-            logger.debug(f"No new cookie found for account ID {account_id}")
+            logger.debug("No new cookie found for account ID %s", account_id)
         return account
 
     def fetch_user_posts(self, user_id, account):
@@ -174,59 +291,42 @@ class InstagramTaggedScraper:
         }
 
         try:
-            response = requests.get(url, headers=headers, cookies=cookies, proxies=proxies)
+            with self.request_latency.time(**self.metric_labels):
+                response = requests.get(url, headers=headers, cookies=cookies, proxies=proxies)
+            self.requests_counter.inc(status=str(response.status_code), **self.metric_labels)
             if response.status_code == 200:
                 data = response.json()
                 # print(f'Posts for user {user_id}:')
                 # pprint(data)
                 return data['items']  # Return full post data
             else:
-                logger.warning(f"Failed to fetch posts for user {user_id}. Status code: {response.status_code}")
+                logger.warning("Failed to fetch posts for user %s. Status code: %s", user_id, response.status_code)
                 return None
         except Exception as e:
-            logger.error(f"Error occurred while fetching posts for user {user_id}: {str(e)}")
+            self.requests_counter.inc(status='error', **self.metric_labels)
+            logger.error("Error occurred while fetching posts for user %s: %s", user_id, str(e))
             return None
 
     def check_post_for_tag_in_post_data(self, post):
-        if not isinstance(post, dict):
-            logger.warning("Invalid post data structure")
-            return False
-
-        # Check 'usertags'
-        usertags = post.get('usertags', {}).get('in', [])
-        for tag in usertags:
-            tagged_user_id = str(tag['user']['pk'])
-            if tagged_user_id == self.target_user_id:
-                return True
-
-        # Check 'coauthor_producers' and 'invited_coauthor_producers'
-        coauthors = post.get('coauthor_producers', []) + post.get('invited_coauthor_producers', [])
-        for coauthor in coauthors:
-            coauthor_id = str(coauthor['id'])
-            if coauthor_id == self.target_user_id:
-                return True
-
-        # Check mentions in 'caption'
-        caption = post.get('caption')
-        if caption and isinstance(caption, dict):
-            caption_text = caption.get('text', '')
-            if f"@{self.target_username}" in caption_text.lower():
-                return True
-        # If 'caption' is None or not a dict, skip this check
-
-        return False
+        return self.target_index.match_post(post)
 
     def process_single_user(self, user_id):
         username = self.user_data.get(user_id, "Unknown")
-        logger.info(f"Processing user ID {user_id} (Username: {username})")
+        logger.info("Processing user ID %s (Username: %s)", user_id, username)
         
         if user_id in self.processed_users:
-            logger.info(f"User ID {user_id} (Username: {username}) already processed. Skipping.")
+            logger.info("User ID %s (Username: %s) already processed. Skipping.", user_id, username)
+            self.finish_job(user_id, completed=True)
+            return
+        if self.is_verified(user_id):
+            logger.debug("User ID %s (Username: %s) verified before this run was restarted. Skipping.", user_id, username)
+            self.finish_job(user_id, completed=True)
             return
 
         account = self.get_next_available_account()
         if not account:
-            logger.error(f"No available accounts to process user ID {user_id} (Username: {username})")
+            logger.error("No available accounts to process user ID %s (Username: %s)", user_id, username)
+            self.finish_job(user_id, completed=False)
             return
 
         max_retries = 5
@@ -235,112 +335,159 @@ class InstagramTaggedScraper:
 
         while retries < max_retries:
             if account['id'] in self.user_tried_accounts[user_id]:
-                logger.info(f"Account {account['id']} already tried for user ID {user_id} (Username: {username}), looking for another account")
+                logger.info("Account %s already tried for user ID %s (Username: %s), looking for another account", account['id'], user_id, username)
                 account = self.get_next_available_account()
                 if not account:
-                    logger.error(f"No available accounts to process user ID {user_id} (Username: {username})")
+                    logger.error("No available accounts to process user ID %s (Username: %s)", user_id, username)
+                    self.finish_job(user_id, completed=False)
                     return
 
             try:
-                self.display_account_status()
                 posts = self.fetch_user_posts(user_id, account)
                 if posts is None:
-                    logger.warning(f"Failed to fetch posts for user ID {user_id} (Username: {username})")
+                    logger.warning("Failed to fetch posts for user ID %s (Username: %s)", user_id, username)
                     self.set_account_timeout(account['id'])
                 else:
-                    tagged_posts = []
-                    for post in posts:
-                        if not post:
-                            logger.warning(f"Encountered None post in posts for user ID {user_id} (Username: {username})")
-                            continue
-                        if self.check_post_for_tag_in_post_data(post):
-                            tagged_posts.append(post['id'])
+                    self.feed_cache.put(user_id, posts)
+                    tagged_posts = self.target_index.match_feed(posts)
                     
                     if tagged_posts:
-                        self.tagged_posts[user_id] = tagged_posts
-                        self.successful_taggers.add(user_id)
-                        logger.info(f"User ID {user_id} (Username: {username}) has {len(tagged_posts)} posts tagging the target user")
+                        self.record_tagged_posts(user_id, tagged_posts)
+                        logger.info("User ID %s (Username: %s) has posts tagging %s target(s): %s", user_id, username, len(tagged_posts), ', '.join(f'{target_id} ({len(post_ids)})' for target_id, post_ids in tagged_posts.items()))
                     else:
-                        logger.info(f"User ID {user_id} (Username: {username}) has no posts tagging the target user")
+                        logger.info("User ID %s (Username: %s) has no posts tagging any target", user_id, username)
                     
                     self.processed_users.add(user_id)
+                    self.result_writer.put((user_id, tagged_posts))
                     with self.account_lock:
                         self.successful_fetches += 1
-                    logger.info(f"Successfully processed user ID {user_id} (Username: {username})")
+                    logger.info("Successfully processed user ID %s (Username: %s)", user_id, username)
                     self.wait_with_jitter(account['id'])
                     return
             except Exception as e:
-                logger.error(f"Error occurred while scraping user ID {user_id} (Username: {username}): {str(e)}")
+                logger.error("Error occurred while scraping user ID %s (Username: %s): %s", user_id, username, str(e))
                 logger.error(traceback.format_exc())
                 self.set_account_timeout(account['id'])
 
             self.wait_with_jitter(account['id'])
             retries += 1
 
-        logger.error(f"Max retries reached for user ID {user_id} (Username: {username}). Skipping.")
+        logger.error("Max retries reached for user ID %s (Username: %s). Skipping.", user_id, username)
+        self.finish_job(user_id, completed=False)
+
+    def finish_job(self, user_id, completed):
+        """Report a claimed user back to the shared work queue, if there is one."""
+        if self.work_queue is None:
+            return
+        if completed:
+            self.work_queue.complete([user_id])
+        else:
+            self.work_queue.release([user_id], "no feed fetched")
 
     def set_account_timeout(self, account_id):
         timeout_until = datetime.now() + timedelta(minutes=5)
         with self.account_lock:
             self.account_timeouts[account_id] = timeout_until
-        logger.info(f"Account {account_id} set on timeout until {timeout_until}")
+        logger.info("Account %s set on timeout until %s", account_id, timeout_until)
         self.display_account_status()
 
     def wait_with_jitter(self, account_id):
         activity_type = random.choices(['quick', 'normal', 'engaged'], weights=[0.3, 0.5, 0.2])[0]
         
         if activity_type == 'quick':
-            jitter = np.random.exponential(scale=2)
+            jitter = random.expovariate(1 / 2)
         elif activity_type == 'normal':
-            jitter = np.random.normal(loc=10, scale=5)
+            jitter = random.gauss(10, 5)
         else:  # engaged
-            jitter = np.random.normal(loc=30, scale=10)
+            jitter = random.gauss(30, 10)
 
         if random.random() < 0.1:
-            jitter += np.random.uniform(60, 300)
+            jitter += random.uniform(60, 300)
 
         jitter = max(jitter, 15)
 
-        logger.info(f"Waiting for {jitter:.2f} seconds for account {account_id}.")
+        logger.info("Waiting for %.2f seconds for account %s.", jitter, account_id)
         self.account_jitter_info[account_id] = (jitter, time.time())
         time.sleep(jitter)
 
     def scrape_tagged_posts(self):
         start_time = time.time()
         total_users = len(self.user_data)
-        processed_count = 0
+        self.prepare_results()
+        pending_users = [user_id for user_id in self.user_data if not self.is_verified(user_id)]
+        processed_count = total_users - len(pending_users)
+        logger.info("Skipping %s users verified before run %s was restarted", processed_count, self.run_id)
+        reporter = SummaryReporter(self.metrics, interval=self.summary_interval).start()
 
         with ThreadPoolExecutor(max_workers=len(self.account_data)) as executor:
-            futures = [executor.submit(self.process_single_user, user_id) for user_id in self.user_data.keys()]
-            
-            total_to_process = len(futures)
-            for i, future in enumerate(as_completed(futures), 1):
+            if self.work_queue is not None:
+                self.work_queue.enqueue(pending_users)
+                futures = self.work_queue.run(executor, self.process_single_user, len(self.account_data))
+            else:
+                futures = as_completed([executor.submit(self.process_single_user, user_id) for user_id in pending_users])
+
+            for future in futures:
                 future.result()
                 processed_count += 1
-                
-                if i % 2 == 0 or i == total_to_process:
-                    self.display_account_status()
-                    self.display_progress(processed_count, total_users, start_time)
 
+        self.result_writer.close()
+        if self.work_queue is not None:
+            self.work_queue.close()
+        # The run is complete, so its checkpoint must not make a later run skip anyone
+        self.verified_users.clear()
+        reporter.stop()
+        self.metrics.unregister_collector(self.collect_metrics)
+        self.display_progress(processed_count, total_users, start_time)
+        self.save_results()
+        logger.info("Scraping completed. Processed %s user IDs.", len(self.processed_users))
+        self.display_tagging_summary()
+
+    def reanalyze_cached_feeds(self, workers=None):
+        """Re-run tag detection over cached feeds only, on every CPU core, without any requests.
+
+        Use after changing the match rules. Users without a cached feed inside
+        the cache TTL are left out. Results replace this run's in-memory view and
+        are upserted like a live run, but rows written under older rules are
+        not deleted.
+        """
+        self.checkpoint_users = False
+        self.prepare_results(restore=False)
+        user_ids = list(self.user_data)
+        missing = 0
+        with ProcessPoolExecutor(
+            max_workers=workers or os.cpu_count(),
+            initializer=_init_reanalysis_worker,
+            initargs=(self.target_index.targets, self.feed_cache)
+        ) as executor:
+            for user_id, tagged_posts in executor.map(_reanalyze_cached_feed, user_ids, chunksize=64):
+                if tagged_posts is None:
+                    missing += 1
+                    continue
+                if tagged_posts:
+                    self.record_tagged_posts(user_id, tagged_posts)
+                self.processed_users.add(user_id)
+                self.result_writer.put((user_id, tagged_posts))
+        self.result_writer.close()
+        self.metrics.unregister_collector(self.collect_metrics)
+        logger.info("Re-analyzed %s cached feeds; %s users have no cached feed within the TTL", len(self.processed_users), missing)
         self.save_results()
-        logger.info(f"Scraping completed. Processed {len(self.processed_users)} user IDs.")
         self.display_tagging_summary()
 
     def display_progress(self, processed_count, total_users, start_time):
         elapsed_time = time.time() - start_time
         progress_percentage = (processed_count / total_users) * 100
         
-        logger.info(f"Progress: {processed_count}/{total_users} ({progress_percentage:.2f}%)")
+        logger.info("Progress: %s/%s (%.2f%%)", processed_count, total_users, progress_percentage)
 
         if elapsed_time > 0:
             overall_rate = self.successful_fetches / elapsed_time
-            logger.info(f"Overall processing rate: {overall_rate:.2f} successful users/second")
-            logger.info(f"Total successful fetches: {self.successful_fetches}")
+            logger.info("Overall processing rate: %.2f successful users/second", overall_rate)
+            logger.info("Total successful fetches: %s", self.successful_fetches)
             
             if overall_rate > 0:
                 remaining_users = total_users - self.successful_fetches
                 estimated_time_remaining = remaining_users / overall_rate
-                logger.info(f"Estimated time remaining: {timedelta(seconds=int(estimated_time_remaining))}")
+                logger.info("Estimated time remaining: %s", timedelta(seconds=int(estimated_time_remaining)))
             else:
                 logger.info("Estimated time remaining: Unable to calculate (processing rate is 0)")
         else:
@@ -349,8 +496,8 @@ class InstagramTaggedScraper:
         unsuccessful_attempts = processed_count - self.successful_fetches
         if unsuccessful_attempts > 0:
             unsuccessful_rate = unsuccessful_attempts / elapsed_time
-            logger.info(f"Unsuccessful attempts: {unsuccessful_attempts}")
-            logger.info(f"Unsuccessful rate: {unsuccessful_rate:.2f} users/second")
+            logger.info("Unsuccessful attempts: %s", unsuccessful_attempts)
+            logger.info("Unsuccessful rate: %.2f users/second", unsuccessful_rate)
 
     def create_tagged_posts_table(self, connection):
         cursor = None
@@ -371,62 +518,113 @@ class InstagramTaggedScraper:
             connection.commit()
             logger.info("Tagged posts table created or already exists")
         except Error as e:
-            logger.error(f"Error creating tagged_posts table: {e}")
+            logger.error("Error creating tagged_posts table: %s", e)
         finally:
             if cursor:
                 cursor.close()
 
-    def save_results(self):
+    def is_verified(self, user_id):
+        return str(user_id).isdigit() and user_id in self.verified_users
+
+    def prepare_results(self, restore=True):
+        """Create the table, restore results of users verified before a restart and open the results CSV."""
         connection = None
-        cursor = None
         try:
             connection = self.db_pool.get_connection()
-            
-            # Create the table if it doesn't exist
             self.create_tagged_posts_table(connection)
-            
-            cursor = connection.cursor()
-
-            query = """
-            INSERT INTO tagged_posts (user_id, post_id, target_user_id, csv_filename)
-            VALUES (%s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE post_id = VALUES(post_id)
-            """
-
-            for user_id, posts in self.tagged_posts.items():
-                for post_id in posts:
-                    cursor.execute(query, (user_id, post_id, self.target_user_id, self.csv_filename))
-
-            connection.commit()
-            logger.info(f"Saved {sum(len(posts) for posts in self.tagged_posts.values())} tagged posts to database")
+        except Error as e:
+            logger.error("Error connecting to database: %s", e)
+        finally:
+            if connection:
+                connection.close()
 
+        restored_rows = []
+        if restore and len(self.verified_users):
+            try:
+                rows = bulk_lookup(self.db_pool.get_connection, 'tagged_posts', 'target_user_id', list(self.target_index),
+                                   ('user_id', 'post_id', 'target_user_id', 'csv_filename'))
+            except Error:
+                rows = []
+            for user_id, post_id, target_id, csv_filename in rows:
+                if csv_filename == self.csv_filename and user_id in self.user_data and self.is_verified(user_id):
+                    self.record_tagged_posts(user_id, {target_id: [post_id]})
+                    restored_rows.append((user_id, post_id, target_id))
+            logger.info("Restored %s tagged posts for %s previously verified users", len(restored_rows), len(self.verified_users))
+
+        is_new = not os.path.exists(self.csv_filename) or os.path.getsize(self.csv_filename) == 0
+        self.results_file = open(self.csv_filename, 'a', newline='')
+        self.results_writer = csv.writer(self.results_file)
+        if is_new:
+            self.results_writer.writerow(['User ID', 'Post ID', 'Target User ID'])
+            self.results_writer.writerows(restored_rows)
+            self.results_file.flush()
+
+    def record_tagged_posts(self, user_id, tagged_posts):
+        user_posts = self.tagged_posts.setdefault(user_id, {})
+        for target_id, post_ids in tagged_posts.items():
+            user_posts.setdefault(target_id, []).extend(post_ids)
+            self.taggers_by_target.setdefault(target_id, set()).add(user_id)
+        self.successful_taggers.add(user_id)
+
+    def save_user_results(self, batch):
+        """Write-behind flush: upsert the batch's tagged posts, append them to the CSV, then checkpoint the users."""
+        rows = [
+            (user_id, post_id, target_id, self.csv_filename)
+            for user_id, tagged_posts in batch
+            for target_id, post_ids in tagged_posts.items()
+            for post_id in post_ids
+        ]
+        connection = None
+        try:
+            connection = self.db_pool.get_connection()
+            # Claim posts recorded by an earlier campaign for this run, so prepare_results restores them
+            bulk_upsert(connection, 'tagged_posts', ('user_id', 'post_id', 'target_user_id', 'csv_filename'), rows,
+                        update_columns=('csv_filename',))
         except Error as e:
-            logger.error(f"Error saving results to database: {e}")
+            # Leave the users unverified so a restart fetches them again
+            logger.error("Error saving tagged posts for %s users: %s", len(batch), e)
+            if self.work_queue is not None:
+                self.work_queue.release([user_id for user_id, _ in batch], "database write failed")
+            return
         finally:
-            if cursor:
-                cursor.close()
             if connection:
                 connection.close()
 
-        with open(self.csv_filename, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['User ID', 'Post ID', 'Target User ID'])
-            for user_id, posts in self.tagged_posts.items():
-                for post_id in posts:
-                    writer.writerow([user_id, post_id, self.target_user_id])
-        logger.info(f"Saved results to CSV file: {self.csv_filename}")
+        if self.results_writer is not None:
+            self.results_writer.writerows(row[:3] for row in rows)
+            self.results_file.flush()
+        if self.checkpoint_users:
+            self.verified_users.update(user_id for user_id, _ in batch if str(user_id).isdigit())
+            self.verified_users.checkpoint()
+        if self.work_queue is not None:
+            self.work_queue.complete([user_id for user_id, _ in batch])
+
+    def save_results(self):
+        """Close the results CSV; rows were written to MySQL and the CSV as each batch was flushed."""
+        if self.results_file is not None:
+            self.results_file.close()
+            self.results_file = None
+            self.results_writer = None
+        logger.info("Saved %s tagged posts to database and CSV file: %s", self.tagged_post_count(), self.csv_filename)
+
+    def tagged_post_count(self, user_id=None):
+        users = [user_id] if user_id is not None else self.tagged_posts
+        return sum(len(post_ids) for user in users for post_ids in self.tagged_posts.get(user, {}).values())
 
     def display_tagging_summary(self):
         logger.info("=== Tagging Summary ===")
-        logger.info(f"Total users who tagged the target: {len(self.successful_taggers)}")
-        logger.info("Users who tagged the target:")
+        logger.info("Total users who tagged a target: %s", len(self.successful_taggers))
+        for target_id, taggers in self.taggers_by_target.items():
+            logger.info("Target %s (%s): %s users", target_id, self.target_index.targets[target_id], len(taggers))
+        logger.info("Users who tagged a target:")
         for user_id in self.successful_taggers:
             username = self.user_data.get(user_id, "Unknown")
-            post_count = len(self.tagged_posts.get(user_id, []))
-            logger.info(f"  - User ID: {user_id}, Username: {username}, Tagged Posts: {post_count}")
+            post_count = self.tagged_post_count(user_id)
+            logger.info("  - User ID: %s, Username: %s, Tagged Posts: %s", user_id, username, post_count)
 
 def main():
     import sys
+    setup_logging()
     if len(sys.argv) != 7:
         print("Usage: python tagged_scraper.py <user_data_json> <target_user_id> <target_username> <csv_filename> <account_data_json> <db_config_json>")
         sys.exit(1)
@@ -439,11 +637,11 @@ def main():
     db_config = sys.argv[6]
 
     scraper = InstagramTaggedScraper(user_data, target_user_id, target_username, csv_filename, account_data, db_config)
-    logger.info(f"Scraping tagged posts for {len(user_data)} users")
-    logger.info(f"Using accounts with IDs: {', '.join(str(id) for id in scraper.account_id_to_index.keys())}")
+    logger.info("Scraping tagged posts for %s users", len(user_data))
+    logger.info("Using accounts with IDs: %s", ', '.join(str(id) for id in scraper.account_id_to_index.keys()))
     scraper.display_account_status()
     scraper.scrape_tagged_posts()
-    logger.info(f"Number of successful taggers: {len(scraper.successful_taggers)}")
+    logger.info("Number of successful taggers: %s", len(scraper.successful_taggers))
 
 if __name__ == "__main__":
     main()
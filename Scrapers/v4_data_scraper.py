@@ -3,26 +3,31 @@ import json
 import random
 import time
 import logging
-import mysql.connector
 from mysql.connector import Error
 import traceback
-import gender_guesser.detector as gender
 import concurrent.futures
-import numpy as np
 from queue import Queue
 import threading
 from datetime import datetime, timedelta
 from collections import deque
-from mysql.connector.pooling import MySQLConnectionPool
 from db_utils import (
     get_database_connection,
+    get_pool,
     get_accounts_from_database,
     prepare_account_data,
     update_account_last_checked,
-    mark_account_invalid
+    mark_account_invalid,
+    bulk_upsert
 )
+from write_behind import WriteBehindQueue, WriteBehindError
+from payload_archive import PayloadArchive
+from state_journal import JournaledIdSet, write_json_atomic
+from profile_fields import PINNED_CHANNEL_FIELDS, bio_link_urls, compile_extractor, pinned_channels
+import gender_service
+from metrics import REGISTRY, SummaryReporter, record_writer_stats
+from work_queue import WorkQueue
+from log_setup import setup_logging
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class CookieState:
@@ -56,15 +61,15 @@ class CookieState:
     def calculate_jitter(self):
         activity_type = random.choices(['quick', 'normal', 'engaged'], weights=[0.3, 0.5, 0.2])[0]
         if activity_type == 'quick':
-            jitter = np.random.exponential(scale=10)
+            jitter = random.expovariate(1 / 10)
         elif activity_type == 'normal':
-            jitter = np.random.normal(loc=50, scale=25)
+            jitter = random.gauss(50, 25)
         else:  # engaged
-            jitter = np.random.normal(loc=150, scale=50)
+            jitter = random.gauss(150, 50)
         if random.random() < 0.1:
-            jitter += np.random.uniform(300, 1500)
+            jitter += random.uniform(300, 1500)
         jitter = max(jitter, 15)  # Ensure a minimum wait time of 15 seconds
-        logger.info(f"Calculated jitter of {jitter:.2f} seconds for account {self.account_id}.")
+        logger.info("Calculated jitter of %.2f seconds for account %s.", jitter, self.account_id)
         return jitter
 
     def set_rate_limit(self):
@@ -91,17 +96,41 @@ class CookieState:
             return max(0, self.rate_limit_until - current_time)
         return max(0, self.next_available_time - current_time)
 
+USER_COLUMNS = (
+    'user_id', 'username', 'full_name', 'biography', 'follower_count', 'following_count',
+    'media_count', 'is_private', 'is_verified', 'category', 'external_url',
+    'public_email', 'public_phone_number', 'is_business', 'profile_pic_url',
+    'hd_profile_pic_url', 'has_highlight_reels', 'has_guides',
+    'is_interest_account', 'total_igtv_videos', 'total_clips_count',
+    'total_ar_effects', 'is_eligible_for_smb_support_flow',
+    'is_eligible_for_lead_center', 'account_type', 'is_call_to_action_enabled',
+    'interop_messaging_user_fbid', 'has_videos', 'total_video_count',
+    'has_music_on_profile', 'is_potential_business', 'is_memorialized', 'gender',
+    'csv_filename'
+)
+BIO_LINK_COLUMNS = ('user_id', 'url')
+PINNED_CHANNEL_COLUMNS = ('user_id',) + PINNED_CHANNEL_FIELDS
+extract_user_row = compile_extractor(USER_COLUMNS)
+
 class InstagramDataScraper:
-    def __init__(self, user_ids, csv_filename, account_data, db_config):
+    def __init__(self, user_ids, csv_filename, account_data, db_config, archive_dir='Files/Archive', metrics=None, commit_rows=200, commit_interval_ms=500,
+                 work_queue=None):
         self.user_ids = user_ids
         self.csv_filename = csv_filename
+        self.work_queue = work_queue
         self.account_data = json.loads(account_data)
         self.db_config = json.loads(db_config)
         self.account_id_to_index = {account['id']: index for index, account in enumerate(self.account_data)}
         self.index_to_account_id = {index: account['id'] for index, account in enumerate(self.account_data)}
         self.rate_limit_info = {account['id']: {'remaining': 200, 'reset_time': 0} for account in self.account_data}
-        self.gender_detector = gender.Detector()
+        # With a shared work queue the jobs table is the resume state, so nothing is written to Files/States
+        state_base = f'Files/States/{self.csv_filename}' if work_queue is None else None
+        self.state_path = f'{state_base}_state.json' if state_base else None
+        self.scraped_users = JournaledIdSet(f'{state_base}_scraped_users' if state_base else None)
+        self.skipped_users = JournaledIdSet(f'{state_base}_skipped_users' if state_base else None)
         self.state = self.load_state()
+        self.checkpoint_interval = 30
+        self.last_checkpoint_time = time.time()
         self.cookie_states = self.initialize_cookie_states()
         self.account_lock = threading.Lock()
         self.max_concurrent_requests = min(len(self.cookie_states), 10)  # Adjust the maximum as needed
@@ -111,18 +140,37 @@ class InstagramDataScraper:
         self.account_jitter_info = {}
         self.scrape_count = 0
         self.user_queue = Queue()
-        for user_id in self.user_ids:
-            if user_id not in self.state['scraped_users'] and user_id not in self.state['skipped_user_ids']:
-                self.user_queue.put(user_id)
+        if self.work_queue is not None:
+            self.work_queue.enqueue(user_id for user_id in self.user_ids if not self.is_resolved(user_id))
+        else:
+            for user_id in self.user_ids:
+                if not self.is_resolved(user_id):
+                    self.user_queue.put(user_id)
         self.processing_users = set()
         self.processing_lock = threading.Lock()
         self.scrape_times = deque(maxlen=100)  # Store the last 100 scrape times
         self.last_scrape_time = None
         self.session_scrape_count = 0  # New counter for this session's scrapes
-        self.db_pool = MySQLConnectionPool(pool_name="mypool", pool_size=self.max_concurrent_requests, **self.db_config)
+        # One connection per request thread, plus one for the write-behind flush
+        self.db_pool = get_pool(self.db_config, workers=self.max_concurrent_requests + 1)
+        self.ensure_schema()
         self.disabled_accounts = set()  # New set to keep track of disabled accounts
-        self.already_scraped_users = set()
-        self.load_already_scraped_users()
+        self._already_scraped_users = None  # Loaded on first use, see already_scraped_users
+        self.payload_archive = PayloadArchive(archive_dir, f"users_{self.csv_filename}") if archive_dir else None
+        # Group commit: one transaction per commit_rows profiles or per commit_interval_ms, whichever comes first
+        self.user_writer = WriteBehindQueue(
+            self.save_user_data_batch,
+            name=f"users-{self.csv_filename}",
+            max_queue_size=max(1000, commit_rows * 4),
+            batch_size=commit_rows,
+            flush_interval=commit_interval_ms / 1000
+        )
+        self.metrics = metrics or REGISTRY
+        self.metric_labels = {'campaign': self.csv_filename}
+        self.requests_counter = self.metrics.counter('user_data_requests_total', 'User info requests by outcome')
+        self.request_latency = self.metrics.histogram('user_data_request_seconds', 'User info request latency')
+        self.summary_interval = 60
+        self.metrics.register_collector(self.collect_metrics)
 
     def initialize_cookie_states(self):
         cookie_states = []
@@ -147,23 +195,66 @@ class InstagramDataScraper:
                 acc.time_until_available() for acc in self.cookie_states
                 if acc.account_id not in self.disabled_accounts and not acc.is_in_use
             )
-            logger.warning(f"No accounts available. Waiting for {time_to_wait:.2f} seconds.")
+            logger.warning("No accounts available. Waiting for %.2f seconds.", time_to_wait)
             time.sleep(time_to_wait)
 
     def load_state(self):
+        if self.state_path is None:
+            return {'total_scraped': 0}
         try:
-            with open(f'Files/States/{self.csv_filename}_state.json', 'r') as f:
-                return json.load(f)
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
         except FileNotFoundError:
-            return {
-                'scraped_users': [],
-                'total_scraped': 0,
-                'skipped_user_ids': []
-            }
+            return {'total_scraped': 0}
+        # Older state files embed the ID lists; move them into the journals on the next save
+        if 'scraped_users' in state:
+            self.scraped_users.update(self.numeric_ids(state.pop('scraped_users')))
+        if 'skipped_user_ids' in state:
+            self.skipped_users.update(self.numeric_ids(state.pop('skipped_user_ids')))
+        return state
+
+    @staticmethod
+    def numeric_ids(user_ids):
+        return [user_id for user_id in user_ids if str(user_id).isdigit()]
+
+    def is_resolved(self, user_id):
+        if not str(user_id).isdigit():
+            return False
+        return user_id in self.scraped_users or user_id in self.skipped_users
+
+    def mark_scraped(self, user_id):
+        if str(user_id).isdigit():
+            self.scraped_users.add(user_id)
+        else:
+            logger.warning("User ID %s is not numeric and can't be recorded for resume", user_id)
+        self.state['total_scraped'] += 1
+
+    def mark_skipped(self, user_id):
+        if str(user_id).isdigit():
+            self.skipped_users.add(user_id)
+        else:
+            logger.warning("User ID %s is not numeric and can't be recorded for resume", user_id)
 
     def save_state(self):
-        with open(f'Files/States/{self.csv_filename}_state.json', 'w') as f:
-            json.dump(self.state, f)
+        # Commit every profile queued so far first; the writer takes processing_lock, so flush before acquiring it
+        try:
+            self.user_writer.flush()
+        except WriteBehindError as e:
+            # Users are only marked scraped once their batch is saved, so the journals are still safe to write
+            logger.error("Profile writer failed: %s", e)
+        with self.processing_lock:
+            # Journal first so the header never counts users the journals don't have
+            self.scraped_users.checkpoint()
+            self.skipped_users.checkpoint()
+            self.state['scraped_count'] = len(self.scraped_users)
+            self.state['skipped_count'] = len(self.skipped_users)
+            if self.state_path is not None:
+                write_json_atomic(self.state_path, self.state)
+            self.last_checkpoint_time = time.time()
+
+    def maybe_save_state(self):
+        if time.time() - self.last_checkpoint_time >= self.checkpoint_interval:
+            self.save_state()
 
     def record_scrape(self):
         current_time = time.time()
@@ -171,7 +262,7 @@ class InstagramDataScraper:
             self.scrape_times.append(current_time - self.last_scrape_time)
         self.last_scrape_time = current_time
         self.session_scrape_count += 1  # Increment the session scrape count
-        logger.debug(f"Recorded scrape. Session scrape count: {self.session_scrape_count}")
+        logger.debug("Recorded scrape. Session scrape count: %s", self.session_scrape_count)
 
     def get_average_scrape_rate(self):
         if not self.scrape_times:
@@ -183,7 +274,7 @@ class InstagramDataScraper:
         current_time = time.time()
         elapsed_time = current_time - self.start_time
         total_users = len(self.user_ids)
-        processed_users = len(self.state['scraped_users']) + len(self.state['skipped_user_ids'])
+        processed_users = len(self.scraped_users) + len(self.skipped_users)
 
         # Calculate scrape rates
         scrapes_per_minute = self.get_average_scrape_rate()
@@ -213,40 +304,61 @@ class InstagramDataScraper:
             completion_time = "Unable to estimate"
 
         logger.info("----- Scraping Statistics -----")
-        logger.info(f"Progress: {processed_users}/{total_users} users processed")
-        logger.info(f"Scrapes this session: {self.session_scrape_count}")
-        logger.info(f"Elapsed time: {timedelta(seconds=int(elapsed_time))}")
-        logger.info(f"Average scrapes per minute: {scrapes_per_minute:.2f}")
-        logger.info(f"Average scrapes per hour: {scrapes_per_hour:.2f}")
-        logger.info(f"Average scrapes per day: {scrapes_per_day:.2f}")
+        logger.info("Progress: %s/%s users processed", processed_users, total_users)
+        logger.info("Scrapes this session: %s", self.session_scrape_count)
+        logger.info("Elapsed time: %s", timedelta(seconds=int(elapsed_time)))
+        logger.info("Average scrapes per minute: %.2f", scrapes_per_minute)
+        logger.info("Average scrapes per hour: %.2f", scrapes_per_hour)
+        logger.info("Average scrapes per day: %.2f", scrapes_per_day)
         logger.info("Account status:")
-        logger.info(f"  Available accounts: {len(available_accounts)}")
-        logger.info(f"  Cooling down accounts: {len(cooling_down_accounts)}")
-        logger.info(f"  Rate-limited accounts: {len(rate_limited_accounts)}")
+        logger.info("  Available accounts: %s", len(available_accounts))
+        logger.info("  Cooling down accounts: %s", len(cooling_down_accounts))
+        logger.info("  Rate-limited accounts: %s", len(rate_limited_accounts))
         logger.info("Detailed account status:")
         for cs in self.cookie_states:
             account_id = cs.account_id
             if account_id in self.disabled_accounts:
-                logger.info(f"  Account ID {account_id}: Disabled (3 consecutive rate limits)")
+                logger.info("  Account ID %s: Disabled (3 consecutive rate limits)", account_id)
             elif cs.is_rate_limited:
-                logger.info(f"  Account ID {account_id}: Rate-limited (available in {cs.time_until_available():.2f} seconds)")
+                logger.info("  Account ID %s: Rate-limited (available in %.2f seconds)", account_id, cs.time_until_available())
             else:
                 wait_time = cs.time_until_available()
                 if wait_time > 0:
-                    logger.info(f"  Account ID {account_id}: Cooling down (available in {wait_time:.2f} seconds)")
+                    logger.info("  Account ID %s: Cooling down (available in %.2f seconds)", account_id, wait_time)
                 else:
-                    logger.info(f"  Account ID {account_id}: Available")
-        logger.info(f"Estimated time to completion: {completion_time}")
-        logger.info(f"Currently processing users: {len(self.processing_users)}")
-        logger.info(f"Remaining users in queue: {self.user_queue.qsize()}")
+                    logger.info("  Account ID %s: Available", account_id)
+        logger.info("Estimated time to completion: %s", completion_time)
+        logger.info("Currently processing users: %s", len(self.processing_users))
+        logger.info("Remaining users in queue: %s", self.user_queue.qsize())
+        logger.info("User writer: %s", self.user_writer.stats())
+        logger.info("Gender cache: %s", gender_service.cache_stats())
         logger.info("-------------------------------")
 
+    def collect_metrics(self):
+        labels = self.metric_labels
+        self.metrics.gauge('users_total', 'User IDs in this run').set(len(self.user_ids), **labels)
+        self.metrics.gauge('users_scraped', 'Users saved so far').set(len(self.scraped_users), **labels)
+        self.metrics.gauge('users_skipped', 'Users skipped so far').set(len(self.skipped_users), **labels)
+        self.metrics.gauge('users_queued', 'Users waiting to be scraped').set(self.user_queue.qsize(), **labels)
+        self.metrics.gauge('user_scrapes_per_minute', 'Recent user scrape rate').set(self.get_average_scrape_rate(), **labels)
+        self.metrics.gauge('accounts_available', 'Accounts able to make a request now').set(
+            sum(1 for cs in self.cookie_states if not cs.is_rate_limited and cs.time_until_available() <= 0), scraper='users')
+        self.metrics.gauge('accounts_rate_limited', 'Accounts currently rate limited').set(
+            sum(1 for cs in self.cookie_states if cs.is_rate_limited), scraper='users')
+        self.metrics.gauge('gender_cache_hit_rate', 'First-name gender cache hit rate').set(gender_service.cache_stats()['hit_rate'])
+        record_writer_stats(self.metrics, self.user_writer)
+
     def scrape_user_data(self):
-        total_users = len(self.user_ids)
-        last_stats_time = time.time()
-        stats_interval = 5  # Display statistics every 5 seconds
+        reporter = SummaryReporter(self.metrics, interval=self.summary_interval).start()
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            if self.work_queue is not None:
+                for future in self.work_queue.run(executor, self.process_single_user, self.max_concurrent_requests):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error("Error in thread: %s", str(e))
+
             futures = set()
             while not self.user_queue.empty() or futures:
                 while len(futures) < self.max_concurrent_requests and not self.user_queue.empty():
@@ -269,20 +381,23 @@ class InstagramDataScraper:
                     try:
                         future.result()
                     except Exception as e:
-                        logger.error(f"Error in thread: {str(e)}")
-
-                current_time = time.time()
-                if current_time - last_stats_time >= stats_interval:
-                    self.display_statistics()
-                    last_stats_time = current_time
+                        logger.error("Error in thread: %s", str(e))
 
+        self.user_writer.close()
+        if self.work_queue is not None:
+            self.work_queue.close()
+        if self.payload_archive:
+            self.payload_archive.close()
+        self.save_state()
+        reporter.stop()
+        self.metrics.unregister_collector(self.collect_metrics)
         self.display_statistics()  # Display final statistics
         logger.info("User data scraping process completed for all user IDs.")
-        logger.info(f"Final total completed user data scrapes: {len(self.state['scraped_users'])}")
-        logger.info(f"Total skipped user IDs: {len(self.state['skipped_user_ids'])}")
+        logger.info("Final total completed user data scrapes: %s", len(self.scraped_users))
+        logger.info("Total skipped user IDs: %s", len(self.skipped_users))
 
-    def process_single_user(self, user_id, account):
-        logger.info(f"Processing user ID {user_id}")
+    def process_single_user(self, user_id, account=None):
+        logger.info("Processing user ID %s", user_id)
         retry_count = 0
         max_retries = 3
 
@@ -290,41 +405,40 @@ class InstagramDataScraper:
             if account is None or account.account_id in self.disabled_accounts:
                 account = self.get_next_available_account()
                 if account is None:
-                    logger.warning(f"No available accounts. Waiting before retry for user ID {user_id}")
+                    logger.warning("No available accounts. Waiting before retry for user ID %s", user_id)
                     time.sleep(5)  # Shorter wait time
                     retry_count += 1
                     continue
 
             try:
-                logger.info(f"Using account ID {account.account_id} for user ID {user_id}")
+                logger.info("Using account ID %s for user ID %s", account.account_id, user_id)
                 user_data = self.fetch_user_data(user_id, account)
-                logger.debug(f"User data: {user_data}")
-                logger.debug(f"User data type: {type(user_data)}")
+                logger.debug("User data: %s", user_data)
+                logger.debug("User data type: %s", type(user_data))
                 if user_data:
                     account.reset_rate_limit()  # Reset rate limit counters on success
                     processed_data = self.process_user_data(user_data)
                     if processed_data:
-                        self.save_user_data(processed_data)
-                        with self.processing_lock:
-                            self.state['scraped_users'].append(user_id)
-                            self.state['total_scraped'] += 1
-                            self.processing_users.discard(user_id)
+                        # The user is marked as scraped by the writer once its row is saved
+                        self.user_writer.put((user_id, processed_data))
                         self.record_scrape()
-                        logger.info(f"Successfully scraped data for user ID: {user_id}")
-                        logger.info(f"Session scrape count: {self.session_scrape_count}")
+                        logger.info("Successfully scraped data for user ID: %s", user_id)
+                        logger.info("Session scrape count: %s", self.session_scrape_count)
                         break
                     else:
-                        logger.error(f"Failed to process data for user ID: {user_id}")
+                        logger.error("Failed to process data for user ID: %s", user_id)
                         with self.processing_lock:
-                            self.state['skipped_user_ids'].append(user_id)
+                            self.mark_skipped(user_id)
                             self.processing_users.discard(user_id)
+                        if self.work_queue is not None:
+                            self.work_queue.fail([user_id], "unprocessable profile")
                         break
                 else:
-                    logger.warning(f"No data found for user ID: {user_id}")
+                    logger.warning("No data found for user ID: %s", user_id)
                     retry_count += 1
                     # Rate limiting is handled in fetch_user_data
             except Exception as e:
-                logger.error(f"Error occurred while scraping User ID {user_id}: {str(e)}")
+                logger.error("Error occurred while scraping User ID %s: %s", user_id, str(e))
                 logger.error(traceback.format_exc())
                 retry_count += 1
                 # Rate limiting is handled in fetch_user_data
@@ -335,14 +449,17 @@ class InstagramDataScraper:
                 account = None  # Reset account for the next iteration
 
             if retry_count < max_retries:
-                logger.info(f"Retrying user ID {user_id} (Attempt {retry_count + 1}/{max_retries})")
+                logger.info("Retrying user ID %s (Attempt %s/%s)", user_id, retry_count + 1, max_retries)
             else:
-                logger.warning(f"Max retries reached for user ID: {user_id}")
+                logger.warning("Max retries reached for user ID: %s", user_id)
                 with self.processing_lock:
-                    self.state['skipped_user_ids'].append(user_id)
+                    self.mark_skipped(user_id)
                     self.processing_users.discard(user_id)
+                if self.work_queue is not None:
+                    # Another worker, with other accounts, may still get this user
+                    self.work_queue.release([user_id], "max retries reached")
 
-        self.save_state()
+        self.maybe_save_state()
 
     def get_new_cookie_from_db(self, account_id, old_cookie):
         connection = None
@@ -360,13 +477,13 @@ class InstagramDataScraper:
             cursor.execute(query, (account_id,))
             result = cursor.fetchone()
             if result:
-                logger.debug(f"Retrieved latest cookie for account ID {account_id}")
+                logger.debug("Retrieved latest cookie for account ID %s", account_id)
                 return result['cookies']
             else:
-                logger.debug(f"No cookie found for account ID {account_id}")
+                logger.debug("No cookie found for account ID %s", account_id)
                 return None
         except Error as e:
-            logger.error(f"Error fetching new cookie from database: {e}")
+            logger.error("Error fetching new cookie from database: %s", e)
         finally:
             if cursor:
                 cursor.close()
@@ -376,12 +493,12 @@ class InstagramDataScraper:
 
     def check_and_update_cookie(self, account):
         account_id = account.account_id
-        logger.debug(f"Checking for new cookie for account ID {account_id}")
+        logger.debug("Checking for new cookie for account ID %s", account_id)
         new_cookie = self.get_new_cookie_from_db(account_id, account.cookie)
         if new_cookie and new_cookie != account.cookie:
-            logger.info(f"New cookie found for account ID {account_id}. Updating.")
-            logger.info(f'New cookie: {new_cookie}')
-            logger.info(f'Current cookie: {account.cookie}')
+            logger.info("New cookie found for account ID %s. Updating.", account_id)
+            logger.info("New cookie: %s", new_cookie)
+            logger.info("Current cookie: %s", account.cookie)
             account.cookie = new_cookie
             account.is_rate_limited = False
             account.rate_limit_until = 0
@@ -389,16 +506,16 @@ class InstagramDataScraper:
             account.next_available_time = time.time()  # Reset next available time
             self.account_wait_times[account_id] = 30
         else:
-            logger.debug(f"No new cookie found for account ID {account_id}")
+            logger.debug("No new cookie found for account ID %s", account_id)
         return account
 
     def fetch_user_data(self, user_id, account):
         if not account.can_make_request():
-            logger.warning(f"Rate limit reached for account ID {account.account_id}")
+            logger.warning("Rate limit reached for account ID %s", account.account_id)
             return None
 
         current_account_id = account.account_id
-        logger.info(f"Fetching data for user ID {user_id} with account ID {current_account_id}")
+        logger.info("Fetching data for user ID %s with account ID %s", user_id, current_account_id)
 
         account = self.check_and_update_cookie(account)
 
@@ -425,47 +542,50 @@ class InstagramDataScraper:
         }
 
         try:
-            response = requests.get(url, headers=headers, cookies=cookies, proxies=proxies, timeout=30)
+            with self.request_latency.time(**self.metric_labels):
+                response = requests.get(url, headers=headers, cookies=cookies, proxies=proxies, timeout=30)
+            self.requests_counter.inc(status=str(response.status_code), **self.metric_labels)
             response.raise_for_status()
             data = response.json()
             account.record_request()
-            logger.info(f"Successfully fetched data")
-            logger.debug(f"Response data: {json.dumps(data, indent=2)}")
+            logger.info("Successfully fetched data for user ID %s (%s bytes)", user_id, len(response.content))
+            if self.payload_archive:
+                self.payload_archive.record(user_id, data)
 
             if 'user' in data:
-                self.display_statistics()
                 return data['user']
             else:
-                logger.warning(f"No user data found for user ID: {user_id}")
+                logger.warning("No user data found for user ID: %s", user_id)
                 return None
         except requests.exceptions.HTTPError as e:
             response_content = e.response.content.decode('utf-8')
             if e.response.status_code == 429:
-                logger.warning(f"Rate limit hit for account ID {account.account_id}.")
+                logger.warning("Rate limit hit for account ID %s.", account.account_id)
                 account.set_rate_limit()
                 return None
             elif e.response.status_code == 401:
-                logger.warning(f"Unauthorized access for account ID {account.account_id}.")
+                logger.warning("Unauthorized access for account ID %s.", account.account_id)
                 account.set_rate_limit()
                 return None
             elif e.response.status_code == 400:
                 if "challenge_required" in response_content:
-                    logger.error(f"Challenge required for account ID {current_account_id}. Disabling this account for the session.")
+                    logger.error("Challenge required for account ID %s. Disabling this account for the session.", current_account_id)
                     account.is_rate_limited = True
                     account.rate_limit_until = time.time() + account.rate_limit_cooldown
                     self.disabled_accounts.add(account.account_id)
                     self.save_state()
                     return None
                 else:
-                    logger.error(f"HTTP Error 400 for account ID {current_account_id}, user ID {user_id}: {e}")
-                    logger.error(f"Response content: {response_content}")
+                    logger.error("HTTP Error 400 for account ID %s, user ID %s: %s", current_account_id, user_id, e)
+                    logger.error("Response content: %s", response_content)
                     return None
             else:
-                logger.error(f"HTTP Error for account ID {current_account_id}, user ID {user_id}: {e}")
-                logger.error(f"Response content: {e.response.content}")
+                logger.error("HTTP Error for account ID %s, user ID %s: %s", current_account_id, user_id, e)
+                logger.error("Response content: %s", e.response.content)
                 return None
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching data for user ID {user_id}: {str(e)}")
+            self.requests_counter.inc(status='error', **self.metric_labels)
+            logger.error("Error fetching data for user ID %s: %s", user_id, str(e))
             return None
 
     def update_rate_limit_info(self, account_id, headers):
@@ -475,70 +595,33 @@ class InstagramDataScraper:
             self.rate_limit_info[account_id]['reset_time'] = time.time() + int(headers['X-Ratelimit-Reset'])
 
     def process_user_data(self, user_data):
+        """Turn a profile payload into DB-ready (user row, bio link rows, pinned channel rows)."""
         if user_data:
-            parsed_data = {
-                'user_id': user_data.get('pk'),
-                'username': user_data.get('username'),
-                'full_name': user_data.get('full_name'),
-                'biography': user_data.get('biography'),
-                'follower_count': user_data.get('follower_count'),
-                'following_count': user_data.get('following_count'),
-                'media_count': user_data.get('media_count'),
-                'is_private': user_data.get('is_private'),
-                'is_verified': user_data.get('is_verified'),
-                'category': user_data.get('category'),
-                'external_url': user_data.get('external_url'),
-                'public_email': user_data.get('public_email'),
-                'public_phone_number': user_data.get('public_phone_number'),
-                'is_business': user_data.get('is_business'),
-                'profile_pic_url': user_data.get('profile_pic_url'),
-                'hd_profile_pic_url': user_data.get('hd_profile_pic_url_info', {}).get('url'),
-                'has_highlight_reels': user_data.get('has_highlight_reels'),
-                'has_guides': user_data.get('has_guides'),
-                'is_interest_account': user_data.get('is_interest_account'),
-                'total_igtv_videos': user_data.get('total_igtv_videos'),
-                'total_clips_count': user_data.get('total_clips_count', 0),
-                'total_ar_effects': user_data.get('total_ar_effects'),
-                'is_eligible_for_smb_support_flow': user_data.get('is_eligible_for_smb_support_flow'),
-                'is_eligible_for_lead_center': user_data.get('is_eligible_for_lead_center'),
-                'account_type': user_data.get('account_type'),
-                'is_call_to_action_enabled': user_data.get('is_call_to_action_enabled'),
-                'interop_messaging_user_fbid': user_data.get('interop_messaging_user_fbid'),
-                'has_videos': user_data.get('has_videos'),
-                'total_video_count': user_data.get('total_video_count', 0),
-                'has_music_on_profile': user_data.get('has_music_on_profile'),
-                'is_potential_business': user_data.get('is_potential_business'),
-                'is_memorialized': user_data.get('is_memorialized'),
-                'gender': self.guess_gender(user_data.get('full_name')),
-                'csv_filename': self.csv_filename,
-                'bio_links': [link.get('url') for link in user_data.get('bio_links', [])],
-                'pinned_channels_info': user_data.get('pinned_channels_info', {})
-            }
-            return parsed_data
+            user_id = user_data.get('pk')
+            user_row = extract_user_row(
+                user_data,
+                gender=self.guess_gender(user_data.get('full_name')),
+                csv_filename=self.csv_filename
+            )
+            bio_link_rows = [(user_id, url) for url in bio_link_urls(user_data)]
+            channel_rows = [(user_id,) + channel for channel in pinned_channels(user_data)]
+            return user_row, bio_link_rows, channel_rows
         else:
-            logger.warning(f"No user data found for user ID: {user_data.get('pk')}")
+            logger.warning("No user data found for user ID: %s", user_data.get('pk'))
             return None
 
     def guess_gender(self, name):
-        if name and ' ' in name:
-            first_name = name.split()[0]
-        else:
-            first_name = name
-        return self.gender_detector.get_gender(first_name) if first_name else 'unknown'
+        return gender_service.guess_gender(name)
 
     def get_db_connection(self):
         return self.db_pool.get_connection()
 
-    def save_user_data(self, user_data):
-        if not user_data:
-            logger.error(f"No data to save for user ID: {user_data.get('user_id')}")
-            return
-
+    def ensure_schema(self):
+        """Run the one-off users table migration before any profile is saved."""
+        connection = None
         try:
             connection = self.get_db_connection()
             cursor = connection.cursor()
-
-            # Check if user_id column exists
             cursor.execute("""
             SELECT COUNT(*)
             FROM information_schema.COLUMNS
@@ -546,99 +629,80 @@ class InstagramDataScraper:
             AND TABLE_NAME = 'users'
             AND COLUMN_NAME = 'user_id'
             """)
-            user_id_exists = cursor.fetchone()[0]
-
-            if not user_id_exists:
-                # Add user_id column if it doesn't exist
+            if not cursor.fetchone()[0]:
                 cursor.execute("""
                 ALTER TABLE users
                 ADD COLUMN user_id BIGINT UNIQUE
                 """)
                 logger.info("Added user_id column to users table")
+            cursor.close()
+        except Error as e:
+            logger.error("Error checking users table schema: %s", e)
+        finally:
+            if connection:
+                connection.close()
 
-            # Check if the user already exists
-            check_query = "SELECT COUNT(*) FROM users WHERE user_id = %s"
-            cursor.execute(check_query, (user_data['user_id'],))
-            user_exists = cursor.fetchone()[0] > 0
-
-            # Prepare the fields for insertion/update
-            fields = [
-                'user_id', 'username', 'full_name', 'biography', 'follower_count', 'following_count',
-                'media_count', 'is_private', 'is_verified', 'category', 'external_url',
-                'public_email', 'public_phone_number', 'is_business', 'profile_pic_url',
-                'hd_profile_pic_url', 'has_highlight_reels', 'has_guides',
-                'is_interest_account', 'total_igtv_videos', 'total_clips_count',
-                'total_ar_effects', 'is_eligible_for_smb_support_flow',
-                'is_eligible_for_lead_center', 'account_type', 'is_call_to_action_enabled',
-                'interop_messaging_user_fbid', 'has_videos', 'total_video_count',
-                'has_music_on_profile', 'is_potential_business', 'is_memorialized', 'gender',
-                'csv_filename'
-            ]
-
-            # Create placeholders for SQL query
-            placeholders = ', '.join(['%s'] * len(fields))
-            
-            # Create the UPDATE part of the query
-            update_fields = ', '.join([f"{field} = VALUES({field})" for field in fields if field != 'user_id'])
-            # Insert data into the users table
-            insert_query = f"""
-            INSERT INTO users ({', '.join(fields)})
-            VALUES ({placeholders})
-            ON DUPLICATE KEY UPDATE
-            {update_fields}
-            """
-
-            # Prepare the data tuple
-            user_data_tuple = tuple(user_data.get(field) for field in fields)
-
-            cursor.execute(insert_query, user_data_tuple)
-
-            # Insert bio links
-            if 'bio_links' in user_data:
-                for link in user_data['bio_links']:
-                    insert_link_query = """
-                    INSERT INTO bio_links (user_id, url)
-                    VALUES (%s, %s)
-                    ON DUPLICATE KEY UPDATE url = VALUES(url)
-                    """
-                    cursor.execute(insert_link_query, (user_data['user_id'], link))
-
-            # Insert pinned channels
-            if 'pinned_channels_info' in user_data and 'pinned_channels_list' in user_data['pinned_channels_info']:
-                for channel in user_data['pinned_channels_info']['pinned_channels_list']:
-                    insert_channel_query = """
-                    INSERT INTO pinned_channels (user_id, title, subtitle, invite_link, number_of_members)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                        subtitle = VALUES(subtitle),
-                        invite_link = VALUES(invite_link),
-                        number_of_members = VALUES(number_of_members)
-                    """
-                    channel_data = (
-                        user_data['user_id'], channel.get('title'), channel.get('subtitle'),
-                        channel.get('invite_link'), channel.get('number_of_members')
-                    )
-                    cursor.execute(insert_channel_query, channel_data)
+    def save_user_data(self, profiles):
+        """Upsert a batch of processed profiles with their bio links and pinned channels in one transaction."""
+        user_rows = []
+        bio_link_rows = []
+        channel_rows = []
+        for user_row, profile_bio_links, profile_channels in profiles:
+            user_rows.append(user_row)
+            bio_link_rows.extend(profile_bio_links)
+            channel_rows.extend(profile_channels)
 
+        connection = None
+        try:
+            connection = self.get_db_connection()
+            bulk_upsert(connection, 'users', USER_COLUMNS, user_rows, commit=False)
+            bulk_upsert(connection, 'bio_links', BIO_LINK_COLUMNS, bio_link_rows,
+                        update_columns=('url',), commit=False)
+            bulk_upsert(connection, 'pinned_channels', PINNED_CHANNEL_COLUMNS, channel_rows,
+                        update_columns=('subtitle', 'invite_link', 'number_of_members'), commit=False)
             connection.commit()
-            
-            if user_exists:
-                logger.info(f"Updated user data for user ID: {user_data['user_id']}")
-            else:
-                logger.info(f"Saved new user data for user ID: {user_data['user_id']}")
-
+            logger.info("Saved %s users, %s bio links and %s pinned channels", len(user_rows), len(bio_link_rows), len(channel_rows))
+            return True
         except Error as e:
-            logger.error(f"Error saving user data to database: {e}")
-            logger.error(f"User data: {user_data}")
-
+            logger.error("Error saving user data to database: %s", e)
+            logger.error("User IDs in failed batch: %s", [user_row[0] for user_row, _, _ in profiles])
+            if connection:
+                connection.rollback()
+            return False
         finally:
-            if connection.is_connected():
-                cursor.close()
+            if connection:
                 connection.close()
 
+    def save_user_data_batch(self, batch):
+        saved = self.save_user_data([user_data for _, user_data in batch])
+        with self.processing_lock:
+            for user_id, _ in batch:
+                # Unsaved users stay out of scraped_users so the next run retries them
+                if saved:
+                    self.mark_scraped(user_id)
+                self.processing_users.discard(user_id)
+        if self.work_queue is not None:
+            user_ids = [user_id for user_id, _ in batch]
+            if saved:
+                self.work_queue.complete(user_ids)
+            else:
+                self.work_queue.release(user_ids, "database write failed")
+
+    @property
+    def already_scraped_users(self):
+        """Every follower username for this campaign, fetched the first time it is needed."""
+        if self._already_scraped_users is None:
+            already_scraped_users = self.load_already_scraped_users()
+            if already_scraped_users is None:
+                return set()  # Not cached, so the next access retries the load
+            self._already_scraped_users = already_scraped_users
+        return self._already_scraped_users
+
     def load_already_scraped_users(self):
+        already_scraped_users = set()
+        connection = None
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = self.get_db_connection()
             cursor = connection.cursor()
 
             query = """
@@ -648,21 +712,24 @@ class InstagramDataScraper:
             cursor.execute(query, (self.csv_filename,))
             
             for (username,) in cursor:
-                self.already_scraped_users.add(username)
+                already_scraped_users.add(username)
+            cursor.close()
 
-            logger.info(f"Loaded {len(self.already_scraped_users)} already scraped users for csv_filename: {self.csv_filename}")
+            logger.info("Loaded %s already scraped users for csv_filename: %s", len(already_scraped_users), self.csv_filename)
 
         except Error as e:
-            logger.error(f"Error loading already scraped users: {e}")
+            logger.error("Error loading already scraped users: %s", e)
+            return None
         finally:
-            if connection.is_connected():
-                cursor.close()
+            if connection:
                 connection.close()
+        return already_scraped_users
 
 def main():
     import sys
-    if len(sys.argv) != 5:
-        print("Usage: python v4_data_scraper.py <user_ids_json> <csv_filename> <account_data_json> <db_config_json>")
+    setup_logging()
+    if len(sys.argv) not in (5, 6) or sys.argv[5:] not in ([], ['--work-queue']):
+        print("Usage: python v4_data_scraper.py <user_ids_json> <csv_filename> <account_data_json> <db_config_json> [--work-queue]")
         sys.exit(1)
 
     user_ids = json.loads(sys.argv[1])
@@ -670,9 +737,11 @@ def main():
     account_data = sys.argv[3]
     db_config = sys.argv[4]
 
-    scraper = InstagramDataScraper(user_ids, csv_filename, account_data, db_config)
-    logger.info(f"Scraping data for {len(user_ids)} user IDs")
-    logger.info(f"Using accounts with IDs: {', '.join(str(id) for id in scraper.account_id_to_index.keys())}")
+    # --work-queue shares the campaign with every other worker started for the same CSV
+    work_queue = WorkQueue('user_data', csv_filename) if sys.argv[5:] == ['--work-queue'] else None
+    scraper = InstagramDataScraper(user_ids, csv_filename, account_data, db_config, work_queue=work_queue)
+    logger.info("Scraping data for %s user IDs", len(user_ids))
+    logger.info("Using accounts with IDs: %s", ', '.join(str(id) for id in scraper.account_id_to_index.keys()))
     scraper.scrape_user_data()
 
 if __name__ == "__main__":
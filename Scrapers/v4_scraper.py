@@ -1,35 +1,88 @@
 import json
 import time
 import logging
-import mysql.connector
 from mysql.connector import Error
 import requests
 import random
 import concurrent.futures
 import threading
 import traceback
-import numpy as np
-from gender_guesser import detector as gender_detector
 import queue
 import heapq
+from collections import deque
 from db_utils import (
     get_database_connection,
+    get_pool,
     get_accounts_from_database,
     prepare_account_data,
     update_account_last_checked,
-    mark_account_invalid
+    mark_account_invalid,
+    bulk_upsert
 )
+from write_behind import WriteBehindQueue, WriteBehindError
+from state_journal import IdJournal, write_json_atomic
+from id_set import IdSet
+from payload_archive import PayloadArchive
+import gender_service
+from metrics import REGISTRY, SummaryReporter, record_writer_stats
+from log_setup import setup_logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Add a separate handler for debug logging
-debug_handler = logging.FileHandler('debug.log')
-debug_handler.setLevel(logging.DEBUG)
-debug_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-debug_handler.setFormatter(debug_formatter)
-logger.addHandler(debug_handler)
+FOLLOWER_COLUMNS = (
+    'username', 'source_account', 'pk', 'pk_id', 'full_name', 'is_private', 'fbid_v2',
+    'third_party_downloads_enabled', 'strong_id', 'profile_pic_id', 'profile_pic_url',
+    'is_verified', 'has_anonymous_profile_picture', 'account_badges', 'latest_reel_media',
+    'is_favorite', 'gender', 'csv_filename'
+)
+
+def follower_row(follower, source_account, csv_filename, gender):
+    return (
+        follower.get('username'),
+        source_account,
+        follower.get('pk'),
+        follower.get('pk_id'),
+        follower.get('full_name'),
+        follower.get('is_private'),
+        follower.get('fbid_v2'),
+        follower.get('third_party_downloads_enabled'),
+        follower.get('strong_id'),
+        follower.get('profile_pic_id'),
+        follower.get('profile_pic_url'),
+        follower.get('is_verified'),
+        follower.get('has_anonymous_profile_picture'),
+        json.dumps(follower.get('account_badges', [])),
+        follower.get('latest_reel_media'),
+        follower.get('is_favorite'),
+        gender,
+        csv_filename
+    )
+
+def save_followers(db_pool, entries, batch_size=500):
+    """Write (source_account, csv_filename, follower) entries, which may span several targets."""
+    logger.debug("Entering save_followers with %s followers", len(entries))
+    if not entries:
+        logger.debug("No followers to save.")
+        return
+
+    connection = None
+    try:
+        genders = gender_service.guess_genders([follower.get('full_name', '') for _, _, follower in entries])
+        rows = [
+            follower_row(follower, source_account, csv_filename, gender)
+            for (source_account, csv_filename, follower), gender in zip(entries, genders)
+        ]
+        connection = db_pool.get_connection()
+        written = bulk_upsert(connection, 'followers', FOLLOWER_COLUMNS, rows, batch_size=batch_size)
+        logger.info("Inserted/Updated %s followers in the database", written)
+
+    except Error as e:
+        logger.error("Error saving followers to database: %s", e)
+        raise
+
+    finally:
+        if connection:
+            connection.close()
 
 class CookieState:
     def __init__(self, cookie, proxy, user_agent, index):
@@ -67,12 +120,19 @@ class CookieState:
         return self.last_request_time == other.last_request_time
 
 class InstagramFollowerScraper:
-    def __init__(self, user_id, csv_filename, account_data, db_config):
+    def __init__(self, user_id, csv_filename, account_data, db_config, db_batch_size=500, recent_pages_window=0, archive_dir='Files/Archive', metrics=None,
+                 db_pool=None, follower_writer=None, summary_interval=60):
         self.user_id = user_id
         self.csv_filename = csv_filename
-        self.account_data = json.loads(account_data)
-        self.db_config = json.loads(db_config)
-        self.db_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="mypool", pool_size=5, **self.db_config)
+        # Accept the JSON strings passed on the command line as well as already-parsed objects
+        self.account_data = json.loads(account_data) if isinstance(account_data, str) else account_data
+        self.db_config = json.loads(db_config) if isinstance(db_config, str) else db_config
+        # One connection per request thread, plus one for the write-behind flush; a shared pool grows to fit
+        if db_pool is None:
+            self.db_pool = get_pool(self.db_config, workers=len(self.account_data) + 1)
+        else:
+            self.db_pool = db_pool.reserve(len(self.account_data) + 1)
+        self.db_batch_size = db_batch_size  # Rows per multi-row INSERT/commit in save_followers
         self.base_url = f"https://i.instagram.com/api/v1/friendships/{self.user_id}/followers/"
         self.params = {"count": 25, "search_surface": "follow_list_page"}
         self.cookie_queue = queue.Queue()
@@ -86,8 +146,8 @@ class InstagramFollowerScraper:
         self.large_step = 25
         self.small_step = 25
         self.total_followers_scraped = 0
-        self.followers = []
-        self.gender_detector = gender_detector.Detector()
+        # Pages stream straight to follower_writer; only keep the last few around for debugging
+        self.recent_pages = deque(maxlen=recent_pages_window) if recent_pages_window else None
         self.max_retries = 3
         self.use_proxies = True
         self.current_account_index = None
@@ -102,7 +162,11 @@ class InstagramFollowerScraper:
         self.rate_limit_counts = {}
         self.request_lock = threading.Lock()
         self.current_max_id = "0"
-        self.unique_followers = set()
+        self.unique_followers = IdSet()  # Follower pks seen so far
+        self.pending_unique_followers = []  # Seen since the last checkpoint, not yet journaled
+        self.state_lock = threading.Lock()
+        self.state_path = f'Files/States/{self.user_id}_state.json'
+        self.follower_journal = IdJournal(f'Files/States/{self.user_id}_unique_followers')
         self.account_wait_times = {}
         self.empty_users_count = 0
         self.max_empty_users = 3
@@ -114,6 +178,23 @@ class InstagramFollowerScraper:
         self.last_followers_scraped = 0
         self.start_time = time.time()
         self.manual_increases = 0
+        self.metrics = metrics or REGISTRY
+        self.metric_labels = {'target': str(self.user_id)}
+        self.followers_counter = self.metrics.counter('followers_scraped_total', 'Follower entries fetched')
+        self.requests_counter = self.metrics.counter('follower_requests_total', 'Follower list requests by outcome')
+        self.request_latency = self.metrics.histogram('follower_request_seconds', 'Follower list request latency')
+        self.summary_interval = summary_interval  # None when a job runner reports for the whole run
+        self.metrics.register_collector(self.collect_metrics)
+        # Raw responses go to compressed archive segments instead of the log
+        self.payload_archive = PayloadArchive(archive_dir, f"followers_{self.user_id}") if archive_dir else None
+        # A writer handed in by a job runner is shared across targets, so only flush it here
+        self.owns_follower_writer = follower_writer is None
+        self.follower_writer = follower_writer or WriteBehindQueue(
+            self.save_followers,
+            name=f"followers-{self.user_id}",
+            batch_size=self.db_batch_size,
+            stop_event=self.stop_event
+        )
 
     def initialize_cookie_states(self):
         cookie_states = []
@@ -149,11 +230,12 @@ class InstagramFollowerScraper:
         next_available = heapq.heappop(available_cookies)
         wait_time, _, cookie_state = next_available
 
-        logger.debug(f"Next available cookie: Account ID {self.index_to_account_id[cookie_state.index]}, Wait time: {wait_time:.2f} seconds")
-        logger.debug(f"Current wait times for all accounts: {json.dumps(self.account_wait_times, indent=2)}")
+        logger.debug("Next available cookie: Account ID %s, Wait time: %.2f seconds", self.index_to_account_id[cookie_state.index], wait_time)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Current wait times for all accounts: %s", json.dumps(self.account_wait_times, indent=2))
 
         if wait_time > 0:
-            logger.info(f"Waiting {wait_time:.2f} seconds before next request")
+            logger.info("Waiting %.2f seconds before next request", wait_time)
             time.sleep(wait_time)
 
         return cookie_state
@@ -168,7 +250,7 @@ class InstagramFollowerScraper:
 
         if manual == False:
             self.current_max_id = new_max_id
-            logger.info(f"update_max_id: Updated current_max_id to: {new_max_id}")
+            logger.info("update_max_id: Updated current_max_id to: %s", new_max_id)
 
         else:
             # Convert new_max_id to integer
@@ -181,7 +263,7 @@ class InstagramFollowerScraper:
             
             # Update current_max_id with the adjusted value
             self.current_max_id = str(new_max_id_int)
-            logger.info(f"update_max_id: Updated current_max_id to: {self.current_max_id}")
+            logger.info("update_max_id: Updated current_max_id to: %s", self.current_max_id)
 
     def get_new_cookie_from_db(self, account_id, old_cookie):
         connection = None
@@ -199,13 +281,13 @@ class InstagramFollowerScraper:
             cursor.execute(query, (account_id,))
             result = cursor.fetchone()
             if result:
-                logger.debug(f"Retrieved latest cookie for account ID {account_id}")
+                logger.debug("Retrieved latest cookie for account ID %s", account_id)
                 return result['cookies']
             else:
-                logger.debug(f"No cookie found for account ID {account_id}")
+                logger.debug("No cookie found for account ID %s", account_id)
                 return None
         except Error as e:
-            logger.error(f"Error fetching new cookie from database: {e}")
+            logger.error("Error fetching new cookie from database: %s", e)
         finally:
             if cursor:
                 cursor.close()
@@ -227,7 +309,7 @@ class InstagramFollowerScraper:
                 'remaining': remaining,
                 'reset_time': reset_time
             }
-            logger.debug(f"Updated rate limit info for account ID {account_id}: {self.rate_limit_info[account_id]}")
+            logger.debug("Updated rate limit info for account ID %s: %s", account_id, self.rate_limit_info[account_id])
 
     def main(self):
         self.scrape_followers()
@@ -243,32 +325,32 @@ class InstagramFollowerScraper:
                     next_count = (self.global_iteration + 1) * self.large_step
                     self.global_iteration += 1
                 self.params['max_id'] = str(next_count)
-                logger.info(f"Attempting to fetch initial followers with account ID {account_id}")
+                logger.info("Attempting to fetch initial followers with account ID %s", account_id)
                 followers = self.fetch_followers(cookie_state, initial_request=True)
                 if followers == "RATE_LIMITED":
-                    logger.info(f"Rate limit reached for account ID {account_id}, trying next cookie")
+                    logger.info("Rate limit reached for account ID %s, trying next cookie", account_id)
                     continue
                 if followers:
-                    logger.info(f"Initial followers response: {json.dumps(followers, indent=2)}")
+                    logger.info("Initial followers response: %s users, next_max_id: %s", len(followers.get('users', [])), followers.get('next_max_id'))
                     if 'next_max_id' in followers:
                         next_max_id = followers['next_max_id']
-                        logger.info(f"next_max_id found: {next_max_id}")
+                        logger.info("next_max_id found: %s", next_max_id)
                         self.last_max_id = next_max_id
                         self.base_encoded_part = next_max_id
-                        logger.info(f"Successfully set base_encoded_part to: {self.base_encoded_part}")
+                        logger.info("Successfully set base_encoded_part to: %s", self.base_encoded_part)
                         return
                     elif 'users' in followers and followers['users']:
                         logger.info("'next_max_id' not found in response")
                         self.current_max_id = str(int(self.current_max_id) + self.large_step)
-                        logger.info(f"Updated current_max_id to: {self.current_max_id}")
+                        logger.info("Updated current_max_id to: %s", self.current_max_id)
                         return
                 else:
                     self.empty_users_count += 1
-                    logger.info(f"No followers data returned for account ID {account_id}, empty_users_count: {self.empty_users_count}")
+                    logger.info("No followers data returned for account ID %s, empty_users_count: %s", account_id, self.empty_users_count)
                     
                 # Check if empty_users_count has reached max_empty_users
                 if self.empty_users_count >= self.max_empty_users:
-                    logger.info(f"Reached {self.max_empty_users} consecutive empty users lists during initial request. Stopping scraping.")
+                    logger.info("Reached %s consecutive empty users lists during initial request. Stopping scraping.", self.max_empty_users)
                     self.scraping_status = "stopped"
                     self.scraping_stop_reason = "consecutive_empty_users"
                     self.stop_event.set()
@@ -276,12 +358,12 @@ class InstagramFollowerScraper:
                     return
                     
             except Exception as e:
-                logger.error(f"Error fetching initial followers with account ID {account_id}: {str(e)}")
-                logger.error(f"Exception details: {type(e).__name__}")
+                logger.error("Error fetching initial followers with account ID %s: %s", account_id, str(e))
+                logger.error("Exception details: %s", type(e).__name__)
                 logger.error(traceback.format_exc())
                 
                 if isinstance(e, requests.exceptions.HTTPError) and e.response.status_code in [429, 400]:
-                    logger.warning(f"Rate limit hit for account ID {account_id}. Trying next cookie.")
+                    logger.warning("Rate limit hit for account ID %s. Trying next cookie.", account_id)
                     continue
             
             if not available_cookies:
@@ -301,12 +383,14 @@ class InstagramFollowerScraper:
             try:
                 self.get_base_encoded_part()
             except Exception as e:
-                logger.error(f"Failed to get base encoded part: {str(e)}")
+                logger.error("Failed to get base encoded part: %s", str(e))
+                self.close_resources()
                 return  # Exit the method if we can't get the base encoded part
         else:
-            logger.debug(f"Using existing base_encoded_part: {self.base_encoded_part}")
+            logger.debug("Using existing base_encoded_part: %s", self.base_encoded_part)
 
-        logger.info(f"--------Starting scraping with {self.max_workers} workers---------")
+        logger.info("--------Starting scraping with %s workers---------", self.max_workers)
+        reporter = SummaryReporter(self.metrics, interval=self.summary_interval).start() if self.summary_interval else None
         with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
             futures = [executor.submit(self.scrape_with_cookie, self.get_next_available_cookie()) 
                     for _ in range(self.max_workers)]
@@ -324,17 +408,17 @@ class InstagramFollowerScraper:
                     current_time = time.time()
                     
                     if scraping_complete:
-                        logger.info(f"Scraping complete due to {self.max_empty_users} consecutive empty users lists. Stopping all scraping.")
+                        logger.info("Scraping complete due to %s consecutive empty users lists. Stopping all scraping.", self.max_empty_users)
                         executor.shutdown(wait=False)
                         break
 
                     if self.total_followers_scraped % save_interval == 0:
                         self.save_state()
-                        logger.info(f"State saved after scraping {self.total_followers_scraped} followers")
+                        logger.info("State saved after scraping %s followers", self.total_followers_scraped)
                     
                     if current_time - last_save_time >= save_time_interval:
                         self.save_state()
-                        logger.info(f"State saved after {save_time_interval} seconds")
+                        logger.info("State saved after %s seconds", save_time_interval)
                         last_save_time = current_time
 
                     if current_time - last_status_log_time >= status_log_interval:
@@ -342,11 +426,15 @@ class InstagramFollowerScraper:
                         last_status_log_time = current_time
 
             except Exception as e:
-                logger.error(f"Error in scrape_followers: {str(e)}")
+                logger.error("Error in scrape_followers: %s", str(e))
                 logger.error(traceback.format_exc())
             finally:
                 self.save_state()
 
+        # Make sure every fetched page reaches the database before the final state is written
+        self.close_resources()
+        if reporter:
+            reporter.stop()
         logger.info("Scraping complete.")
         self.save_state()
 
@@ -367,48 +455,51 @@ class InstagramFollowerScraper:
                         continue
 
                     current_account_id = self.index_to_account_id[cookie_state.index]
-                    logger.debug(f"Starting scrape with account ID {current_account_id}")
+                    logger.debug("Starting scrape with account ID %s", current_account_id)
 
                     cookie_state = self.check_and_update_cookie(cookie_state)
                     # Update the cookie_state in self.cookie_states
                     self.cookie_states[cookie_state.index] = cookie_state
 
                     current_max_id = self.get_next_max_id()
-                    logger.debug(f"scrape_with_cookie: Retrieved current_max_id: {current_max_id} for account ID {current_account_id}")
+                    logger.debug("scrape_with_cookie: Retrieved current_max_id: %s for account ID %s", current_max_id, current_account_id)
 
                     params = self.params.copy()
                     params['max_id'] = current_max_id
                     followers = self.fetch_followers(cookie_state, params)
 
                     if followers == "RATE_LIMITED":
-                        logger.debug(f"Rate limit reached for account ID {current_account_id}, will switch cookie in next iteration")
+                        logger.debug("Rate limit reached for account ID %s, will switch cookie in next iteration", current_account_id)
                         continue
                     elif followers is None:
                         if self.scraping_status == "stopped" and self.scraping_stop_reason == "consecutive_empty_users":
-                            logger.info(f"Scraping complete due to {self.max_empty_users} consecutive empty users lists. Stopping all scraping.")
+                            logger.info("Scraping complete due to %s consecutive empty users lists. Stopping all scraping.", self.max_empty_users)
                             scraping_complete = True
                             self.stop_event.set()
                             break
-                        logger.info(f"No more followers to fetch for account ID {current_account_id}")
+                        logger.info("No more followers to fetch for account ID %s", current_account_id)
                         self.scraping_status = "completed"
                         self.scraping_stop_reason = "no_more_followers"
                         break
 
-                    logger.debug(f"Successfully fetched followers for account ID {current_account_id}, max_id: {current_max_id}")
+                    logger.debug("Successfully fetched followers for account ID %s, max_id: %s", current_account_id, current_max_id)
 
-                    self.save_followers(followers['users'])
+                    # Blocks when the writer falls behind, throttling fetches to the DB's pace
+                    self.follower_writer.put_many((self.user_id, self.csv_filename, follower) for follower in followers['users'])
 
-                    new_followers = [follower['username'] for follower in followers['users']]
-                    self.unique_followers.update(new_followers)
-                    self.followers.extend(followers['users'])
+                    with self.state_lock:
+                        new_pks = self.unique_followers.add_many(
+                            follower['pk'] for follower in followers['users'] if follower.get('pk') is not None
+                        )
+                        self.pending_unique_followers.extend(new_pks)
+                    if self.recent_pages is not None:
+                        self.recent_pages.append(followers)
                     self.total_followers_scraped += len(followers['users'])
-                    logger.info(f"Total followers scraped: {self.total_followers_scraped}")
-                    logger.info(f"Unique followers scraped: {len(self.unique_followers)}")
-                    logger.info(f"Cumulative followers scraped: {self.total_followers_scraped}")
-                    logger.info(f"Cumulative unique followers scraped: {len(self.unique_followers)}")
+                    self.followers_counter.inc(len(followers['users']), **self.metric_labels)
+                    logger.debug("Total followers scraped: %s, unique: %s", self.total_followers_scraped, len(self.unique_followers))
 
             except Exception as e:
-                logger.error(f"Unexpected error in scrape_with_cookie: {str(e)}")
+                logger.error("Unexpected error in scrape_with_cookie: %s", str(e))
                 logger.error(traceback.format_exc())
                 self.scraping_status = "error"
                 self.scraping_stop_reason = str(e)
@@ -417,22 +508,22 @@ class InstagramFollowerScraper:
             finally:
                 if not self.stop_event.is_set():
                     self.return_cookie_to_pool(cookie_state)
-                    logger.debug(f"Putting cookie for account ID {current_account_id} back in the queue")
+                    logger.debug("Putting cookie for account ID %s back in the queue", current_account_id)
                     self.monitor_performance()
                 else:
                     logger.info("Scraping stopped by stop event. Exiting fetch_followers.")
                     return None
 
-        logger.debug(f"Exiting scrape_with_cookie")
+        logger.debug("Exiting scrape_with_cookie")
         return scraping_complete
 
     def fetch_followers(self, cookie_state, params=None, initial_request=False):
         current_account_id = self.index_to_account_id[cookie_state.index]
-        logger.debug(f"Entering fetch_followers for account ID {current_account_id}, initial_request: {initial_request}")
+        logger.debug("Entering fetch_followers for account ID %s, initial_request: %s", current_account_id, initial_request)
         if params is None:
             params = self.params.copy()
         
-        logger.debug(f"fetch_followers: Request params: {params}")
+        logger.debug("fetch_followers: Request params: %s", params)
         
         headers = {
             'User-Agent': 'Instagram 275.0.0.27.98 Android (33/13; 420dpi; 1080x2400; samsung; SM-G991B; o1s; exynos2100; en_US; 458229258)',
@@ -459,11 +550,11 @@ class InstagramFollowerScraper:
                 proxy_url = f"http://{username}:{password}@{host}:{port}"
                 proxies = {'http': proxy_url, 'https': proxy_url}
             else:
-                logger.error(f"Invalid proxy format: {cookie_state.proxy}")
+                logger.error("Invalid proxy format: %s", cookie_state.proxy)
 
-        logger.debug(f"+++++++Sending request to {self.base_url} with params: {params}+++++++")
+        logger.debug("+++++++Sending request to %s with params: %s+++++++", self.base_url, params)
         if self.use_proxies:
-            logger.debug(f"Using proxy: {proxies}")
+            logger.debug("Using proxy: %s", proxies)
         else:
             logger.debug("Not using proxy")
 
@@ -471,32 +562,35 @@ class InstagramFollowerScraper:
         backoff_time = 5
         for retry in range(self.max_retries):
             if not cookie_state.can_make_request():
-                logger.debug(f"Cooldown not finished for account ID {current_account_id}, signaling to switch cookie...")
+                logger.debug("Cooldown not finished for account ID %s, signaling to switch cookie...", current_account_id)
                 return "RATE_LIMITED"
 
-            logger.debug(f"Attempt {retry + 1} of {self.max_retries}")
+            logger.debug("Attempt %s of %s", retry + 1, self.max_retries)
             try:
-                logger.info(f'++++++++Trying request with account ID {current_account_id} and max_id: {params.get('max_id')}+++++++++')
-                response = requests.get(self.base_url, params=params, headers=headers, cookies=cookies, proxies=proxies, timeout=30)
+                logger.info("++++++++Trying request with account ID %s and max_id: %s+++++++++", current_account_id, params.get('max_id'))
+                with self.request_latency.time(**self.metric_labels):
+                    response = requests.get(self.base_url, params=params, headers=headers, cookies=cookies, proxies=proxies, timeout=30)
                 cookie_state.increment_request_count()
-                logger.info(f"Request status code: {response.status_code}")
+                self.requests_counter.inc(status=str(response.status_code), **self.metric_labels)
+                logger.info("Request status code: %s", response.status_code)
                 
                 response_size = len(response.content)
-                logger.debug(f"Response size: {response_size} bytes")
+                logger.debug("Response size: %s bytes", response_size)
                 
                 headers_size = len('\r\n'.join(f'{k}: {v}' for k, v in response.headers.items()))
-                logger.debug(f"Headers size: {headers_size} bytes")
+                logger.debug("Headers size: %s bytes", headers_size)
                 
                 total_size = response_size + headers_size
-                logger.debug(f"Total size: {total_size} bytes")
+                logger.debug("Total size: %s bytes", total_size)
                 
                 self.update_rate_limit_info(current_account_id, response.headers)
                 
                 response.raise_for_status()
                 data = response.json()
                 
-                logger.debug(f"Successfully fetched data")
-                logger.info(f"Response data: {json.dumps(data, indent=2)}")
+                logger.info("Fetched %s followers, next_max_id: %s, size: %s bytes", len(data.get('users', [])), data.get('next_max_id'), response_size)
+                if self.payload_archive:
+                    self.payload_archive.record(params.get('max_id'), data)
                 
                 cookie_state.last_request_time = time.time()
                 
@@ -507,9 +601,9 @@ class InstagramFollowerScraper:
                 
                 if not data['users']:
                     self.empty_users_count += 1
-                    logger.info(f"Empty users list received. Consecutive empty count: {self.empty_users_count}")
+                    logger.info("Empty users list received. Consecutive empty count: %s", self.empty_users_count)
                     if self.empty_users_count >= self.max_empty_users:
-                        logger.info(f"Received {self.max_empty_users} consecutive empty users lists. Stopping scraping.")
+                        logger.info("Received %s consecutive empty users lists. Stopping scraping.", self.max_empty_users)
                         self.stop_event.set()
                         self.scraping_status = "stopped"
                         self.scraping_stop_reason = "consecutive_empty_users"
@@ -531,12 +625,12 @@ class InstagramFollowerScraper:
                         else:
                             new_max_id = str(int(current_max_id) + self.small_step)
                         
-                        logger.info(f'Current max_id: {current_max_id}, length of users: {len(data.get("users", []))}, new_max_id: {new_max_id}')
+                        logger.info("Current max_id: %s, length of users: %s, new_max_id: %s", current_max_id, len(data.get("users", [])), new_max_id)
                         self.update_max_id(new_max_id, manual=True)
-                        logger.info(f"Incremented max_id manually to: {new_max_id}")
+                        logger.info("Incremented max_id manually to: %s", new_max_id)
                         return data
                     except ValueError as e:
-                        logger.error(f"Unable to increment max_id: {current_max_id}, error: {e}")
+                        logger.error("Unable to increment max_id: %s, error: %s", current_max_id, e)
                         return None
 
                 # If the request was successful, reset the cooldown time to 30 seconds
@@ -547,140 +641,79 @@ class InstagramFollowerScraper:
             
             
             except requests.exceptions.Timeout:
-                logger.info(f"Request timed out for account ID {current_account_id}, max_id: {params.get('max_id')}")
+                self.requests_counter.inc(status='timeout', **self.metric_labels)
+                logger.info("Request timed out for account ID %s, max_id: %s", current_account_id, params.get('max_id'))
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 400:
                     response_content = e.response.content.decode('utf-8')
                     if "challenge_required" in response_content:
-                        logger.error(f"Challenge required for account ID {current_account_id}. Disabling this account for the session.")
+                        logger.error("Challenge required for account ID %s. Disabling this account for the session.", current_account_id)
                         cookie_state.active = False
                         self.save_state()  # Save the updated state
                         return None  # This will cause the scraper to move to the next account
                     else:
-                        logger.error(f"HTTP Error 400 for account ID {current_account_id}, max_id: {params.get('max_id')}: {e}")
-                        logger.error(f"Response content: {response_content}")
+                        logger.error("HTTP Error 400 for account ID %s, max_id: %s: %s", current_account_id, params.get('max_id'), e)
+                        logger.error("Response content: %s", response_content)
                         return None
                 elif e.response.status_code == 401 and "Please wait" in e.response.text:
-                    logger.warning(f"Rate limit hit for account ID {current_account_id}. Setting cooldown to 5 minutes.")
+                    logger.warning("Rate limit hit for account ID %s. Setting cooldown to 5 minutes.", current_account_id)
                     cookie_state.cooldown_time = max(cookie_state.min_cooldown, 300)  # 5 minutes
                     cookie_state.is_rate_limited = True
                     self.increment_rate_limit_count(current_account_id)
                     return "RATE_LIMITED"
                 else:
-                    logger.error(f"HTTP Error for account ID {current_account_id}, max_id: {params.get('max_id')}: {e}")
-                    logger.error(f"Response content: {e.response.content}")
+                    logger.error("HTTP Error for account ID %s, max_id: %s: %s", current_account_id, params.get('max_id'), e)
+                    logger.error("Response content: %s", e.response.content)
                     if e.response.status_code in [400, 429]:
-                        logger.error(f"Error {e.response.status_code}: Possible rate limit. Current max_id: {params.get('max_id')}")
+                        logger.error("Error %s: Possible rate limit. Current max_id: %s", e.response.status_code, params.get('max_id'))
                         return None
             except requests.exceptions.RequestException as e:
-                logger.error(f"Request Exception for account ID {current_account_id}, max_id: {params.get('max_id')}: {e}")
+                logger.error("Request Exception for account ID %s, max_id: %s: %s", current_account_id, params.get('max_id'), e)
             except Exception as e:
-                logger.error(f"Unexpected error for account ID {current_account_id}, max_id: {params.get('max_id')}: {e}")
+                logger.error("Unexpected error for account ID %s, max_id: %s: %s", current_account_id, params.get('max_id'), e)
                 logger.error(traceback.format_exc())
             
-            logger.debug(f"Retrying in 5 seconds...")
+            logger.debug("Retrying in 5 seconds...")
             time.sleep(5)
         
-        logger.info(f"Max retries reached for account ID {current_account_id}")
+        logger.info("Max retries reached for account ID %s", current_account_id)
         return None
 
     def wait_with_jitter(self):
         activity_type = random.choices(['quick', 'normal', 'engaged'], weights=[0.5, 0.3, 0.2])[0]
         
         if activity_type == 'quick':
-            jitter = np.random.exponential(scale=1)
+            jitter = random.expovariate(1)
         elif activity_type == 'normal':
-            jitter = np.random.normal(loc=3, scale=1)
+            jitter = random.gauss(3, 1)
         else:
-            jitter = np.random.normal(loc=5, scale=2)
+            jitter = random.gauss(5, 2)
 
         if random.random() < 0.05:
-            jitter += np.random.uniform(1, 10)
+            jitter += random.uniform(1, 10)
 
         jitter = max(jitter, 0.5)
 
-        logger.debug(f"Waiting for {jitter:.2f} seconds.")
+        logger.debug("Waiting for %.2f seconds.", jitter)
         time.sleep(jitter)
 
     def guess_gender(self, name):
-        name_parts = name.split()
-        if name_parts:
-            first_name = name_parts[0]
-            return self.gender_detector.get_gender(first_name)
-        return 'unknown'
-
-    def save_followers(self, followers):
-        logger.debug(f"Entering save_followers method with {len(followers)} followers")
-        if not followers:
-            logger.debug("No followers to save.")
-            return
-
-        try:
-            connection = mysql.connector.connect(**self.db_config)
-            cursor = connection.cursor()
-
-            insert_query = """
-            INSERT INTO followers (
-                username, source_account, pk, pk_id, full_name, is_private, fbid_v2,
-                third_party_downloads_enabled, strong_id, profile_pic_id, profile_pic_url,
-                is_verified, has_anonymous_profile_picture, account_badges, latest_reel_media,
-                is_favorite, gender, csv_filename
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            ) ON DUPLICATE KEY UPDATE
-                source_account = VALUES(source_account),
-                pk = VALUES(pk),
-                pk_id = VALUES(pk_id),
-                full_name = VALUES(full_name),
-                is_private = VALUES(is_private),
-                fbid_v2 = VALUES(fbid_v2),
-                third_party_downloads_enabled = VALUES(third_party_downloads_enabled),
-                strong_id = VALUES(strong_id),
-                profile_pic_id = VALUES(profile_pic_id),
-                profile_pic_url = VALUES(profile_pic_url),
-                is_verified = VALUES(is_verified),
-                has_anonymous_profile_picture = VALUES(has_anonymous_profile_picture),
-                account_badges = VALUES(account_badges),
-                latest_reel_media = VALUES(latest_reel_media),
-                is_favorite = VALUES(is_favorite),
-                gender = VALUES(gender),
-                csv_filename = VALUES(csv_filename)
-            """
+        return gender_service.guess_gender(name)
 
-            for follower in followers:
-                gender = self.guess_gender(follower.get('full_name', ''))
-                data = (
-                    follower.get('username'),
-                    self.user_id,
-                    follower.get('pk'),
-                    follower.get('pk_id'),
-                    follower.get('full_name'),
-                    follower.get('is_private'),
-                    follower.get('fbid_v2'),
-                    follower.get('third_party_downloads_enabled'),
-                    follower.get('strong_id'),
-                    follower.get('profile_pic_id'),
-                    follower.get('profile_pic_url'),
-                    follower.get('is_verified'),
-                    follower.get('has_anonymous_profile_picture'),
-                    json.dumps(follower.get('account_badges', [])),
-                    follower.get('latest_reel_media'),
-                    follower.get('is_favorite'),
-                    gender,
-                    self.csv_filename
-                )
-                cursor.execute(insert_query, data)
-
-            connection.commit()
-            logger.info(f"Inserted/Updated {len(followers)} followers in the database")
+    def close_resources(self):
+        if self.owns_follower_writer:
+            self.follower_writer.close()
+        else:
+            try:
+                self.follower_writer.flush()
+            except WriteBehindError as e:
+                logger.error("Shared follower writer failed for user %s: %s", self.user_id, e)
+        if self.payload_archive:
+            self.payload_archive.close()
+        self.metrics.unregister_collector(self.collect_metrics)
 
-        except Error as e:
-            logger.error(f"Error saving followers to database: {e}")
-
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
+    def save_followers(self, entries):
+        save_followers(self.db_pool, entries, batch_size=self.db_batch_size)
 
     def increment_rate_limit_count(self, account_id):
         current_time = time.time()
@@ -694,37 +727,56 @@ class InstagramFollowerScraper:
         self.rate_limit_counts[account_id] = []
 
     def save_state(self):
-        state = {
-            'current_max_id': self.current_max_id,
-            'base_encoded_part': self.base_encoded_part,
-            'global_iteration': self.global_iteration,
-            'total_followers_scraped': self.total_followers_scraped,
-            'unique_followers': list(self.unique_followers),
-            'cookie_states': {
-                self.account_data[cs.index]['id']: {
-                    'active': cs.active,
-                    'fail_count': cs.fail_count,
-                    'requests_this_hour': cs.requests_this_hour,
-                    'hour_start': cs.hour_start
-                } for cs in self.cookie_states
-            },
-            'scraping_status': self.scraping_status,
-            'scraping_stop_reason': self.scraping_stop_reason,
-            'start_time': self.start_time
-        }
-        with open(f'Files/States/{self.user_id}_state.json', 'w') as f:
-            json.dump(state, f)
-        logger.info(f"State saved for user {self.user_id}")
+        # Never checkpoint a cursor ahead of the followers that have actually been written
+        try:
+            self.follower_writer.flush()
+        except WriteBehindError as e:
+            # Keep the last good checkpoint; a restart refetches the pages whose followers were lost
+            logger.error("Not saving state for user %s: %s", self.user_id, e)
+            if self.scraping_status != "error":
+                self.scraping_status = "error"
+                self.scraping_stop_reason = "database write failed"
+            self.stop_event.set()
+            return
+        with self.state_lock:
+            # Journal first so the header never claims followers the journal doesn't have
+            self.follower_journal.append(self.pending_unique_followers)
+            self.pending_unique_followers = []
+            state = {
+                'current_max_id': self.current_max_id,
+                'base_encoded_part': self.base_encoded_part,
+                'global_iteration': self.global_iteration,
+                'total_followers_scraped': self.total_followers_scraped,
+                'unique_followers_count': len(self.unique_followers),
+                'cookie_states': {
+                    self.account_data[cs.index]['id']: {
+                        'active': cs.active,
+                        'fail_count': cs.fail_count,
+                        'requests_this_hour': cs.requests_this_hour,
+                        'hour_start': cs.hour_start
+                    } for cs in self.cookie_states
+                },
+                'scraping_status': self.scraping_status,
+                'scraping_stop_reason': self.scraping_stop_reason,
+                'start_time': self.start_time
+            }
+            write_json_atomic(self.state_path, state)
+            if self.follower_journal.needs_compaction():
+                self.follower_journal.compact(self.unique_followers)
+        logger.info("State saved for user %s", self.user_id)
 
     def load_state(self):
         try:
-            with open(f'Files/States/{self.user_id}_state.json', 'r') as f:
+            with open(self.state_path, 'r') as f:
                 state = json.load(f)
             self.current_max_id = state['current_max_id']
             self.base_encoded_part = state['base_encoded_part']
             self.global_iteration = state['global_iteration']
             self.total_followers_scraped = state['total_followers_scraped']
-            self.unique_followers = set(state.get('unique_followers', []))
+            self.unique_followers = self.follower_journal.load()
+            if 'unique_followers' in state:
+                # Older state files embed a set of usernames, which can't be mapped back to pks
+                logger.warning("Ignoring %s username-keyed unique followers from legacy state for user %s", len(state['unique_followers']), self.user_id)
             for account_id, cs_state in state['cookie_states'].items():
                 if account_id in self.account_id_to_index:
                     index = self.account_id_to_index[account_id]
@@ -736,54 +788,33 @@ class InstagramFollowerScraper:
             self.scraping_status = state.get('scraping_status', 'in_progress')
             self.scraping_stop_reason = state.get('scraping_stop_reason', None)
             self.start_time = state.get('start_time', time.time())
-            logger.info(f"State loaded for user {self.user_id}")
+            logger.info("State loaded for user %s", self.user_id)
         except FileNotFoundError:
-            logger.info(f"No previous state found for user {self.user_id}")
+            logger.info("No previous state found for user %s", self.user_id)
+
+    def collect_metrics(self):
+        elapsed = time.time() - self.start_time
+        unique_followers_count = len(self.unique_followers)
+        self.metrics.gauge('unique_followers', 'Distinct follower pks seen').set(unique_followers_count, **self.metric_labels)
+        self.metrics.gauge('unique_followers_per_hour', 'Unique followers per hour since start').set(
+            unique_followers_count / elapsed * 3600 if elapsed > 0 else 0, **self.metric_labels)
+        self.metrics.gauge('follower_empty_pages', 'Consecutive empty follower pages').set(self.empty_users_count, **self.metric_labels)
+        self.metrics.gauge('accounts_available', 'Accounts able to make a request now').set(
+            sum(1 for cs in self.cookie_states if cs.active and cs.can_make_request()), scraper='followers')
+        self.metrics.gauge('gender_cache_hit_rate', 'First-name gender cache hit rate').set(gender_service.cache_stats()['hit_rate'])
+        record_writer_stats(self.metrics, self.follower_writer)
 
     def monitor_performance(self):
-        current_time = time.time()
-        total_requests = sum(cs.requests_this_hour for cs in self.cookie_states)
-        total_failures = sum(cs.fail_count for cs in self.cookie_states)
-        success_rate = (total_requests - total_failures) / total_requests if total_requests > 0 else 0
-        
         current_unique_followers_count = len(self.unique_followers)
-        
-        # Calculate time elapsed in different units
-        time_elapsed_minutes = (current_time - self.start_time) / 60
-        time_elapsed_hours = time_elapsed_minutes / 60
-        time_elapsed_days = time_elapsed_hours / 24
-
-        # Calculate unique users per minute, hour, and day
-        unique_users_per_minute = current_unique_followers_count / time_elapsed_minutes if time_elapsed_minutes > 0 else 0
-        unique_users_per_hour = current_unique_followers_count / time_elapsed_hours if time_elapsed_hours > 0 else 0
-        unique_users_per_day = current_unique_followers_count / time_elapsed_days if time_elapsed_days > 0 else 0
-        
-        # Calculate percentage loss between total and unique followers
-        percentage_loss = ((self.total_followers_scraped - current_unique_followers_count) / self.total_followers_scraped * 100) if self.total_followers_scraped > 0 else 0
-        
-        logger.info(f"-----------------")
-        logger.info(f"Performance Monitor:")
-        logger.info(f"Total followers scraped: {self.total_followers_scraped}")
-        logger.info(f"Total unique followers scraped: {current_unique_followers_count}")
-        logger.info(f"Percentage loss: {percentage_loss:.2f}%")
-        logger.info(f"Unique users per minute: {unique_users_per_minute:.2f}")
-        logger.info(f"Unique users per hour: {unique_users_per_hour:.2f}")
-        logger.info(f"Unique users per day: {unique_users_per_day:.2f}")
-        logger.info(f"Total requests made: {total_requests}")
-        logger.info(f"Success rate: {success_rate:.2%}")
-        logger.info(f"Rate limit info: {self.rate_limit_info}")
-        logger.info(f"Rate limit counts: {self.rate_limit_counts}")
-        logger.info(f'Consecutive empty users lists: {self.empty_users_count}')
-        logger.info(f"-----------------")
+        logger.debug("Performance check: %s followers, %s unique, %s consecutive empty pages", self.total_followers_scraped, current_unique_followers_count, self.empty_users_count)
 
         if current_unique_followers_count > self.last_unique_followers_count:
-            logger.info(f"Unique followers increased from {self.last_unique_followers_count} to {current_unique_followers_count}")
             self.unchanged_unique_followers_count = 0
         elif current_unique_followers_count == self.last_unique_followers_count and self.total_followers_scraped != self.last_followers_scraped:
             self.unchanged_unique_followers_count += 1
-            logger.info(f"Unique followers unchanged. Consecutive unchanged count: {self.unchanged_unique_followers_count}")
-        else:
-            logger.warning(f"Unique followers decreased from {self.last_unique_followers_count} to {current_unique_followers_count}. This should not happen.")
+            logger.info("Unique followers unchanged. Consecutive unchanged count: %s", self.unchanged_unique_followers_count)
+        elif current_unique_followers_count < self.last_unique_followers_count:
+            logger.warning("Unique followers decreased from %s to %s. This should not happen.", self.last_unique_followers_count, current_unique_followers_count)
 
         if self.unchanged_unique_followers_count >= 3:
             logger.warning("Unique followers count unchanged for 3 consecutive checks. Increasing max_id by 100.")
@@ -794,31 +825,14 @@ class InstagramFollowerScraper:
             self.manual_increases += 1
 
         if self.manual_increases >= self.max_unchanged_count:
-            logger.warning(f"Unique followers count unchanged for {self.max_unchanged_count} consecutive checks. Triggering stop event.")
+            logger.warning("Unique followers count unchanged for %s consecutive checks. Triggering stop event.", self.max_unchanged_count)
             self.stop_event.set()
             self.scraping_status = "stopped"
             self.scraping_stop_reason = "no_new_unique_followers"
-        
+
         self.last_unique_followers_count = current_unique_followers_count
         self.last_followers_scraped = self.total_followers_scraped
 
-        available_accounts = []
-        rate_limited_accounts = []
-        current_time = time.time()
-
-        for cs in self.cookie_states:
-            account_id = self.index_to_account_id[cs.index]
-            if cs.can_make_request():
-                available_accounts.append(account_id)
-            else:
-                time_until_available = max(cs.min_cooldown, cs.cooldown_time - (current_time - cs.last_request_time))
-                rate_limited_accounts.append((account_id, time_until_available))
-
-        logger.info(f"Available accounts: {', '.join(map(str, available_accounts))}")
-        logger.info("Rate-limited accounts:")
-        for account_id, time_until_available in rate_limited_accounts:
-            logger.info(f"  Account ID {account_id}: {time_until_available:.2f} seconds until available")
-
     def log_account_status(self):
         available_accounts = []
         rate_limited_accounts = []
@@ -834,19 +848,19 @@ class InstagramFollowerScraper:
                 rate_limited_accounts.append((account_id, time_until_available))
                 self.account_wait_times[account_id] = time_until_available
 
-        logger.info(f"Available accounts: {', '.join(map(str, available_accounts))}")
+        logger.info("Available accounts: %s", ', '.join(map(str, available_accounts)))
         logger.info("Rate-limited accounts:")
         for account_id, time_until_available in rate_limited_accounts:
-            logger.info(f"  Account ID {account_id}: {time_until_available:.2f} seconds until available")
+            logger.info("  Account ID %s: %.2f seconds until available", account_id, time_until_available)
 
     def check_and_update_cookie(self, cookie_state):
         account_id = self.index_to_account_id[cookie_state.index]
-        logger.debug(f"Checking for new cookie for account ID {account_id}")
+        logger.debug("Checking for new cookie for account ID %s", account_id)
         new_cookie = self.get_new_cookie_from_db(account_id, cookie_state.cookie)
         if new_cookie and new_cookie != cookie_state.cookie:
-            logger.info(f"New cookie found for account ID {account_id}. Updating.")
-            logger.info(f'New cookie: {new_cookie}')
-            logger.info(f'Current cookie: {cookie_state.cookie}')
+            logger.info("New cookie found for account ID %s. Updating.", account_id)
+            logger.info("New cookie: %s", new_cookie)
+            logger.info("Current cookie: %s", cookie_state.cookie)
             cookie_state.cookie = new_cookie
             cookie_state.active = True
             cookie_state.fail_count = 0
@@ -855,11 +869,83 @@ class InstagramFollowerScraper:
             cookie_state.last_cookie_check = time.time()
             self.account_wait_times[account_id] = 30
         else:
-            logger.debug(f"No new cookie found for account ID {account_id}")
+            logger.debug("No new cookie found for account ID %s", account_id)
         return cookie_state
 
+class FollowerJobRunner:
+    """Scrapes the followers of many targets one after another in a single process.
+
+    The DB pool, follower writer and metrics reporter are created once and handed
+    to every InstagramFollowerScraper, so a target only pays for its own state,
+    cookie bookkeeping and payload archive. Targets run one at a time, and each
+    job reserves a connection per account worker plus one for the writer on the
+    shared pool. Runners sharing a db_config in one process share that pool too,
+    so concurrent runners need their workers combined, which the pool caps at
+    CNX_POOL_MAXSIZE (32) connections.
+    """
+
+    def __init__(self, account_data, db_config, csv_filename, db_batch_size=500, archive_dir='Files/Archive',
+                 metrics=None, summary_interval=60, textfile_path=None):
+        self.account_data = json.loads(account_data) if isinstance(account_data, str) else account_data
+        self.db_config = json.loads(db_config) if isinstance(db_config, str) else db_config
+        self.csv_filename = csv_filename
+        self.db_batch_size = db_batch_size
+        self.archive_dir = archive_dir
+        self.metrics = metrics or REGISTRY
+        self.summary_interval = summary_interval
+        self.textfile_path = textfile_path
+        # One connection per account worker plus one for the follower writer
+        self.db_pool = get_pool(self.db_config, workers=len(self.account_data) + 1)
+        self.follower_writer = WriteBehindQueue(self.save_followers, name="followers", batch_size=self.db_batch_size)
+        self.results = {}
+
+    def save_followers(self, entries):
+        save_followers(self.db_pool, entries, batch_size=self.db_batch_size)
+
+    def run_target(self, user_id):
+        scraper = InstagramFollowerScraper(
+            user_id, self.csv_filename, self.account_data, self.db_config,
+            db_batch_size=self.db_batch_size,
+            archive_dir=self.archive_dir,
+            metrics=self.metrics,
+            db_pool=self.db_pool,
+            follower_writer=self.follower_writer,
+            summary_interval=None
+        )
+        logger.info("Scraping followers for User ID: %s", user_id)
+        scraper.main()
+        return {
+            'total_followers_scraped': scraper.total_followers_scraped,
+            'unique_followers_count': len(scraper.unique_followers),
+            'scraping_status': scraper.scraping_status,
+            'scraping_stop_reason': scraper.scraping_stop_reason
+        }
+
+    def run(self, user_ids):
+        """Scrape each target in turn; returns {user_id: summary} for the targets run so far."""
+        reporter = SummaryReporter(self.metrics, interval=self.summary_interval, textfile_path=self.textfile_path).start()
+        try:
+            for user_id in user_ids:
+                try:
+                    self.results[str(user_id)] = self.run_target(user_id)
+                except Exception as e:
+                    logger.error("Error occurred while scraping User ID %s: %s", user_id, str(e))
+                    logger.error(traceback.format_exc())
+                    self.results[str(user_id)] = {'scraping_status': 'error', 'scraping_stop_reason': str(e)}
+                if self.follower_writer.last_error is not None:
+                    # Later targets could not checkpoint either, since the shared writer keeps failing flush()
+                    logger.error("Stopping after User ID %s: the follower writer failed to save a batch", user_id)
+                    break
+        finally:
+            reporter.stop()
+        return self.results
+
+    def close(self):
+        self.follower_writer.close()
+
 def main():
     import sys
+    setup_logging(log_path='debug.log')
     if len(sys.argv) != 5:
         print("Usage: python v4_scraper.py <user_id> <csv_filename> <account_data_json> <db_config_json>")
         sys.exit(1)
@@ -870,8 +956,8 @@ def main():
     db_config = sys.argv[4]
 
     scraper = InstagramFollowerScraper(user_id, csv_filename, account_data, db_config)
-    logger.info(f"Scraping followers for User ID: {user_id}")
-    logger.info(f"Using accounts with IDs: {', '.join(str(id) for id in scraper.account_id_to_index.keys())}")
+    logger.info("Scraping followers for User ID: %s", user_id)
+    logger.info("Using accounts with IDs: %s", ', '.join(str(id) for id in scraper.account_id_to_index.keys()))
     scraper.main()
 
 if __name__ == "__main__":
@@ -2,38 +2,45 @@ import json
 import time
 import requests
 import csv
+import os
 import random
 import logging
 import traceback
 from mysql.connector import Error
-import mysql.connector
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import numpy as np
 from datetime import datetime, timedelta
 import threading
-from mysql.connector.pooling import MySQLConnectionPool
 from db_utils import (
     get_database_connection,
+    get_pool,
     get_accounts_from_database,
     prepare_account_data,
     update_account_last_checked,
     mark_account_invalid
 )
+from write_behind import WriteBehindQueue
+from user_id_cache import get_user_id_cache
+from metrics import REGISTRY, SummaryReporter, record_writer_stats
+from work_queue import WorkQueue
+from log_setup import setup_logging
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class InstagramUserIDScraper:
-    def __init__(self, usernames, csv_filename, account_data, db_config):
+    def __init__(self, usernames, csv_filename, account_data, db_config, metrics=None, user_id_cache=None, work_queue=None):
         self.usernames = usernames
         self.csv_filename = csv_filename
         self.account_data = json.loads(account_data)
         self.db_config = json.loads(db_config)
-        self.db_pool = mysql.connector.pooling.MySQLConnectionPool(pool_name="mypool", pool_size=5, **self.db_config)
+        # One connection per request thread, plus one for the write-behind flush
+        self.db_pool = get_pool(self.db_config, workers=len(self.account_data) + 1)
         self.account_id_to_index = {}
         self.setup_accounts()
         self.processed_usernames = set()
+        self.user_id_cache = user_id_cache or get_user_id_cache()
+        self.work_queue = work_queue  # Shares the fetches with other workers when set
         self.existing_user_ids = self.load_existing_user_ids()
+        self.cached_user_ids = {}  # Resolved from the shared cache, e.g. by another campaign
         self.account_timeouts = {}
         self.account_lock = threading.Lock()
         self.last_response_text = ""
@@ -41,6 +48,16 @@ class InstagramUserIDScraper:
         self.successful_fetches = 0  # Add this line to initialize the counter
         self.username_tried_accounts = {}  # New dictionary to track tried accounts per username
         self.new_user_ids = {}  # Add this line to store newly scraped user IDs
+        self.results_file = None
+        self.results_writer = None
+        self.written_usernames = set()  # Usernames already in the results CSV, so reruns do not repeat them
+        self.user_id_writer = WriteBehindQueue(self.save_user_ids, name=f"user_ids-{self.csv_filename}", batch_size=200)
+        self.metrics = metrics or REGISTRY
+        self.metric_labels = {'campaign': self.csv_filename}
+        self.requests_counter = self.metrics.counter('user_id_requests_total', 'Username lookups by outcome')
+        self.request_latency = self.metrics.histogram('user_id_request_seconds', 'Username lookup latency')
+        self.summary_interval = 60
+        self.metrics.register_collector(self.collect_metrics)
 
     def load_existing_user_ids(self):
         existing_user_ids = {}
@@ -51,14 +68,14 @@ class InstagramUserIDScraper:
             cursor = connection.cursor(dictionary=True)
             query = """
             SELECT username, user_id FROM user_ids
-            WHERE csv_filename = %s
+            WHERE csv_filename = %s AND user_id IS NOT NULL
             """
             cursor.execute(query, (self.csv_filename,))
             for row in cursor.fetchall():
                 existing_user_ids[row['username']] = row['user_id']
-            logger.info(f"Loaded {len(existing_user_ids)} existing user IDs from database.")
+            logger.info("Loaded %s existing user IDs from database.", len(existing_user_ids))
         except Error as e:
-            logger.error(f"Error loading existing user IDs from database: {e}")
+            logger.error("Error loading existing user IDs from database: %s", e)
         finally:
             if cursor:
                 cursor.close()
@@ -83,7 +100,7 @@ class InstagramUserIDScraper:
                     soonest_available = min(self.account_timeouts.values())
                     wait_time = max(0, (soonest_available - current_time).total_seconds())
                     if wait_time > 0:
-                        logger.info(f"All accounts on timeout. Waiting {wait_time:.2f} seconds for next available account.")
+                        logger.info("All accounts on timeout. Waiting %.2f seconds for next available account.", wait_time)
                         self.display_account_status()
                         time.sleep(wait_time)
                     # After waiting, check again for available accounts
@@ -97,6 +114,15 @@ class InstagramUserIDScraper:
             
             return None
 
+    def collect_metrics(self):
+        record_writer_stats(self.metrics, self.user_id_writer)
+        current_time = datetime.now()
+        with self.account_lock:
+            cooling_down = sum(1 for timeout in self.account_timeouts.values() if current_time <= timeout)
+        self.metrics.gauge('accounts_available', 'Accounts able to make a request now').set(len(self.account_data) - cooling_down, scraper='user_ids')
+        self.metrics.gauge('accounts_cooling_down', 'Accounts on timeout').set(cooling_down, scraper='user_ids')
+        self.metrics.gauge('usernames_processed', 'Processed usernames').set(len(self.processed_usernames), **self.metric_labels)
+
     def display_account_status(self):
         current_time = datetime.now()
         active_accounts = []
@@ -111,7 +137,7 @@ class InstagramUserIDScraper:
                     cooldown_accounts[account_id] = self.account_timeouts[account_id]
         
         logger.info("Account Status:")
-        logger.info(f"Active accounts: {', '.join(map(str, active_accounts))}")
+        logger.info("Active accounts: %s", ', '.join(map(str, active_accounts)))
         
         if active_accounts:
             logger.info("Active account details:")
@@ -119,15 +145,15 @@ class InstagramUserIDScraper:
                 if account_id in self.account_jitter_info:
                     last_jitter_wait, last_jitter_time = self.account_jitter_info[account_id]
                     remaining_wait = max(0, last_jitter_wait - (time.time() - last_jitter_time))
-                    logger.info(f"  Account {account_id}: Jitter wait remaining: {remaining_wait:.2f} seconds")
+                    logger.info("  Account %s: Jitter wait remaining: %.2f seconds", account_id, remaining_wait)
                 else:
-                    logger.info(f"  Account {account_id}: No current jitter wait")
+                    logger.info("  Account %s: No current jitter wait", account_id)
         
         if cooldown_accounts:
             logger.info("Accounts in cooldown:")
             for account_id, timeout in cooldown_accounts.items():
                 remaining_time = max(0, (timeout - current_time).total_seconds())
-                logger.info(f"  Account {account_id}: {remaining_time:.2f} seconds remaining")
+                logger.info("  Account %s: %.2f seconds remaining", account_id, remaining_time)
         else:
             logger.info("No accounts in cooldown")
 
@@ -147,13 +173,13 @@ class InstagramUserIDScraper:
             cursor.execute(query, (account_id,))
             result = cursor.fetchone()
             if result:
-                logger.debug(f"Retrieved latest cookie for account ID {account_id}")
+                logger.debug("Retrieved latest cookie for account ID %s", account_id)
                 return result['cookies']
             else:
-                logger.debug(f"No cookie found for account ID {account_id}")
+                logger.debug("No cookie found for account ID %s", account_id)
                 return None
         except Error as e:
-            logger.error(f"Error fetching new cookie from database: {e}")
+            logger.error("Error fetching new cookie from database: %s", e)
         finally:
             if cursor:
                 cursor.close()
@@ -163,15 +189,15 @@ class InstagramUserIDScraper:
 
     def check_and_update_cookie(self, account):
         account_id = account['id']
-        logger.debug(f"Checking for new cookie for account ID {account_id}")
+        logger.debug("Checking for new cookie for account ID %s", account_id)
         new_cookie = self.get_new_cookie_from_db(account_id, account['cookies'])
         if new_cookie and new_cookie != account['cookies']:
-            logger.info(f"New cookie found for account ID {account_id}. Updating.")
-            logger.info(f'New cookie: {new_cookie}')
-            logger.info(f'Current cookie: {account["cookies"]}')
+            logger.info("New cookie found for account ID %s. Updating.", account_id)
+            logger.info("New cookie: %s", new_cookie)
+            logger.info("Current cookie: %s", account["cookies"])
             account['cookies'] = new_cookie
         else:
-            logger.debug(f"No new cookie found for account ID {account_id}")
+            logger.debug("No new cookie found for account ID %s", account_id)
         return account
 
     def fetch_user_id(self, username, account):
@@ -206,75 +232,97 @@ class InstagramUserIDScraper:
         }
 
         try:
-            response = requests.get(url, headers=headers, cookies=cookies, proxies=proxies)
+            with self.request_latency.time(**self.metric_labels):
+                response = requests.get(url, headers=headers, cookies=cookies, proxies=proxies)
+            self.requests_counter.inc(status=str(response.status_code), **self.metric_labels)
             self.last_response_text = response.text  # Store the response text
             
             if response.status_code == 200:
                 data = response.json()
-                if 'data' in data and 'user' in data['data'] and 'id' in data['data']['user']:
-                    user_id = data['data']['user']['id']
-                    return user_id
-                else:
-                    logger.warning(f"User data not found for {username}")
+                user_data = data.get('data') if isinstance(data, dict) else None
+                if isinstance(user_data, dict) and 'user' in user_data and user_data['user'] is None:
+                    logger.info("Username %s not found (user is null)", username)
                     return "NOT_FOUND"
+                user = user_data.get('user') if isinstance(user_data, dict) else None
+                if isinstance(user, dict) and 'id' in user:
+                    return user['id']
+                # A login wall, soft block or changed payload says nothing about the username; retry it
+                logger.warning("Unexpected profile payload for %s: %s", username, self.last_response_text[:200])
+                return None
             elif response.status_code == 404:
-                logger.info(f"Username {username} not found (404 error)")
+                logger.info("Username %s not found (404 error)", username)
                 return "NOT_FOUND"
             else:
-                logger.warning(f"Failed to fetch user ID for {username}. Status code: {response.status_code}")
-                logger.info(f"Response: {self.last_response_text}")
+                logger.warning("Failed to fetch user ID for %s. Status code: %s", username, response.status_code)
+                logger.info("Response: %s", self.last_response_text)
                 return None
         except Exception as e:
-            logger.error(f"Error occurred while fetching user ID for {username}: {str(e)}.")
+            self.requests_counter.inc(status='error', **self.metric_labels)
+            logger.error("Error occurred while fetching user ID for %s: %s.", username, str(e))
             self.last_response_text = str(e)  # Store the error message
-            if "argument of type 'NoneType' is not iterable" in str(e):
-                logger.info(f"Marking {username} as NOT_FOUND due to NoneType error")
-                return "NOT_FOUND"
             return None
 
     def scrape_user_ids(self):
         start_time = time.time()
         total_usernames = len(self.usernames)
         processed_count = 0
+        to_resolve = []
+        for username in self.usernames:
+            if username in self.existing_user_ids:
+                logger.debug("Skipping %s as it already exists in the database.", username)
+                self.processed_usernames.add(username)
+                processed_count += 1
+            elif username not in self.processed_usernames:
+                to_resolve.append(username)
+        logger.info("Skipping %s usernames that already exist in the database.", processed_count)
+
+        # Usernames resolved for other campaigns, or recently reported missing, need no fetch
+        self.cached_user_ids, cached_not_found, to_fetch = self.user_id_cache.lookup(to_resolve)
+        self.processed_usernames.update(self.cached_user_ids)
+        self.processed_usernames.update(cached_not_found)
+        processed_count += len(self.cached_user_ids) + len(cached_not_found)
+        logger.info("Resolved %s usernames from the user ID cache, %s cached as not found", len(self.cached_user_ids), len(cached_not_found))
+
+        self.open_results_csv()
+        self.append_results(self.cached_user_ids.items())
+        reporter = SummaryReporter(self.metrics, interval=self.summary_interval).start()
 
         with ThreadPoolExecutor(max_workers=len(self.account_data)) as executor:
-            futures = []
-            for username in self.usernames:
-                if username not in self.processed_usernames and username not in self.existing_user_ids:
-                    futures.append(executor.submit(self.process_single_username, username))
-                elif username in self.existing_user_ids:
-                    logger.info(f"Skipping {username} as it already exists in the database.")
-                    self.processed_usernames.add(username)
-                    processed_count += 1
-            
-            total_to_process = len(futures)
-            for i, future in enumerate(as_completed(futures), 1):
+            if self.work_queue is not None:
+                self.work_queue.enqueue(to_fetch)
+                futures = self.work_queue.run(executor, self.process_single_username, len(self.account_data))
+            else:
+                futures = as_completed([executor.submit(self.process_single_username, username) for username in to_fetch])
+
+            for future in futures:
                 future.result()
                 processed_count += 1
-                
-                if i % 2 == 0 or i == total_to_process:
-                    self.display_account_status()
-                    self.display_progress(processed_count, total_usernames, start_time)
 
+        self.user_id_writer.close()
+        if self.work_queue is not None:
+            self.work_queue.close()
+        reporter.stop()
+        self.metrics.unregister_collector(self.collect_metrics)
+        self.display_progress(processed_count, total_usernames, start_time)
         self.save_results()
-        logger.info(f"Scraping completed. Processed {len(self.processed_usernames)} usernames.")
-        return self.new_user_ids  # Add this line to return the newly scraped user IDs
+        logger.info("Scraping completed. Processed %s usernames.", len(self.processed_usernames))
+        return {**self.cached_user_ids, **self.new_user_ids}
 
     def display_progress(self, processed_count, total_usernames, start_time):
         elapsed_time = time.time() - start_time
         progress_percentage = (processed_count / total_usernames) * 100
         
-        logger.info(f"Progress: {processed_count}/{total_usernames} ({progress_percentage:.2f}%)")
+        logger.info("Progress: %s/%s (%.2f%%)", processed_count, total_usernames, progress_percentage)
 
         if elapsed_time > 0:
             overall_rate = self.successful_fetches / elapsed_time
-            logger.info(f"Overall processing rate: {overall_rate:.2f} successful usernames/second")
-            logger.info(f"Total successful fetches: {self.successful_fetches}")
+            logger.info("Overall processing rate: %.2f successful usernames/second", overall_rate)
+            logger.info("Total successful fetches: %s", self.successful_fetches)
             
             if overall_rate > 0:
                 remaining_usernames = total_usernames - self.successful_fetches
                 estimated_time_remaining = remaining_usernames / overall_rate
-                logger.info(f"Estimated time remaining: {timedelta(seconds=int(estimated_time_remaining))}")
+                logger.info("Estimated time remaining: %s", timedelta(seconds=int(estimated_time_remaining)))
             else:
                 logger.info("Estimated time remaining: Unable to calculate (processing rate is 0)")
         else:
@@ -284,32 +332,32 @@ class InstagramUserIDScraper:
         unsuccessful_attempts = processed_count - self.successful_fetches
         if unsuccessful_attempts > 0:
             unsuccessful_rate = unsuccessful_attempts / elapsed_time
-            logger.info(f"Unsuccessful attempts: {unsuccessful_attempts}")
-            logger.info(f"Unsuccessful rate: {unsuccessful_rate:.2f} usernames/second")
+            logger.info("Unsuccessful attempts: %s", unsuccessful_attempts)
+            logger.info("Unsuccessful rate: %.2f usernames/second", unsuccessful_rate)
 
     def wait_with_jitter(self, account_id):
         activity_type = random.choices(['quick', 'normal', 'engaged'], weights=[0.3, 0.5, 0.2])[0]
         
         if activity_type == 'quick':
-            jitter = np.random.exponential(scale=2)
+            jitter = random.expovariate(1 / 2)
         elif activity_type == 'normal':
-            jitter = np.random.normal(loc=10, scale=5)
+            jitter = random.gauss(10, 5)
         else:  # engaged
-            jitter = np.random.normal(loc=30, scale=10)
+            jitter = random.gauss(30, 10)
 
         # Add micro-breaks
         if random.random() < 0.1:  # 10% chance of a micro-break
-            jitter += np.random.uniform(60, 300)  # 1-5 minute break
+            jitter += random.uniform(60, 300)  # 1-5 minute break
 
         # Ensure minimum wait time
         jitter = max(jitter, 15)
 
-        logger.info(f"Waiting for {jitter:.2f} seconds for account {account_id}.")
+        logger.info("Waiting for %.2f seconds for account %s.", jitter, account_id)
         self.account_jitter_info[account_id] = (jitter, time.time())
         time.sleep(jitter)
 
     def process_single_username(self, username):
-        logger.info(f"Processing username {username}")
+        logger.info("Processing username %s", username)
         max_retries = 5
         retries = 0
         self.username_tried_accounts[username] = set()  # Initialize set of tried accounts for this username
@@ -319,21 +367,21 @@ class InstagramUserIDScraper:
             while account is None:
                 account = self.get_next_available_account()
                 if account is None:
-                    logger.warning(f"No available accounts. Waiting before retry for username {username}")
+                    logger.warning("No available accounts. Waiting before retry for username %s", username)
                     self.display_account_status()
                     time.sleep(5)
                 elif account['id'] in self.username_tried_accounts[username]:
-                    logger.info(f"Account {account['id']} already tried for {username}, looking for another account")
+                    logger.info("Account %s already tried for %s, looking for another account", account['id'], username)
                     account = None
 
             if account:
                 self.username_tried_accounts[username].add(account['id'])
 
             try:
-                self.display_account_status()
                 user_id = self.fetch_user_id(username, account)
                 if user_id == "NOT_FOUND":
-                    logger.info(f"Username {username} not found. Skipping.")
+                    logger.info("Username %s not found. Skipping.", username)
+                    self.user_id_writer.put((username, None))  # Negative cache entry
                     self.processed_usernames.add(username)
                     self.wait_with_jitter(account['id'])
                     return
@@ -343,87 +391,88 @@ class InstagramUserIDScraper:
                     self.new_user_ids[username] = user_id  # Add this line
                     with self.account_lock:
                         self.successful_fetches += 1  # Increment the counter for successful fetches
-                    logger.info(f"Successfully processed username {username}")
+                    logger.info("Successfully processed username %s", username)
                     self.wait_with_jitter(account['id'])
                     return
                 else:
-                    logger.warning(f"Failed to fetch user ID for username {username}")
+                    logger.warning("Failed to fetch user ID for username %s", username)
                     self.set_account_timeout(account['id'])
             except Exception as e:
-                logger.error(f"Error occurred while scraping username {username}: {str(e)}")
+                logger.error("Error occurred while scraping username %s: %s", username, str(e))
                 logger.error(traceback.format_exc())
                 self.set_account_timeout(account['id'])
 
             self.wait_with_jitter(account['id'])
             retries += 1
 
-        logger.error(f"Max retries reached for username {username}. Skipping.")
+        logger.error("Max retries reached for username %s. Skipping.", username)
+        if self.work_queue is not None:
+            self.work_queue.release([username], "max retries reached")
 
     def set_account_timeout(self, account_id):
         timeout_until = datetime.now() + timedelta(minutes=5)
         with self.account_lock:
             self.account_timeouts[account_id] = timeout_until
-        logger.info(f"Account {account_id} set on timeout until {timeout_until}")
+        logger.info("Account %s set on timeout until %s", account_id, timeout_until)
         self.display_account_status()  # Display account status after setting a timeout
 
     def save_user_id(self, username, user_id):
+        self.user_id_writer.put((username, user_id))
+
+    def save_user_ids(self, results):
+        rows = self.user_id_cache.rows(results, self.csv_filename)
         connection = None
-        cursor = None
         try:
             connection = self.db_pool.get_connection()
-            cursor = connection.cursor()
-
-            query = """
-            INSERT INTO user_ids (username, user_id, csv_filename)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE user_id = VALUES(user_id)
-            """
-            cursor.execute(query, (username, user_id, self.csv_filename))
-            connection.commit()
-
+            self.user_id_cache.store(connection, rows)
         except Error as e:
-            logger.error(f"Error saving user ID to database: {e}")
+            logger.error("Error saving user IDs to database: %s", e)
+            if self.work_queue is not None:
+                self.work_queue.release([username for username, _ in results], "database write failed")
+        else:
+            self.append_results((username, user_id) for username, user_id in results if user_id is not None)
+            if self.work_queue is not None:
+                self.work_queue.complete([username for username, _ in results])
         finally:
-            if cursor:
-                cursor.close()
             if connection:
                 connection.close()
 
-    def save_results(self):
-        try:
-            connection = mysql.connector.connect(**self.db_config)
-            cursor = connection.cursor()
-
-            query = """
-            INSERT INTO user_ids (username, user_id, csv_filename)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE user_id = VALUES(user_id)
-            """
-            
-            for username, user_id in self.existing_user_ids.items():
-                cursor.execute(query, (username, user_id, self.csv_filename))
-            
-            connection.commit()
-            logger.info(f"Saved {len(self.existing_user_ids)} user IDs to database.")
-        except Error as e:
-            logger.error(f"Error saving results to database: {e}")
-        finally:
-            if connection.is_connected():
-                cursor.close()
-                connection.close()
+    def open_results_csv(self):
+        """Open the results CSV for appending, seeding a new file with the IDs already in the database."""
+        is_new = not os.path.exists(self.csv_filename) or os.path.getsize(self.csv_filename) == 0
+        if not is_new:
+            with open(self.csv_filename, newline='') as f:
+                self.written_usernames.update(row[1] for row in csv.reader(f) if len(row) > 1)
+        self.results_file = open(self.csv_filename, 'a', newline='')
+        self.results_writer = csv.writer(self.results_file)
+        if is_new:
+            self.results_writer.writerow(['Input', 'Username', 'User ID'])
+            self.results_writer.writerows([username, username, user_id] for username, user_id in self.existing_user_ids.items())
+            self.results_file.flush()
+            self.written_usernames.update(self.existing_user_ids)
+
+    def append_results(self, results):
+        # Apart from the cache hits written before fetching starts, only the write-behind thread calls this
+        if self.results_writer is None:
+            return
+        rows = [[username, username, user_id] for username, user_id in results if username not in self.written_usernames]
+        self.written_usernames.update(row[0] for row in rows)
+        self.results_writer.writerows(rows)
+        self.results_file.flush()
 
-        # Optionally, you can still write to CSV if needed
-        with open(self.csv_filename, 'w', newline='') as csvfile:
-            writer = csv.writer(csvfile)
-            writer.writerow(['Input', 'Username', 'User ID'])
-            for username, user_id in self.existing_user_ids.items():
-                writer.writerow([username, username, user_id])
-        logger.info(f"Saved results to CSV file: {self.csv_filename}")
+    def save_results(self):
+        """Close the results CSV. New IDs were upserted and appended as they were flushed."""
+        if self.results_file is not None:
+            self.results_file.close()
+            self.results_file = None
+            self.results_writer = None
+        logger.info("Saved %s new user IDs to database and CSV file: %s", len(self.new_user_ids), self.csv_filename)
 
 def main():
     import sys
-    if len(sys.argv) != 5:
-        print("Usage: python v4_userid_scraper.py <usernames_json> <csv_filename> <account_data_json> <db_config_json>")
+    setup_logging()
+    if len(sys.argv) not in (5, 6) or sys.argv[5:] not in ([], ['--work-queue']):
+        print("Usage: python v4_userid_scraper.py <usernames_json> <csv_filename> <account_data_json> <db_config_json> [--work-queue]")
         sys.exit(1)
 
     usernames = json.loads(sys.argv[1])
@@ -431,9 +480,11 @@ def main():
     account_data = sys.argv[3]
     db_config = sys.argv[4]
 
-    scraper = InstagramUserIDScraper(usernames, csv_filename, account_data, db_config)
-    logger.info(f"Scraping user IDs for {len(usernames)} usernames")
-    logger.info(f"Using accounts with IDs: {', '.join(str(id) for id in scraper.account_id_to_index.keys())}")
+    # --work-queue shares the campaign with every other worker started for the same CSV
+    work_queue = WorkQueue('user_ids', csv_filename) if sys.argv[5:] == ['--work-queue'] else None
+    scraper = InstagramUserIDScraper(usernames, csv_filename, account_data, db_config, work_queue=work_queue)
+    logger.info("Scraping user IDs for %s usernames", len(usernames))
+    logger.info("Using accounts with IDs: %s", ', '.join(str(id) for id in scraper.account_id_to_index.keys()))
     scraper.display_account_status()  # Display initial account status
     scraper.scrape_user_ids()
 
@@ -0,0 +1,121 @@
+"""Microbenchmark: per-row follower upserts (before user-001) vs. db_utils.bulk_upsert batches.
+
+"Per row" is the old save_followers loop: one single-row INSERT ... ON
+DUPLICATE KEY UPDATE per follower and one commit at the end. "Batched" is
+bulk_upsert with multi-row statements and a commit per batch. By default both
+run against a stub cursor that counts round trips and sleeps --rtt-ms for
+each one, so the numbers show what the round trips cost on a network of that
+latency. With --db they run against MySQL (db_utils.db_config), writing to a
+TEMPORARY copy of the followers table, so nothing is kept.
+
+Run from the repository root:
+    python UTILS/bench_follower_upserts.py                 # stub cursor, 0.5 ms round trips
+    python UTILS/bench_follower_upserts.py --rtt-ms 2
+    python UTILS/bench_follower_upserts.py --db --rows 20000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_utils import build_upsert_query, bulk_upsert, get_database_connection
+from Scrapers.v4_scraper import FOLLOWER_COLUMNS, follower_row
+
+class StubCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=()):
+        self.connection.round_trip()
+
+    def close(self):
+        pass
+
+class StubConnection:
+    """Stands in for a MySQL connection: every statement and commit is one round trip of rtt seconds."""
+
+    def __init__(self, rtt):
+        self.rtt = rtt
+        self.round_trips = 0
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def commit(self):
+        self.round_trip()
+
+    def rollback(self):
+        pass
+
+def sample_rows(count):
+    followers = (
+        {'pk': 10**9 + i, 'pk_id': str(10**9 + i), 'username': f'bench_follower_{i}', 'full_name': f'Bench Follower {i}',
+         'is_private': i % 3 == 0, 'is_verified': False, 'profile_pic_url': f'https://example.com/{i}.jpg',
+         'account_badges': [], 'latest_reel_media': 0, 'is_favorite': False}
+        for i in range(count)
+    )
+    return [follower_row(follower, 'bench_source', 'bench.csv', 'unknown') for follower in followers]
+
+def per_row(connection, table, rows, batch_size):
+    query = build_upsert_query(table, FOLLOWER_COLUMNS, FOLLOWER_COLUMNS[1:], 1)
+    cursor = connection.cursor()
+    for row in rows:
+        cursor.execute(query, row)
+    connection.commit()
+    cursor.close()
+
+def batched(connection, table, rows, batch_size):
+    bulk_upsert(connection, table, FOLLOWER_COLUMNS, rows, batch_size=batch_size)
+
+def run(write, connection, table, rows, batch_size):
+    start = time.perf_counter()
+    write(connection, table, rows, batch_size)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and batched follower upserts")
+    parser.add_argument("--rows", type=int, default=5000, help="Followers to write per method")
+    parser.add_argument("--batch-size", type=int, default=500, help="Rows per multi-row statement (db_batch_size)")
+    parser.add_argument("--rtt-ms", type=float, default=0.5, help="Simulated round-trip time for the stub cursor")
+    parser.add_argument("--db", action="store_true", help="Write to a temporary copy of the followers table in MySQL")
+    args = parser.parse_args()
+
+    rows = sample_rows(args.rows)
+    if args.db:
+        connection = get_database_connection()
+        cursor = connection.cursor()
+        cursor.execute("CREATE TEMPORARY TABLE bench_followers LIKE followers")
+        cursor.close()
+        table = 'bench_followers'
+    else:
+        connection = StubConnection(args.rtt_ms / 1000)
+        table = 'followers'
+
+    try:
+        for label, write in (('per row (old)', per_row), ('bulk_upsert (new)', batched)):
+            if args.db:
+                cursor = connection.cursor()
+                cursor.execute(f"DELETE FROM {table}")
+                connection.commit()
+                cursor.close()
+            else:
+                connection.round_trips = 0
+            elapsed = run(write, connection, table, rows, args.batch_size)
+            trips = '' if args.db else f"  {connection.round_trips:6d} round trips"
+            print(f"{label:<20} {len(rows) / elapsed:10.0f} rows/s  {elapsed:7.3f} s{trips}")
+    finally:
+        if args.db:
+            cursor = connection.cursor()
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS bench_followers")
+            cursor.close()
+            connection.close()
+
+if __name__ == "__main__":
+    main()
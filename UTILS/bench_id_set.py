@@ -0,0 +1,84 @@
+"""Microbenchmark: IdSet vs. Python sets for the follower scraper's unique-follower tracking.
+
+Feeds random pks in follower pages (25 per page by default, as the API returns
+them) into a set of usernames (what unique_followers held before IdSet), a set
+of int pks, and IdSet.add_many. Insert time is measured without tracing;
+memory is the tracemalloc footprint of the finished structure and the peak
+while building it, in a second pass.
+
+Run from the repository root: python UTILS/bench_id_set.py [--sizes 1000000 10000000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from id_set import IdSet
+
+def build_username_set(pks, page_size):
+    seen = set()
+    for start in range(0, len(pks), page_size):
+        seen.update(f"user_{pk}" for pk in pks[start:start + page_size].tolist())
+    return seen
+
+def build_int_set(pks, page_size):
+    seen = set()
+    for start in range(0, len(pks), page_size):
+        seen.update(pks[start:start + page_size].tolist())
+    return seen
+
+def build_id_set(pks, page_size):
+    seen = IdSet()
+    for start in range(0, len(pks), page_size):
+        seen.add_many(pks[start:start + page_size].tolist())
+    seen.to_array()  # Merge the buffer, as a checkpoint would
+    return seen
+
+BUILDERS = (
+    ('set of usernames (old)', build_username_set),
+    ('set of int pks', build_int_set),
+    ('IdSet.add_many (new)', build_id_set),
+)
+
+def timed(build, pks, page_size):
+    gc.collect()
+    start = time.perf_counter()
+    result = build(pks, page_size)
+    elapsed = time.perf_counter() - start
+    del result
+    return elapsed
+
+def traced(build, pks, page_size):
+    gc.collect()
+    tracemalloc.start()
+    result = build(pks, page_size)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current, peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare IdSet with Python sets for unique-follower tracking")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[1000000, 10000000], help="Number of unique IDs per run")
+    parser.add_argument("--page-size", type=int, default=25, help="IDs per simulated follower page")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        # Unique, realistic-looking pks in random order
+        pks = rng.choice(np.int64(80_000_000_000), size=size, replace=False).astype(np.int64)
+        print(f"{size:,} IDs in pages of {args.page_size}")
+        for label, build in BUILDERS:
+            elapsed = timed(build, pks, args.page_size)
+            current, peak = traced(build, pks, args.page_size)
+            print(f"  {label:<24} {elapsed:7.2f} s  {size / elapsed / 1e6:5.2f} M IDs/s  "
+                  f"{current / size:6.1f} bytes/ID held  {peak / 2**20:8.1f} MiB peak")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Microbenchmark: per-request logging cost on the scraping thread, before and after log_setup.
+
+"Before" is the old setup: basicConfig console handler plus a debug.log FileHandler
+called synchronously, eagerly formatted f-strings, and json.dumps of the account
+wait times on every request. "After" is log_setup's queue pipeline with lazy
+%-style arguments and the json.dumps gated on the DEBUG level. Both write to
+os.devnull, so the numbers leave out terminal and disk speed.
+
+Run from the repository root: python UTILS/bench_logging.py
+"""
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_setup import TEXT_FORMAT, setup_logging, stop_logging
+
+logger = logging.getLogger('bench')
+ACCOUNT_WAIT_TIMES = {account_id: account_id * 1.5 for account_id in range(20)}
+
+def legacy_request(account_id, max_id, followers):
+    # The calls InstagramFollowerScraper made for one follower page before log_setup
+    logger.debug(f"Next available cookie: Account ID {account_id}, Wait time: {0.0:.2f} seconds")
+    logger.debug(f"Current wait times for all accounts: {json.dumps(ACCOUNT_WAIT_TIMES, indent=2)}")
+    logger.info(f'++++++++Trying request with account ID {account_id} and max_id: {max_id}+++++++++')
+    logger.debug(f"Response status code: {200}")
+    logger.info(f"Fetched {len(followers)} followers for account ID {account_id}")
+    logger.debug(f"Successfully fetched followers for account ID {account_id}, max_id: {max_id}")
+    logger.info(f"update_max_id: Updated current_max_id to: {max_id}")
+    logger.debug(f"Waiting for {1.2345:.2f} seconds.")
+
+def queued_request(account_id, max_id, followers):
+    logger.debug("Next available cookie: Account ID %s, Wait time: %.2f seconds", account_id, 0.0)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Current wait times for all accounts: %s", json.dumps(ACCOUNT_WAIT_TIMES, indent=2))
+    logger.info("++++++++Trying request with account ID %s and max_id: %s+++++++++", account_id, max_id)
+    logger.debug("Response status code: %s", 200)
+    logger.info("Fetched %s followers for account ID %s", len(followers), account_id)
+    logger.debug("Successfully fetched followers for account ID %s, max_id: %s", account_id, max_id)
+    logger.info("update_max_id: Updated current_max_id to: %s", max_id)
+    logger.debug("Waiting for %.2f seconds.", 1.2345)
+
+def run(request, number):
+    followers = [{'pk': i} for i in range(25)]
+    start = time.perf_counter()
+    for i in range(number):
+        request(i % 20, str(i * 25), followers)
+    return (time.perf_counter() - start) / number * 1e6
+
+def main():
+    number = 20000
+    root = logging.getLogger()
+    devnull = open(os.devnull, 'w')
+
+    console = logging.StreamHandler(devnull)
+    debug_file = logging.FileHandler(os.devnull)
+    for handler in (console, debug_file):
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root.handlers = [console, debug_file]
+    root.setLevel(logging.INFO)
+    legacy = run(legacy_request, number)
+    root.handlers = []
+
+    setup_logging(level=logging.INFO, log_path=os.devnull, console=False)
+    queued = run(queued_request, number)
+    drain_start = time.perf_counter()
+    stop_logging()
+    drain = (time.perf_counter() - drain_start) / number * 1e6
+
+    print(f"{'synchronous handlers, f-strings (old)':<44} {legacy:8.2f} us/request on the scraping thread")
+    print(f"{'queue pipeline, lazy %-style (new)':<44} {queued:8.2f} us/request on the scraping thread")
+    print(f"{'  listener drain after the run':<44} {drain:8.2f} us/request off-thread")
+
+if __name__ == "__main__":
+    main()
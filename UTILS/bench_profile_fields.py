@@ -0,0 +1,126 @@
+"""Microbenchmark: compiled profile extractor vs. the hand-written .get() versions it replaced.
+
+Run from the repository root: python UTILS/bench_profile_fields.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from profile_fields import compile_extractor
+from Scrapers.v4_data_scraper import USER_COLUMNS
+from UTILS.json_parsing import USER_INFO_COLUMNS
+
+SAMPLE_USER = {
+    'pk': 1234567890, 'username': 'sample.user', 'full_name': 'Sample User',
+    'biography': 'Photographer. Coffee. Travel.', 'follower_count': 15230,
+    'following_count': 412, 'media_count': 318, 'is_private': False, 'is_verified': False,
+    'category': 'Photographer', 'external_url': 'https://example.com', 'public_email': '',
+    'public_phone_number': '', 'is_business': True, 'profile_pic_url': 'https://example.com/p.jpg',
+    'hd_profile_pic_url_info': {'url': 'https://example.com/p_hd.jpg', 'width': 1080, 'height': 1080},
+    'has_highlight_reels': True, 'has_guides': False, 'is_interest_account': True,
+    'total_igtv_videos': 0, 'total_clips_count': 12, 'total_ar_effects': 0,
+    'is_eligible_for_smb_support_flow': True, 'is_eligible_for_lead_center': False,
+    'account_type': 2, 'is_call_to_action_enabled': False,
+    'interop_messaging_user_fbid': 17841400000000000, 'has_videos': True,
+    'total_video_count': 4, 'has_music_on_profile': False, 'is_potential_business': False,
+    'is_memorialized': False,
+    'bio_links': [{'url': 'https://example.com/a'}, {'url': 'https://example.com/b'}],
+    'pinned_channels_info': {'has_public_channels': False, 'pinned_channels_list': []},
+}
+
+def legacy_process_user_data(user_data, gender, csv_filename):
+    parsed_data = {
+        'user_id': user_data.get('pk'),
+        'username': user_data.get('username'),
+        'full_name': user_data.get('full_name'),
+        'biography': user_data.get('biography'),
+        'follower_count': user_data.get('follower_count'),
+        'following_count': user_data.get('following_count'),
+        'media_count': user_data.get('media_count'),
+        'is_private': user_data.get('is_private'),
+        'is_verified': user_data.get('is_verified'),
+        'category': user_data.get('category'),
+        'external_url': user_data.get('external_url'),
+        'public_email': user_data.get('public_email'),
+        'public_phone_number': user_data.get('public_phone_number'),
+        'is_business': user_data.get('is_business'),
+        'profile_pic_url': user_data.get('profile_pic_url'),
+        'hd_profile_pic_url': user_data.get('hd_profile_pic_url_info', {}).get('url'),
+        'has_highlight_reels': user_data.get('has_highlight_reels'),
+        'has_guides': user_data.get('has_guides'),
+        'is_interest_account': user_data.get('is_interest_account'),
+        'total_igtv_videos': user_data.get('total_igtv_videos'),
+        'total_clips_count': user_data.get('total_clips_count', 0),
+        'total_ar_effects': user_data.get('total_ar_effects'),
+        'is_eligible_for_smb_support_flow': user_data.get('is_eligible_for_smb_support_flow'),
+        'is_eligible_for_lead_center': user_data.get('is_eligible_for_lead_center'),
+        'account_type': user_data.get('account_type'),
+        'is_call_to_action_enabled': user_data.get('is_call_to_action_enabled'),
+        'interop_messaging_user_fbid': user_data.get('interop_messaging_user_fbid'),
+        'has_videos': user_data.get('has_videos'),
+        'total_video_count': user_data.get('total_video_count', 0),
+        'has_music_on_profile': user_data.get('has_music_on_profile'),
+        'is_potential_business': user_data.get('is_potential_business'),
+        'is_memorialized': user_data.get('is_memorialized'),
+        'gender': gender,
+        'csv_filename': csv_filename,
+    }
+    # save_user_data then walked the dict again to build the row
+    return tuple(parsed_data.get(field) for field in USER_COLUMNS)
+
+def legacy_parse_user_info(user):
+    parsed_data = {
+        'username': user.get('username'),
+        'full_name': user.get('full_name'),
+        'biography': user.get('biography'),
+        'follower_count': user.get('follower_count'),
+        'following_count': user.get('following_count'),
+        'media_count': user.get('media_count'),
+        'is_private': user.get('is_private'),
+        'is_verified': user.get('is_verified'),
+        'category': user.get('category'),
+        'external_url': user.get('external_url'),
+        'public_email': user.get('public_email'),
+        'public_phone_number': user.get('public_phone_number'),
+        'is_business': user.get('is_business'),
+        'profile_pic_url': user.get('profile_pic_url'),
+        'hd_profile_pic_url': user.get('hd_profile_pic_url_info', {}).get('url'),
+        'has_highlight_reels': user.get('has_highlight_reels'),
+        'has_guides': user.get('has_guides'),
+        'is_interest_account': user.get('is_interest_account'),
+        'total_igtv_videos': user.get('total_igtv_videos'),
+        'total_clips_count': user.get('total_clips_count'),
+        'total_ar_effects': user.get('total_ar_effects'),
+        'is_eligible_for_smb_support_flow': user.get('is_eligible_for_smb_support_flow'),
+        'is_eligible_for_lead_center': user.get('is_eligible_for_lead_center'),
+        'account_type': user.get('account_type'),
+        'is_call_to_action_enabled': user.get('is_call_to_action_enabled'),
+        'interop_messaging_user_fbid': user.get('interop_messaging_user_fbid'),
+        'has_videos': user.get('has_videos'),
+        'total_video_count': user.get('total_video_count'),
+        'has_music_on_profile': user.get('has_music_on_profile'),
+        'is_potential_business': user.get('is_potential_business'),
+        'is_memorialized': user.get('is_memorialized'),
+        'gender': None,
+    }
+    return tuple(parsed_data[key] if key in parsed_data else None for key in USER_INFO_COLUMNS)
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{label:<40} {seconds / number * 1e6:8.2f} us/profile")
+
+def main():
+    number = 100000
+    extract_user_row = compile_extractor(USER_COLUMNS)
+    extract_user_info_row = compile_extractor(USER_INFO_COLUMNS)
+    assert extract_user_row(SAMPLE_USER, gender='male', csv_filename='x') == legacy_process_user_data(SAMPLE_USER, 'male', 'x')
+
+    bench("process_user_data + row re-walk (old)", lambda: legacy_process_user_data(SAMPLE_USER, 'male', 'x'), number)
+    bench("compiled users extractor (new)", lambda: extract_user_row(SAMPLE_USER, gender='male', csv_filename='x'), number)
+    bench("parse_user_info + row re-walk (old)", lambda: legacy_parse_user_info(SAMPLE_USER), number)
+    bench("compiled user info extractor (new)", lambda: extract_user_info_row(SAMPLE_USER), number)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Memory regression check: follower pages must stream through InstagramFollowerScraper.
+
+Drives scrape_with_cookie against a fake page source and a stub writer (no
+network, no database) for a small and a large follower count, and measures
+the tracemalloc peak of each run. Only the unique-follower IdSet should grow
+with the follower count (8 bytes per pk, 16 at the peak of a merge, which
+copies the array); keeping whole pages around costs about 500 bytes per
+follower. Exits non-zero when the peak grows by more
+than --max-bytes-per-follower between the two runs. Both counts must be at
+least IdSet's front buffer size, below which new pks sit in a plain Python set
+and cost about 60 bytes each.
+
+Run from the repository root: python UTILS/check_follower_memory.py
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from id_set import IdSet
+from metrics import MetricsRegistry
+from Scrapers.v4_scraper import InstagramFollowerScraper
+
+PAGE_SIZE = 25
+ACCOUNT = {
+    'id': 1, 'cookies': 'sessionid=stub; ds_user_id=1', 'user_agent': 'stub',
+    'proxy_username': 'user', 'proxy_password': 'password', 'proxy_address': '127.0.0.1', 'proxy_port': '8080'
+}
+
+class StubWriter:
+    """Consumes every queued follower and drops it, like a writer whose flushes always succeed."""
+
+    def __init__(self):
+        self.items = 0
+
+    def put_many(self, items, timeout=None):
+        for _ in items:
+            self.items += 1
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class StubPool:
+    """Never hands out connections; the stub writer and the fake pages do not need any."""
+
+    def reserve(self, workers):
+        return self
+
+class FakePageScraper(InstagramFollowerScraper):
+    """Serves generated follower pages instead of calling the API or the accounts table."""
+
+    def __init__(self, follower_count, recent_pages_window):
+        super().__init__('1', 'memory_check', [ACCOUNT], {}, recent_pages_window=recent_pages_window, archive_dir=None,
+                         metrics=MetricsRegistry(), db_pool=StubPool(), follower_writer=StubWriter(), summary_interval=None)
+        self.follower_count = follower_count
+        self.served = 0
+
+    def get_next_available_cookie(self):
+        return self.cookie_states[0]
+
+    def check_and_update_cookie(self, cookie_state):
+        return cookie_state
+
+    def return_cookie_to_pool(self, cookie_state):
+        pass
+
+    def fetch_followers(self, cookie_state, params=None, initial_request=False):
+        if self.served >= self.follower_count:
+            return None
+        if self.served % (PAGE_SIZE * 100) == 0:
+            # Stands in for save_state, which journals the new pks every few pages
+            with self.state_lock:
+                self.pending_unique_followers = []
+        users = [
+            {'pk': 10**9 + pk, 'username': f'follower_{pk}', 'full_name': f'Follower Number {pk}',
+             'is_private': False, 'is_verified': False, 'profile_pic_url': f'https://example.com/{pk}.jpg'}
+            for pk in range(self.served, self.served + PAGE_SIZE)
+        ]
+        self.served += PAGE_SIZE
+        return {'users': users, 'next_max_id': str(self.served)}
+
+def peak_bytes(follower_count, recent_pages_window):
+    gc.collect()
+    tracemalloc.start()
+    scraper = FakePageScraper(follower_count, recent_pages_window)
+    tracemalloc.reset_peak()
+    scraper.scrape_with_cookie(scraper.cookie_states[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if scraper.follower_writer.items != follower_count:
+        raise RuntimeError(f"Writer received {scraper.follower_writer.items} of {follower_count} followers")
+    return peak
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that follower pages are streamed, not accumulated")
+    parser.add_argument("--small", type=int, default=100000, help="Followers in the baseline run")
+    parser.add_argument("--large", type=int, default=400000, help="Followers in the comparison run")
+    parser.add_argument("--max-bytes-per-follower", type=float, default=32,
+                        help="Allowed peak growth per extra follower; the IdSet needs up to 16")
+    args = parser.parse_args()
+    min_count = IdSet().min_buffer_size
+    if args.small < min_count or args.large <= args.small:
+        parser.error(f"need {min_count} <= --small < --large; smaller runs only measure IdSet's front buffer")
+
+    failed = False
+    for window in (0, 10):
+        small = peak_bytes(args.small, window)
+        large = peak_bytes(args.large, window)
+        per_follower = (large - small) / (args.large - args.small)
+        status = 'ok' if per_follower <= args.max_bytes_per_follower else 'GROWS WITH FOLLOWERS'
+        print(f"recent_pages_window={window:<3} peak {small / 2**20:6.1f} MiB at {args.small:,}, "
+              f"{large / 2**20:6.1f} MiB at {args.large:,}  ({per_follower:.1f} bytes/follower)  {status}")
+        failed = failed or status != 'ok'
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
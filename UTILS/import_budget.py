@@ -0,0 +1,87 @@
+"""Import-time regression check for the main/*.py entry points.
+
+Imports each entry point in a fresh interpreter under -X importtime and
+compares the best cumulative time of several runs with the budget in
+UTILS/import_budget.json. Exits non-zero when an entry point is over budget.
+
+Run from the repository root:
+    python UTILS/import_budget.py            # check against the budget
+    python UTILS/import_budget.py --top 15   # also list the slowest imports
+    python UTILS/import_budget.py --update   # re-baseline the budget file
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_PATH = os.path.join(ROOT, 'UTILS', 'import_budget.json')
+ENTRY_POINTS = ('main.scrape_followers', 'main.scrape_userdata', 'main.scrape_userids', 'main.tagged')
+
+def parse_importtime(stderr):
+    """{module: (self_us, cumulative_us)} from -X importtime output."""
+    timings = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+def measure(module, runs):
+    best = None
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+        timings = parse_importtime(result.stderr)
+        if best is None or timings[module][1] < best[module][1]:
+            best = timings
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Check entry point import times against UTILS/import_budget.json")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point; the fastest run counts")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N imports with the highest self time")
+    parser.add_argument("--update", action="store_true", help="Write the measured times plus headroom as the new budget")
+    parser.add_argument("--headroom", type=float, default=1.5, help="Budget multiplier used with --update")
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, 'r') as f:
+        budget = json.load(f)
+
+    over_budget = []
+    for module in ENTRY_POINTS:
+        timings = measure(module, args.runs)
+        cumulative_ms = timings[module][1] / 1000
+        limit_ms = budget['entry_points'].get(module)
+        status = 'ok' if limit_ms is None or cumulative_ms <= limit_ms else 'OVER BUDGET'
+        print(f"{module:<28} {cumulative_ms:8.1f} ms  (budget {limit_ms if limit_ms is not None else '-'} ms)  {status}")
+        if status != 'ok':
+            over_budget.append(module)
+        forbidden = [name for name in budget.get('forbidden', {}).get(module, []) if name in timings]
+        if forbidden:
+            print(f"  imports {', '.join(forbidden)}, which should only be loaded when used")
+            over_budget.append(module)
+        if args.top:
+            for name, (self_us, cumulative_us) in sorted(timings.items(), key=lambda item: -item[1][0])[:args.top]:
+                print(f"    {self_us / 1000:7.1f} ms self {cumulative_us / 1000:8.1f} ms cumulative  {name}")
+        if args.update:
+            budget['entry_points'][module] = round(cumulative_ms * args.headroom)
+
+    if args.update:
+        with open(BUDGET_PATH, 'w') as f:
+            json.dump(budget, f, indent=2)
+            f.write('\n')
+        print(f"Budget written to {BUDGET_PATH}")
+        return
+
+    if over_budget:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
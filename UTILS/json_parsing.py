@@ -1,65 +1,48 @@
+import os
+import sys
+
 from mysql.connector import Error
-import mysql.connector
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_utils import get_pool
+from profile_fields import PINNED_CHANNEL_FIELDS, bio_link_urls, compile_extractor, pinned_channels
+
+main_db_config = {
+    'host': '127.0.0.1',
+    'user': 'root',
+    'password': 'password',
+    'database': 'main'
+}
+
+USER_INFO_COLUMNS = (
+    'username', 'full_name', 'biography', 'follower_count', 'following_count',
+    'media_count', 'is_private', 'is_verified', 'category', 'external_url',
+    'public_email', 'public_phone_number', 'is_business', 'profile_pic_url',
+    'hd_profile_pic_url', 'has_highlight_reels', 'has_guides',
+    'is_interest_account', 'total_igtv_videos', 'total_clips_count',
+    'total_ar_effects', 'is_eligible_for_smb_support_flow',
+    'is_eligible_for_lead_center', 'account_type', 'is_call_to_action_enabled',
+    'interop_messaging_user_fbid', 'has_videos', 'total_video_count',
+    'has_music_on_profile', 'is_potential_business', 'is_memorialized', 'gender'
+)
+# Unlike the data scraper, missing clip and video counts stay NULL here
+extract_user_info_row = compile_extractor(USER_INFO_COLUMNS, defaults=(('total_clips_count', None), ('total_video_count', None)))
 
 def parse_user_info(json_data):
     user = json_data['user']
-    parsed_data = {
-        'username': user.get('username'),
-        'full_name': user.get('full_name'),
-        'biography': user.get('biography'),
-        'follower_count': user.get('follower_count'),
-        'following_count': user.get('following_count'),
-        'media_count': user.get('media_count'),
-        'is_private': user.get('is_private'),
-        'is_verified': user.get('is_verified'),
-        'category': user.get('category'),
-        'external_url': user.get('external_url'),
-        'public_email': user.get('public_email'),
-        'public_phone_number': user.get('public_phone_number'),
-        'is_business': user.get('is_business'),
-        'profile_pic_url': user.get('profile_pic_url'),
-        'hd_profile_pic_url': user.get('hd_profile_pic_url_info', {}).get('url'),
-        'has_highlight_reels': user.get('has_highlight_reels'),
-        'has_guides': user.get('has_guides'),
-        'is_interest_account': user.get('is_interest_account'),
-        'total_igtv_videos': user.get('total_igtv_videos'),
-        'total_clips_count': user.get('total_clips_count'),
-        'total_ar_effects': user.get('total_ar_effects'),
-        'is_eligible_for_smb_support_flow': user.get('is_eligible_for_smb_support_flow'),
-        'is_eligible_for_lead_center': user.get('is_eligible_for_lead_center'),
-        'account_type': user.get('account_type'),
-        'is_call_to_action_enabled': user.get('is_call_to_action_enabled'),
-        'interop_messaging_user_fbid': user.get('interop_messaging_user_fbid'),
-        'bio_links': [link.get('url') for link in user.get('bio_links', [])],
-        'has_videos': user.get('has_videos'),
-        'total_video_count': user.get('total_video_count'),
-        'has_music_on_profile': user.get('has_music_on_profile'),
-        'is_potential_business': user.get('is_potential_business'),
-        'is_memorialized': user.get('is_memorialized'),
-        'pinned_channels_info': {
-            'has_public_channels': user.get('pinned_channels_info', {}).get('has_public_channels'),
-            'channels': [
-                {
-                    'title': channel.get('title'),
-                    'subtitle': channel.get('subtitle'),
-                    'invite_link': channel.get('invite_link'),
-                    'number_of_members': channel.get('number_of_members')
-                }
-                for channel in user.get('pinned_channels_info', {}).get('pinned_channels_list', [])
-            ]
-        },
-        'gender': None  # This will be filled in by the main script
+    parsed_data = dict(zip(USER_INFO_COLUMNS, extract_user_info_row(user)))  # gender is filled in by the main script
+    parsed_data['bio_links'] = bio_link_urls(user)
+    parsed_data['pinned_channels_info'] = {
+        'has_public_channels': (user.get('pinned_channels_info') or {}).get('has_public_channels'),
+        'channels': [dict(zip(PINNED_CHANNEL_FIELDS, channel)) for channel in pinned_channels(user)]
     }
     return parsed_data
 
 def upload_to_database(parsed_data):
+    connection = None
     try:
-        connection = mysql.connector.connect(
-            host='127.0.0.1',
-            database='main',
-            user='root',
-            password='password'
-        )
+        connection = get_pool(main_db_config).get_connection()
 
         if connection.is_connected():
             print("Successfully connected to the database")
@@ -116,17 +99,7 @@ def upload_to_database(parsed_data):
                 gender = VALUES(gender)
             """
             
-            user_data = tuple(parsed_data[key] if key in parsed_data else None for key in [
-                'username', 'full_name', 'biography', 'follower_count', 'following_count',
-                'media_count', 'is_private', 'is_verified', 'category', 'external_url',
-                'public_email', 'public_phone_number', 'is_business', 'profile_pic_url',
-                'hd_profile_pic_url', 'has_highlight_reels', 'has_guides',
-                'is_interest_account', 'total_igtv_videos', 'total_clips_count',
-                'total_ar_effects', 'is_eligible_for_smb_support_flow',
-                'is_eligible_for_lead_center', 'account_type', 'is_call_to_action_enabled',
-                'interop_messaging_user_fbid', 'has_videos', 'total_video_count',
-                'has_music_on_profile', 'is_potential_business', 'is_memorialized', 'gender'
-            ])
+            user_data = tuple(parsed_data.get(key) for key in USER_INFO_COLUMNS)
 
             cursor.execute(insert_query, user_data)
             print(f"Inserted user data for {parsed_data['username']}")
@@ -166,7 +139,6 @@ def upload_to_database(parsed_data):
     except Error as e:
         print(f"Error while connecting to MySQL: {e}")
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if connection:
             connection.close()
-            print("MySQL connection is closed")
\ No newline at end of file
+            print("MySQL connection returned to the pool")
\ No newline at end of file
@@ -1,11 +1,24 @@
-import mysql.connector
-from mysql.connector import Error
+import hashlib
+import json
+import re
+import threading
+import time
+from mysql.connector import Error, InterfaceError, PoolError
+from mysql.connector.pooling import CNX_POOL_MAXSIZE, MySQLConnectionPool
 from datetime import datetime, timedelta
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 import logging
+from metrics import REGISTRY
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+LOOKUP_CHUNK_SIZE = 1000
+TEMP_TABLE_THRESHOLD = 50000
+DEFAULT_POOL_SIZE = 5
+POOL_CHECKOUT_TIMEOUT = 30
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
 db_config = {
     'host': '127.0.0.1',
     'user': 'root',
@@ -13,12 +26,99 @@ db_config = {
     'database': 'instagram_accounts'
 }
 
+class ConnectionPool:
+    """A MySQLConnectionPool that grows with the workers using it and waits for a free connection.
+
+    MySQLConnectionPool raises PoolError as soon as every connection is checked
+    out; get_connection() retries instead, with backoff, for up to timeout
+    seconds. Each checkout pings the connection and reconnects it if the server
+    dropped it while it sat idle, so callers never get a stale connection; a
+    failed reconnect is retried the same way. Checkout wait times and outcomes
+    go to the db_pool_* metrics, labelled with the pool name.
+    """
+
+    def __init__(self, name, config, registry=REGISTRY, timeout=POOL_CHECKOUT_TIMEOUT):
+        self.name = name
+        self.timeout = timeout
+        # Created without connection arguments, so it opens nothing until reserve() adds connections
+        self.pool = MySQLConnectionPool(pool_name=name, pool_size=CNX_POOL_MAXSIZE)
+        self.pool.set_config(**config)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.wait_seconds = registry.histogram('db_pool_wait_seconds', 'Time spent waiting for a pooled DB connection',
+                                               buckets=POOL_WAIT_BUCKETS)
+        self.checkouts = registry.counter('db_pool_checkouts_total', 'DB connection checkouts by outcome')
+        self.size_gauge = registry.gauge('db_pool_size', 'Connections opened by a DB pool')
+        self.in_use_gauge = registry.gauge('db_pool_in_use', 'DB pool connections currently checked out')
+        registry.register_collector(self.record_stats)
+
+    def reserve(self, workers):
+        """Grow the pool to one connection per worker, up to CNX_POOL_MAXSIZE; it never shrinks."""
+        wanted = min(max(workers, 1), CNX_POOL_MAXSIZE)
+        if workers > CNX_POOL_MAXSIZE:
+            logger.warning("Pool %s capped at %s connections for %s workers; the rest wait for a free one",
+                           self.name, CNX_POOL_MAXSIZE, workers)
+        with self.lock:
+            while self.size < wanted:
+                self.pool.add_connection()
+                self.size += 1
+        return self
+
+    def get_connection(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        delay = 0.005
+        while True:
+            try:
+                connection = self.pool.get_connection()
+                break
+            except (PoolError, InterfaceError) as e:
+                waited = time.monotonic() - start
+                if waited >= timeout:
+                    self.checkouts.inc(pool=self.name, outcome='timeout')
+                    logger.error("No connection from pool %s after %.1f seconds (%s connections): %s",
+                                 self.name, waited, self.size, e)
+                    raise
+                time.sleep(min(delay, timeout - waited))
+                delay = min(delay * 2, 0.1)
+        self.wait_seconds.observe(time.monotonic() - start, pool=self.name)
+        self.checkouts.inc(pool=self.name, outcome='ok')
+        return connection
+
+    def idle(self):
+        return self.pool._cnx_queue.qsize()
+
+    def record_stats(self):
+        self.size_gauge.set(self.size, pool=self.name)
+        self.in_use_gauge.set(self.size - self.idle(), pool=self.name)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def pool_name(config):
+    key = json.dumps(config, sort_keys=True)
+    database = re.sub(r'[^a-zA-Z0-9._-]', '_', str(config.get('database', 'mysql')))[:40]
+    return f"{database}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+def get_pool(config=None, workers=DEFAULT_POOL_SIZE):
+    """The process-wide pool for config (db_config by default), grown to at least workers connections.
+
+    Every scraper and helper in a process that uses the same config shares one
+    pool, so two scrapers run from one entry point don't each open their own.
+    """
+    config = config or db_config
+    key = json.dumps(config, sort_keys=True)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(pool_name(config), config)
+    return pool.reserve(workers)
+
 def get_database_connection():
     try:
-        connection = mysql.connector.connect(**db_config)
-        return connection
+        return get_pool().get_connection()
     except Error as e:
-        logger.error(f"Error connecting to MySQL database: {e}")
+        logger.error("Error connecting to MySQL database: %s", e)
         raise
 
 def get_accounts_from_database(connection, time_threshold=1):
@@ -46,15 +146,15 @@ def get_accounts_from_database(connection, time_threshold=1):
             age = current_time - last_checked
             if age <= timedelta(days=time_threshold):
                 valid_accounts.append(account)
-                logger.info(f"Account ID: {account['id']}, Last Checked: {age} ago")
+                logger.info("Account ID: %s, Last Checked: %s ago", account['id'], age)
             else:
-                logger.info(f"Skipping Account ID: {account['id']}, Last Checked: {age} ago (too old)")
+                logger.info("Skipping Account ID: %s, Last Checked: %s ago (too old)", account['id'], age)
         
-        logger.info(f"Total accounts: {len(accounts)}, Valid accounts: {len(valid_accounts)}")
+        logger.info("Total accounts: %s, Valid accounts: %s", len(accounts), len(valid_accounts))
         
         return valid_accounts
     except Error as e:
-        logger.error(f"Error fetching accounts from database: {e}")
+        logger.error("Error fetching accounts from database: %s", e)
         raise
 
 def parse_proxy_url(proxy_url):
@@ -67,7 +167,7 @@ def parse_proxy_url(proxy_url):
     elif len(parts) == 4:
         return parts[0], parts[1], parts[2], parts[3]
     else:
-        logger.warning(f"Invalid proxy URL format: {proxy_url}")
+        logger.warning("Invalid proxy URL format: %s", proxy_url)
         return None, None, None, None
 
 def prepare_account_data(accounts):
@@ -94,9 +194,9 @@ def update_account_last_checked(connection, account_id):
         
         connection.commit()
         cursor.close()
-        logger.info(f"Updated last_checked for Account ID: {account_id}")
+        logger.info("Updated last_checked for Account ID: %s", account_id)
     except Error as e:
-        logger.error(f"Error updating last_checked for Account ID {account_id}: {e}")
+        logger.error("Error updating last_checked for Account ID %s: %s", account_id, e)
         raise
 
 def mark_account_invalid(connection, account_id):
@@ -111,7 +211,115 @@ def mark_account_invalid(connection, account_id):
         
         connection.commit()
         cursor.close()
-        logger.info(f"Marked Account ID: {account_id} as invalid")
+        logger.info("Marked Account ID: %s as invalid", account_id)
     except Error as e:
-        logger.error(f"Error marking Account ID {account_id} as invalid: {e}")
-        raise
\ No newline at end of file
+        logger.error("Error marking Account ID %s as invalid: %s", account_id, e)
+        raise
+
+@lru_cache(maxsize=256)
+def build_upsert_query(table, columns, update_columns, row_count):
+    row_placeholders = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    update_clause = ', '.join(f"{column} = VALUES({column})" for column in update_columns)
+    return f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        VALUES {', '.join([row_placeholders] * row_count)}
+        ON DUPLICATE KEY UPDATE {update_clause}
+    """
+
+def bulk_upsert(connection, table, columns, rows, update_columns=None, batch_size=500, commit=True):
+    """Upsert rows using multi-row VALUES statements, committing once per batch.
+
+    With commit=False the caller owns the transaction, so several tables can be
+    written and committed together.
+    """
+    columns = tuple(columns)
+    update_columns = tuple(update_columns) if update_columns is not None else columns[1:]
+    cursor = connection.cursor()
+    written = 0
+    try:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            query = build_upsert_query(table, columns, update_columns, len(batch))
+            cursor.execute(query, [value for row in batch for value in row])
+            if commit:
+                connection.commit()
+            written += len(batch)
+        return written
+    except Error as e:
+        logger.error("Error upserting into %s after %s rows: %s", table, written, e)
+        if commit:
+            connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def _lookup_chunk(connect, table, key_column, columns, chunk):
+    connection = connect()
+    try:
+        cursor = connection.cursor()
+        placeholders = ', '.join(['%s'] * len(chunk))
+        cursor.execute(f"""
+            SELECT {', '.join(columns)}
+            FROM {table}
+            WHERE {key_column} IN ({placeholders})
+        """, tuple(chunk))
+        rows = cursor.fetchall()
+        cursor.close()
+        return rows
+    finally:
+        connection.close()
+
+def _lookup_temp_table(connect, table, key_column, columns, keys, key_type, batch_size):
+    connection = connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"CREATE TEMPORARY TABLE bulk_lookup_keys (lookup_key {key_type} PRIMARY KEY) ENGINE=MEMORY")
+        for start in range(0, len(keys), batch_size):
+            batch = keys[start:start + batch_size]
+            cursor.execute(
+                f"INSERT IGNORE INTO bulk_lookup_keys (lookup_key) VALUES {', '.join(['(%s)'] * len(batch))}",
+                tuple(batch)
+            )
+        cursor.execute(f"""
+            SELECT {', '.join(f't.{column}' for column in columns)}
+            FROM {table} t
+            JOIN bulk_lookup_keys k ON t.{key_column} = k.lookup_key
+        """)
+        return cursor.fetchall()
+    finally:
+        try:
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS bulk_lookup_keys")
+            cursor.close()
+        except Error as e:
+            # Don't hide the lookup's own error; a lost connection takes the temporary table with it
+            logger.warning("Error dropping bulk_lookup_keys: %s", e)
+        connection.close()
+
+def bulk_lookup(connect, table, key_column, keys, columns, mode='auto', chunk_size=LOOKUP_CHUNK_SIZE, workers=1, key_type='VARCHAR(255)'):
+    """Fetch columns for every row whose key_column is in keys, without one unbounded IN list.
+
+    connect is called for each connection needed (a pool's get_connection, or
+    get_database_connection). 'chunked' runs IN queries of at most chunk_size
+    keys, spread over up to workers connections. 'temp_table' loads the keys into
+    a MEMORY temporary table and joins against it on one connection. 'auto'
+    picks temp_table above TEMP_TABLE_THRESHOLD keys.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return []
+    if mode == 'auto':
+        mode = 'temp_table' if len(keys) > TEMP_TABLE_THRESHOLD else 'chunked'
+    try:
+        if mode == 'temp_table':
+            return _lookup_temp_table(connect, table, key_column, columns, keys, key_type, chunk_size)
+        if mode != 'chunked':
+            raise ValueError(f"Unknown bulk lookup mode: {mode}")
+        chunks = [keys[start:start + chunk_size] for start in range(0, len(keys), chunk_size)]
+        if workers > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+                results = executor.map(lambda chunk: _lookup_chunk(connect, table, key_column, columns, chunk), chunks)
+                return [row for rows in results for row in rows]
+        return [row for chunk in chunks for row in _lookup_chunk(connect, table, key_column, columns, chunk)]
+    except Error as e:
+        logger.error("Error looking up %s keys in %s.%s: %s", len(keys), table, key_column, e)
+        raise
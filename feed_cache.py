@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class FeedCache:
+    """Fetched feed/user/{id} items stored as zstd-compressed JSON, one directory per user.
+
+    Files are named {fetched_at}_{digest}.json.zst, where digest hashes the
+    serialized items, so refetching an unchanged feed doesn't store a second
+    copy. Entries older than ttl seconds are ignored by latest() and removed by
+    prune().
+    """
+
+    def __init__(self, directory='Files/FeedCache', ttl=30 * 24 * 3600, compression_level=3):
+        self.directory = directory
+        self.ttl = ttl
+        self.compression_level = compression_level
+
+    def user_directory(self, user_id):
+        return os.path.join(self.directory, str(user_id))
+
+    def entries(self, user_id):
+        """(fetched_at, path) for every cached response of the user, newest first."""
+        try:
+            names = os.listdir(self.user_directory(user_id))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if name.endswith('.json.zst'):
+                fetched_at = name.split('_', 1)[0]
+                if fetched_at.isdigit():
+                    entries.append((int(fetched_at), os.path.join(self.user_directory(user_id), name)))
+        return sorted(entries, reverse=True)
+
+    def put(self, user_id, items):
+        import zstandard
+        data = json.dumps(items, separators=(',', ':'), sort_keys=True).encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()[:16]
+        entries = self.entries(user_id)
+        if entries and entries[0][1].endswith(f"_{digest}.json.zst"):
+            return entries[0][1]
+        os.makedirs(self.user_directory(user_id), exist_ok=True)
+        path = os.path.join(self.user_directory(user_id), f"{int(time.time())}_{digest}.json.zst")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zstandard.ZstdCompressor(level=self.compression_level).compress(data))
+        os.replace(tmp_path, path)
+        return path
+
+    def latest(self, user_id):
+        """Items of the newest cached response within the TTL, or None."""
+        import zstandard
+        cutoff = time.time() - self.ttl
+        for fetched_at, path in self.entries(user_id):
+            if fetched_at < cutoff:
+                break
+            try:
+                with open(path, 'rb') as f:
+                    return json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+            except (OSError, ValueError, zstandard.ZstdError) as e:
+                logger.warning("Skipping unreadable feed cache entry %s: %s", path, e)
+        return None
+
+    def prune(self):
+        cutoff = time.time() - self.ttl
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return removed
+        for user_id in os.listdir(self.directory):
+            for fetched_at, path in self.entries(user_id):
+                if fetched_at < cutoff:
+                    os.remove(path)
+                    removed += 1
+            try:
+                os.rmdir(self.user_directory(user_id))  # Only succeeds once nothing is left in it
+            except OSError:
+                pass
+        logger.info("Pruned %s expired feed cache entries from %s", removed, self.directory)
+        return removed
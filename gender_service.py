@@ -0,0 +1,53 @@
+import threading
+from functools import lru_cache
+
+_detector = None
+_detector_lock = threading.Lock()
+
+def get_detector():
+    """Load the gender_guesser name tables once per process, on first use."""
+    global _detector
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                from gender_guesser import detector as gender_detector
+                _detector = gender_detector.Detector(case_sensitive=False)
+    return _detector
+
+def first_name(full_name):
+    if not full_name or not isinstance(full_name, str):
+        return ''
+    name_parts = full_name.split()
+    return name_parts[0].lower() if name_parts else ''
+
+@lru_cache(maxsize=100000)
+def _classify_first_name(name):
+    return get_detector().get_gender(name)
+
+def guess_gender(full_name):
+    name = first_name(full_name)
+    return _classify_first_name(name) if name else 'unknown'
+
+def guess_genders(full_names):
+    """Classify a whole page of names, or a pandas Series, looking each distinct first name up once."""
+    if hasattr(full_names, 'map') and hasattr(full_names, 'unique'):
+        genders = {name: guess_gender(name) for name in full_names.unique()}
+        return full_names.map(genders)
+    genders = {}
+    results = []
+    for full_name in full_names:
+        if full_name not in genders:
+            genders[full_name] = guess_gender(full_name)
+        results.append(genders[full_name])
+    return results
+
+def cache_stats():
+    info = _classify_first_name.cache_info()
+    lookups = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': info.hits / lookups if lookups else 0.0,
+        'size': info.currsize,
+        'max_size': info.maxsize
+    }
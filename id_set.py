@@ -0,0 +1,114 @@
+import os
+import numpy as np
+
+class IdSet:
+    """Set of int64 IDs kept as a sorted NumPy array plus a small Python set front buffer.
+
+    Costs about 8 bytes per ID once merged, versus 100+ bytes for a set of
+    username strings. New IDs land in the buffer and are merged into the sorted
+    array in bulk; the buffer limit grows with the array so merges stay amortised.
+    """
+
+    def __init__(self, ids=None, min_buffer_size=65536):
+        self.sorted_ids = np.empty(0, dtype=np.int64)
+        self.buffer = set()
+        self.min_buffer_size = min_buffer_size
+        if ids is not None:
+            self.update(ids)
+
+    def __len__(self):
+        return len(self.sorted_ids) + len(self.buffer)
+
+    def __contains__(self, id_):
+        id_ = int(id_)
+        if id_ in self.buffer:
+            return True
+        index = self.sorted_ids.searchsorted(id_)
+        return index < len(self.sorted_ids) and self.sorted_ids[index] == id_
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    def add(self, id_):
+        """Add one ID, returning True if it was not already present."""
+        id_ = int(id_)
+        if id_ in self:
+            return False
+        self.buffer.add(id_)
+        self._maybe_merge_buffer()
+        return True
+
+    def add_many(self, ids):
+        """Add a batch of IDs and return the ones that were new, in input order."""
+        candidates = [int(id_) for id_ in ids]
+        if candidates and len(self.sorted_ids):
+            # One vectorised lookup against the sorted array instead of one per ID
+            values = np.array(candidates, dtype=np.int64)
+            positions = self.sorted_ids.searchsorted(values)
+            present = self.sorted_ids[np.minimum(positions, len(self.sorted_ids) - 1)] == values
+            candidates = [id_ for id_, found in zip(candidates, present.tolist()) if not found]
+        new_ids = []
+        for id_ in candidates:
+            if id_ not in self.buffer:
+                self.buffer.add(id_)
+                new_ids.append(id_)
+        self._maybe_merge_buffer()
+        return new_ids
+
+    def update(self, ids):
+        if isinstance(ids, IdSet):
+            ids = ids.to_array()
+        elif not isinstance(ids, np.ndarray):
+            ids = np.fromiter((int(id_) for id_ in ids), dtype=np.int64)
+        ids = np.unique(ids.astype(np.int64, copy=False))
+        self._merge_buffer()
+        self.sorted_ids = self._insert_missing(self.sorted_ids, ids)
+
+    def union(self, other):
+        result = IdSet(min_buffer_size=self.min_buffer_size)
+        result.sorted_ids = self.to_array().copy()
+        result.update(other)
+        return result
+
+    def to_array(self):
+        self._merge_buffer()
+        return self.sorted_ids
+
+    def _maybe_merge_buffer(self):
+        if len(self.buffer) >= max(self.min_buffer_size, len(self.sorted_ids) // 16):
+            self._merge_buffer()
+
+    def _merge_buffer(self):
+        if not self.buffer:
+            return
+        buffered = np.fromiter(self.buffer, dtype=np.int64, count=len(self.buffer))
+        buffered.sort()
+        # Buffered IDs are never already in sorted_ids, so a positional insert keeps it sorted and unique
+        self.sorted_ids = np.insert(self.sorted_ids, np.searchsorted(self.sorted_ids, buffered), buffered)
+        self.buffer.clear()
+
+    @staticmethod
+    def _insert_missing(sorted_ids, ids):
+        if not len(sorted_ids):
+            return ids
+        positions = np.searchsorted(sorted_ids, ids)
+        missing = sorted_ids[np.minimum(positions, len(sorted_ids) - 1)] != ids
+        return np.insert(sorted_ids, positions[missing], ids[missing])
+
+    def save(self, path):
+        """Write the IDs as a .npy file, replacing path atomically."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.to_array())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, min_buffer_size=65536):
+        id_set = cls(min_buffer_size=min_buffer_size)
+        try:
+            id_set.sorted_ids = np.load(path).astype(np.int64, copy=False)
+        except FileNotFoundError:
+            pass
+        return id_set
@@ -0,0 +1,98 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_listener = None
+_lock = threading.Lock()
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Fix the message now, since the args may change before the listener gets to the
+        # record, but leave the formatting and the traceback text to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, for log shippers and jq.
+
+    Pass structured fields with extra={'fields': {...}}; they are merged into
+    the object instead of being formatted into the message.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage()
+        }
+        fields = getattr(record, 'fields', None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+def setup_logging(level=None, log_path=None, json_path=None, console=True):
+    """Send every record through a queue to one listener thread that does the formatting and I/O.
+
+    Worker threads only build the record and enqueue it, so a slow terminal or
+    disk never stalls a request. level defaults to $LOG_LEVEL or INFO, and
+    json_path to $LOG_JSON; log_path adds a plain-text file. Only the first
+    call configures anything, so entry points and scraper main()s can all call it.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        level = level or os.environ.get('LOG_LEVEL', 'INFO')
+        json_path = json_path or os.environ.get('LOG_JSON')
+
+        handlers = []
+        if console:
+            handlers.append(logging.StreamHandler())
+        if log_path:
+            handlers.append(logging.FileHandler(log_path, delay=True))
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+        if json_path:
+            json_handler = logging.FileHandler(json_path, delay=True)
+            json_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(json_handler)
+
+        # Neither format uses process details, so skip looking them up for every record
+        logging.logProcesses = False
+        logging.logMultiprocessing = False
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(_QueueHandler(log_queue))
+        root.setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+def stop_logging():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
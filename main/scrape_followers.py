@@ -7,11 +7,13 @@ import time
 import traceback
 import logging
 import os
+import argparse
 
 # Add the Scrapers directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from Scrapers.v4_scraper import main as v4_scraper_main
+from metrics import REGISTRY
+from log_setup import setup_logging
 from db_utils import (
     get_database_connection,
     get_accounts_from_database,
@@ -21,7 +23,6 @@ from db_utils import (
     db_config
 )
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def get_user_ids_from_csv(csv_filename):
@@ -42,7 +43,26 @@ def load_user_state(user_id):
     except FileNotFoundError:
         return None
 
+def load_job_config(path):
+    """Job file for a non-interactive run.
+
+    Keys: csv_filename (required), user_ids (defaults to the CSV's User ID column),
+    num_accounts (defaults to every available account), metrics_port and
+    metrics_textfile.
+    """
+    with open(path, 'r') as f:
+        config = json.load(f)
+    if not config.get('csv_filename'):
+        raise ValueError(f"{path} must set csv_filename")
+    return config
+
 def main():
+    setup_logging(log_path='debug.log')
+    parser = argparse.ArgumentParser(description="Instagram Follower Scraper")
+    parser.add_argument("--config", help="Path to a JSON job file; runs without prompting")
+    args = parser.parse_args()
+    config = load_job_config(args.config) if args.config else None
+
     connection = get_database_connection()
     accounts = get_accounts_from_database(connection)
 
@@ -52,29 +72,39 @@ def main():
         sys.exit(1)
 
     total_accounts = len(accounts)
-    logger.info(f"Total available accounts: {total_accounts}")
+    logger.info("Total available accounts: %s", total_accounts)
 
-    while True:
+    while config is None:
         try:
             num_accounts = int(input(f"Enter the number of accounts to use for scraping (1-{total_accounts}): "))
             if 1 <= num_accounts <= total_accounts:
                 break
             else:
-                logger.error(f"Please enter a number between 1 and {total_accounts}.")
+                logger.error("Please enter a number between 1 and %s.", total_accounts)
         except ValueError:
             logger.error("Please enter a valid number.")
 
+    if config is not None:
+        num_accounts = min(int(config.get('num_accounts', total_accounts)), total_accounts)
+        if num_accounts < 1:
+            logger.error("num_accounts in the job file must be at least 1.")
+            sys.exit(1)
+
     selected_accounts = random.sample(accounts, num_accounts)
 
-    csv_filename = input("Enter the CSV filename containing user IDs to scrape without the .csv extension: ")
-    user_ids = get_user_ids_from_csv(csv_filename)
+    if config is not None:
+        csv_filename = config['csv_filename']
+        user_ids = [str(user_id) for user_id in config.get('user_ids') or get_user_ids_from_csv(csv_filename)]
+    else:
+        csv_filename = input("Enter the CSV filename containing user IDs to scrape without the .csv extension: ")
+        user_ids = get_user_ids_from_csv(csv_filename)
 
     if not user_ids:
-        logger.error(f"No valid user IDs found in {csv_filename}.csv. Please check the file format.")
+        logger.error("No valid user IDs found in %s.csv. Please check the file format.", csv_filename)
         sys.exit(1)
 
-    logger.info(f"Found {len(user_ids)} user IDs to scrape.")
-    logger.info(f"Number of accounts selected for scraping: {num_accounts}")
+    logger.info("Found %s user IDs to scrape.", len(user_ids))
+    logger.info("Number of accounts selected for scraping: %s", num_accounts)
 
     scraped_counts = {}
     total_scraped = 0
@@ -91,78 +121,62 @@ def main():
             
             scraped_counts[user_id] = scraped_count
             total_scraped += scraped_count
-            logger.info(f"User ID: {user_id} - Followers already scraped: {scraped_count}")
+            logger.info("User ID: %s - Followers already scraped: %s", user_id, scraped_count)
             if scraping_status in ['completed', 'stopped', 'error']:
-                logger.info(f"Skipping User ID: {user_id} - Status: {scraping_status}, Reason: {scraping_stop_reason}")
+                logger.info("Skipping User ID: %s - Status: %s, Reason: %s", user_id, scraping_status, scraping_stop_reason)
                 skipped_user_ids.append(user_id)
                 continue
         else:
             scraped_counts[user_id] = 0
-            logger.info(f"User ID: {user_id} - No previous state found")
+            logger.info("User ID: %s - No previous state found", user_id)
 
     # Remove skipped user IDs from the list to scrape
     user_ids = [uid for uid in user_ids if uid not in skipped_user_ids]
 
     logger.info("Initial scraped follower counts per user ID:")
     logger.info(json.dumps(scraped_counts, indent=2))
-    logger.info(f"Initial total scraped followers from all user IDs: {total_scraped}")
-    logger.info(f"Skipped user IDs and reasons:")
+    logger.info("Initial total scraped followers from all user IDs: %s", total_scraped)
+    logger.info("Skipped user IDs and reasons:")
     for uid in skipped_user_ids:
         state = load_user_state(uid)
         status = state.get('scraping_status', 'unknown')
         reason = state.get('scraping_stop_reason', 'unknown')
-        logger.info(f"  User ID: {uid} - Status: {status}, Reason: {reason}")
+        logger.info("  User ID: %s - Status: %s, Reason: %s", uid, status, reason)
     logger.info("-" * 50)
 
     account_data = prepare_account_data(selected_accounts)
 
+    account_ids = [account['id'] for account in account_data]
+    logger.info("Using accounts with IDs: %s", ', '.join(map(str, account_ids)))
+
+    if config is not None and config.get('metrics_port'):
+        REGISTRY.start_http_server(int(config['metrics_port']))
+
+    # Imported here so numpy and requests stay off the startup path until there is work to do
+    from Scrapers.v4_scraper import FollowerJobRunner
+    # One pool, writer and metrics reporter for every target instead of one per target
+    runner = FollowerJobRunner(
+        account_data, db_config, csv_filename,
+        textfile_path=config.get('metrics_textfile') if config is not None else None
+    )
+    try:
+        results = runner.run(user_ids)
+    finally:
+        runner.close()
+
     for user_id in user_ids:
         initial_count = scraped_counts.get(user_id, 0)
-        logger.info(f"Starting scrape for User ID: {user_id} - Initial follower count: {initial_count}")
-        
-        # Call v4_scraper main function directly
-        try:
-            account_ids = [account['id'] for account in account_data]
-            logger.info(f"Using accounts with IDs: {', '.join(map(str, account_ids))}")
-            
-            account_data_json = json.dumps(account_data)
-            db_config_json = json.dumps(db_config)
-            
-            v4_scraper_args = [
-                str(user_id),
-                csv_filename,
-                account_data_json,
-                db_config_json
-            ]
-                    
-            original_argv = sys.argv
-            sys.argv = ['v4_scraper.py'] + v4_scraper_args
-            
-            v4_scraper_main()
-            
-            sys.argv = original_argv
-            
-        except Exception as e:
-            logger.error(f"Error occurred while scraping User ID {user_id}: {str(e)}")
-            logger.error(traceback.format_exc())
+        result = results.get(str(user_id))
+        if result is None or 'total_followers_scraped' not in result:
+            reason = result['scraping_stop_reason'] if result else 'not run'
+            logger.warning("No follower count for User ID: %s - Reason: %s", user_id, reason)
             continue
-
-        # Update scraped count after scraping
-        state = load_user_state(user_id)
-        if state:
-            new_count = state.get('total_followers_scraped', 0)
-            scraping_status = state.get('scraping_status', 'in_progress')
-            scraping_stop_reason = state.get('scraping_stop_reason', None)
-            
-            scraped_counts[user_id] = new_count
-            total_scraped += (new_count - initial_count)
-            logger.info(f"Finished scraping for User ID: {user_id} - New follower count: {new_count}")
-            logger.info(f"Followers scraped in this session: {new_count - initial_count}")
-            logger.info(f"Scraping status: {scraping_status}, Reason: {scraping_stop_reason}")
-        else:
-            logger.warning(f"No state file found for User ID: {user_id} after scraping")
-        
-        logger.info("-" * 50)
+        new_count = result['total_followers_scraped']
+        scraped_counts[user_id] = new_count
+        total_scraped += (new_count - initial_count)
+        logger.info("Finished scraping for User ID: %s - New follower count: %s", user_id, new_count)
+        logger.info("Followers scraped in this session: %s", new_count - initial_count)
+        logger.info("Scraping status: %s, Reason: %s", result['scraping_status'], result['scraping_stop_reason'])
 
     # Update last_checked for used accounts
     for account in account_data:
@@ -173,8 +187,8 @@ def main():
     logger.info("Scraping process completed for all user IDs.")
     logger.info("Final scraped follower counts per user ID:")
     logger.info(json.dumps(scraped_counts, indent=2))
-    logger.info(f"Final total scraped followers from all user IDs: {total_scraped}")
-    logger.info(f"Skipped user IDs: {skipped_user_ids}")
+    logger.info("Final total scraped followers from all user IDs: %s", total_scraped)
+    logger.info("Skipped user IDs: %s", skipped_user_ids)
 
 if __name__ == "__main__":
     main()
@@ -5,11 +5,13 @@ import random
 from datetime import datetime
 import logging
 import os
+import argparse
 
 # Add the Scrapers directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from Scrapers.v4_data_scraper import main as v4_data_scraper_main
+from log_setup import setup_logging
 from db_utils import (
     get_database_connection,
     get_accounts_from_database,
@@ -19,7 +21,6 @@ from db_utils import (
     db_config
 )
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def get_user_ids_from_database(connection, csv_filename, table):
@@ -36,7 +37,7 @@ def get_user_ids_from_database(connection, csv_filename, table):
             query = """
             SELECT user_id
             FROM user_ids
-            WHERE csv_filename = %s
+            WHERE csv_filename = %s AND user_id IS NOT NULL
             """
         else:
             raise ValueError("Invalid table name")
@@ -46,7 +47,7 @@ def get_user_ids_from_database(connection, csv_filename, table):
         cursor.close()
         return user_ids
     except Exception as e:
-        logger.error(f"Error fetching user IDs from database: {e}")
+        logger.error("Error fetching user IDs from database: %s", e)
         return []
 
 def get_user_ids_from_csv(csv_filename):
@@ -56,13 +57,14 @@ def get_user_ids_from_csv(csv_filename):
             user_ids = [row[0] for row in csv_reader if row]  # Assuming user IDs are in the first column
         return user_ids
     except FileNotFoundError:
-        logger.error(f"CSV file not found: {csv_filename}")
+        logger.error("CSV file not found: %s", csv_filename)
         return []
     except Exception as e:
-        logger.error(f"Error reading CSV file: {e}")
+        logger.error("Error reading CSV file: %s", e)
         return []
 
 def initialize_database():
+    connection = None
     try:
         connection = get_database_connection()
         cursor = connection.cursor()
@@ -146,15 +148,20 @@ def initialize_database():
         """)
 
         connection.commit()
+        cursor.close()
         logger.info("Database tables initialized successfully")
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if connection:
             connection.close()
 
 def main():
+    setup_logging()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--work-queue", action="store_true", help="Share the campaign with other workers through the scrape_jobs table")
+    args = parser.parse_args()
+
     connection = get_database_connection()
     accounts = get_accounts_from_database(connection)
 
@@ -164,7 +171,7 @@ def main():
         sys.exit(1)
 
     total_accounts = len(accounts)
-    logger.info(f"Total available accounts: {total_accounts}")
+    logger.info("Total available accounts: %s", total_accounts)
 
     while True:
         try:
@@ -172,7 +179,7 @@ def main():
             if 1 <= num_accounts <= total_accounts:
                 break
             else:
-                logger.error(f"Please enter a number between 1 and {total_accounts}.")
+                logger.error("Please enter a number between 1 and %s.", total_accounts)
         except ValueError:
             logger.error("Please enter a valid number.")
 
@@ -202,11 +209,11 @@ def main():
     connection.close()
 
     if not user_ids:
-        logger.error(f"No valid user IDs found. Please check the {'database' if source == 'db' else 'CSV file'}.")
+        logger.error("No valid user IDs found. Please check the %s.", 'database' if source == 'db' else 'CSV file')
         sys.exit(1)
 
-    logger.info(f"Found {len(user_ids)} user IDs to scrape.")
-    logger.info(f"Number of accounts selected for scraping: {num_accounts}")
+    logger.info("Found %s user IDs to scrape.", len(user_ids))
+    logger.info("Number of accounts selected for scraping: %s", num_accounts)
 
     # Initialize database tables
     initialize_database()
@@ -214,7 +221,7 @@ def main():
     account_data = prepare_account_data(selected_accounts)
 
     account_ids = [account['id'] for account in account_data]
-    logger.info(f"Using accounts with IDs: {', '.join(map(str, account_ids))}")
+    logger.info("Using accounts with IDs: %s", ', '.join(map(str, account_ids)))
 
     account_data_json = json.dumps(account_data)
     db_config_json = json.dumps(db_config)
@@ -226,6 +233,9 @@ def main():
         db_config_json
     ]
 
+    if args.work_queue:
+        v4_data_scraper_args.append('--work-queue')
+
     original_argv = sys.argv
     sys.argv = ['v4_data_scraper.py'] + v4_data_scraper_args
 
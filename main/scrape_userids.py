@@ -5,11 +5,13 @@ import random
 from datetime import datetime
 import logging
 import os
+import argparse
 
 # Add the Scrapers directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from Scrapers.v4_userid_scraper import main as v4_userid_scraper_main
+from log_setup import setup_logging
 from db_utils import (
     get_database_connection,
     get_accounts_from_database,
@@ -19,7 +21,6 @@ from db_utils import (
     db_config
 )
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def get_usernames_from_file(filename):
@@ -32,6 +33,7 @@ def get_usernames_from_file(filename):
     return usernames
 
 def initialize_database():
+    connection = None
     try:
         connection = get_database_connection()
         cursor = connection.cursor()
@@ -40,20 +42,27 @@ def initialize_database():
         CREATE TABLE IF NOT EXISTS user_ids (
             username VARCHAR(255) PRIMARY KEY,
             user_id BIGINT,
-            csv_filename VARCHAR(255)
+            csv_filename VARCHAR(255),
+            status VARCHAR(16) NOT NULL DEFAULT 'found',
+            resolved_at DATETIME NULL
         )
         """)
 
         connection.commit()
+        cursor.close()
         logger.info("Database table initialized successfully")
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
     finally:
-        if connection.is_connected():
-            cursor.close()
+        if connection:
             connection.close()
 
 def main():
+    setup_logging()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--work-queue", action="store_true", help="Share the campaign with other workers through the scrape_jobs table")
+    args = parser.parse_args()
+
     connection = get_database_connection()
     accounts = get_accounts_from_database(connection)
 
@@ -63,7 +72,7 @@ def main():
         sys.exit(1)
 
     total_accounts = len(accounts)
-    logger.info(f"Total available accounts: {total_accounts}")
+    logger.info("Total available accounts: %s", total_accounts)
 
     while True:
         try:
@@ -71,7 +80,7 @@ def main():
             if 1 <= num_accounts <= total_accounts:
                 break
             else:
-                logger.error(f"Please enter a number between 1 and {total_accounts}.")
+                logger.error("Please enter a number between 1 and %s.", total_accounts)
         except ValueError:
             logger.error("Please enter a valid number.")
 
@@ -84,11 +93,11 @@ def main():
     usernames = get_usernames_from_file(input_filename)
 
     if not usernames:
-        logger.error(f"No valid usernames found in the file: {input_filename}. Please check the file.")
+        logger.error("No valid usernames found in the file: %s. Please check the file.", input_filename)
         sys.exit(1)
 
-    logger.info(f"Found {len(usernames)} usernames to scrape.")
-    logger.info(f"Number of accounts selected for scraping: {num_accounts}")
+    logger.info("Found %s usernames to scrape.", len(usernames))
+    logger.info("Number of accounts selected for scraping: %s", num_accounts)
 
     # Initialize database table
     initialize_database()
@@ -96,7 +105,7 @@ def main():
     account_data = prepare_account_data(selected_accounts)
 
     account_ids = [account['id'] for account in account_data]
-    logger.info(f"Using accounts with IDs: {', '.join(map(str, account_ids))}")
+    logger.info("Using accounts with IDs: %s", ', '.join(map(str, account_ids)))
 
     account_data_json = json.dumps(account_data)
     db_config_json = json.dumps(db_config)
@@ -112,6 +121,9 @@ def main():
         db_config_json
     ]
 
+    if args.work_queue:
+        v4_userid_scraper_args.append('--work-queue')
+
     original_argv = sys.argv
     sys.argv = ['v4_userid_scraper.py'] + v4_userid_scraper_args
 
@@ -125,7 +137,7 @@ def main():
 
     connection.close()
 
-    logger.info(f"User ID scraping process completed. Results saved to {output_filename}")
+    logger.info("User ID scraping process completed. Results saved to %s", output_filename)
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,3 @@
-import requests
 import csv
 import sys
 import os
@@ -8,13 +7,15 @@ from datetime import datetime
 import logging
 import time
 import argparse
-from collections import Counter
 
 # Add the Scrapers directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from Scrapers.v4_userid_scraper import InstagramUserIDScraper
-from Scrapers.tagged_scraper import InstagramTaggedScraper
+# The scrapers and requests are imported where they are used, so a run that only
+# needs cached user IDs doesn't pay for loading them
+from user_id_cache import get_user_id_cache
+from work_queue import WorkQueue
+from log_setup import setup_logging
 from db_utils import (
     get_database_connection,
     get_accounts_from_database,
@@ -29,10 +30,10 @@ CLICKUP_API_KEY = "pk_36436044_38D41W302D9XIE59WEGJJ8PT87Q8FE9X"
 FOLDER_ID = "90121508608"
 CLICKUP_API_URL = f"https://api.clickup.com/api/v2/folder/{FOLDER_ID}/list"
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def get_list_id(list_name):
+    import requests
     headers = {
         "Authorization": CLICKUP_API_KEY,
         "Content-Type": "application/json"
@@ -46,6 +47,7 @@ def get_list_id(list_name):
     raise ValueError(f"List '{list_name}' not found in folder {FOLDER_ID}")
 
 def fetch_clickup_data(list_id):
+    import requests
     headers = {
         "Authorization": CLICKUP_API_KEY,
         "Content-Type": "application/json"
@@ -81,9 +83,9 @@ def fetch_clickup_data(list_id):
                 break
             
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching data from ClickUp: {str(e)}")
+            logger.error("Error fetching data from ClickUp: %s", str(e))
             if hasattr(e.response, 'text'):
-                logger.error(f"Response content: {e.response.text}")
+                logger.error("Response content: %s", e.response.text)
             raise
 
     return all_tasks
@@ -98,52 +100,34 @@ def extract_usernames(tasks):
             usernames.append(instagram_handle)
     return usernames
 
-def get_user_ids(usernames, account_data, db_config):
+def get_user_ids(usernames, account_data, db_config, fetch_missing=True):
     user_ids = {}
-    connection = None
-    cursor = None
     try:
-        connection = get_database_connection()
-        cursor = connection.cursor(dictionary=True)
-
-        placeholders = ', '.join(['%s'] * len(usernames))
-        query = f"""
-        SELECT username, user_id 
-        FROM user_ids 
-        WHERE username IN ({placeholders})
-        """
-
-        cursor.execute(query, tuple(usernames))
-        results = cursor.fetchall()
-
-        for row in results:
-            user_ids[row['username']] = row['user_id']
-
-        logger.info(f"Retrieved {len(user_ids)} user IDs from database")
-
-        missing_usernames = set(usernames) - set(user_ids.keys())
-        if missing_usernames:
-            logger.warning(f"Missing user IDs for {len(missing_usernames)} usernames. Scraping them now.")
+        user_id_cache = get_user_id_cache()
+        user_ids, not_found, missing_usernames = user_id_cache.lookup(usernames)
+        logger.info("Retrieved %s user IDs from the user ID cache, %s cached as not found", len(user_ids), len(not_found))
+
+        if missing_usernames and not fetch_missing:
+            logger.warning("Missing user IDs for %s usernames. Not fetching them in offline mode.", len(missing_usernames))
+        elif missing_usernames:
+            logger.warning("Missing user IDs for %s usernames. Scraping them now.", len(missing_usernames))
             
             csv_filename = f"user_ids_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-            scraper = InstagramUserIDScraper(list(missing_usernames), csv_filename, json.dumps(account_data), json.dumps(db_config))
+            from Scrapers.v4_userid_scraper import InstagramUserIDScraper
+            scraper = InstagramUserIDScraper(missing_usernames, csv_filename, json.dumps(account_data), json.dumps(db_config), user_id_cache=user_id_cache)
             new_user_ids = scraper.scrape_user_ids()
             
             user_ids.update(new_user_ids)
             
-            logger.info(f"Scraped {len(new_user_ids)} new user IDs")
+            logger.info("Scraped %s new user IDs", len(new_user_ids))
 
     except Exception as e:
-        logger.error(f"Error querying user IDs from database: {e}")
-    finally:
-        if cursor:
-            cursor.close()
-        if connection and connection.is_connected():
-            connection.close()
+        logger.error("Error querying user IDs from database: %s", e)
 
     return user_ids
 
 def update_clickup_status(task_id, new_status):
+    import requests
     headers = {
         "Authorization": CLICKUP_API_KEY,
         "Content-Type": "application/json"
@@ -155,34 +139,51 @@ def update_clickup_status(task_id, new_status):
     try:
         response = requests.put(url, headers=headers, json=data)
         response.raise_for_status()
-        logger.info(f"Updated task {task_id} status to {new_status}")
+        logger.info("Updated task %s status to %s", task_id, new_status)
     except requests.exceptions.RequestException as e:
-        logger.error(f"Error updating ClickUp task status: {str(e)}")
+        logger.error("Error updating ClickUp task status: %s", str(e))
 
 def read_usernames_from_file(filename):
     with open(filename, 'r') as file:
         return [line.strip() for line in file if line.strip()]
 
-def save_results_to_csv(usernames, user_ids, successful_taggers, csv_filename):
+def aggregate_tagged_posts(tagged_posts, target_user_id=None):
+    """Collapse InstagramTaggedScraper.tagged_posts into {user_id: (post count, post IDs)} in one pass.
+
+    With target_user_id set, only posts tagging that target are counted.
+    """
+    totals = {}
+    for user_id, targets in tagged_posts.items():
+        post_ids = []
+        for target_id, target_post_ids in targets.items():
+            if target_user_id is None or target_id == target_user_id:
+                post_ids.extend(target_post_ids)
+        if post_ids:
+            post_ids = list(dict.fromkeys(post_ids))  # A post tagging several targets is counted once
+            totals[str(user_id)] = (len(post_ids), post_ids)
+    return totals
+
+def save_results_to_csv(usernames, user_ids, tagged_posts, csv_filename, target_user_id=None):
+    totals = aggregate_tagged_posts(tagged_posts, target_user_id)
     with open(csv_filename, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Username', 'User ID', 'Number of Tagged Posts']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        writer.writeheader()
+        writer = csv.writer(csvfile)
+        writer.writerow(['Username', 'User ID', 'Number of Tagged Posts', 'Tagged Post IDs'])
         for username in usernames:
-            user_id = user_ids.get(username, 'N/A')
-            tagged_posts_count = Counter(successful_taggers)[str(user_id)] if user_id != 'N/A' else 0
-            writer.writerow({
-                'Username': username,
-                'User ID': user_id,
-                'Number of Tagged Posts': tagged_posts_count
-            })
+            user_id = user_ids.get(username)
+            tagged_posts_count, post_ids = totals.get(str(user_id), (0, [])) if user_id is not None else (0, [])
+            writer.writerow([username, user_id if user_id is not None else 'N/A', tagged_posts_count, ';'.join(map(str, post_ids))])
     
-    logger.info(f"Results saved to {csv_filename}")
+    logger.info("Results saved to %s", csv_filename)
 
 def main():
+    setup_logging()
     parser = argparse.ArgumentParser(description="Instagram Tagged Post Scraper")
     parser.add_argument("--file", help="Path to text file containing usernames")
+    parser.add_argument("--offline", action="store_true", help="Re-run tag detection from cached feeds without fetching")
+    parser.add_argument("--work-queue", action="store_true",
+                        help="Share the feed fetches with other workers through the scrape_jobs table; "
+                             "start every worker of a run with the same --resume RUN_ID")
+    parser.add_argument("--resume", metavar="RUN_ID", help="Restart an interrupted run, skipping users it already checked")
     args = parser.parse_args()
 
     connection = get_database_connection()
@@ -194,7 +195,7 @@ def main():
         sys.exit(1)
 
     total_accounts = len(accounts)
-    logger.info(f"Total available accounts: {total_accounts}")
+    logger.info("Total available accounts: %s", total_accounts)
 
     while True:
         try:
@@ -202,7 +203,7 @@ def main():
             if 1 <= num_accounts <= total_accounts:
                 break
             else:
-                logger.error(f"Please enter a number between 1 and {total_accounts}.")
+                logger.error("Please enter a number between 1 and %s.", total_accounts)
         except ValueError:
             logger.error("Please enter a valid number.")
 
@@ -211,60 +212,73 @@ def main():
     account_data = prepare_account_data(selected_accounts)
 
     account_ids = [account['id'] for account in account_data]
-    logger.info(f"Using accounts with IDs: {', '.join(map(str, account_ids))}")
+    logger.info("Using accounts with IDs: %s", ', '.join(map(str, account_ids)))
 
     if args.file:
         usernames = read_usernames_from_file(args.file)
-        logger.info(f"Read {len(usernames)} usernames from file: {args.file}")
+        logger.info("Read %s usernames from file: %s", len(usernames), args.file)
     else:
         list_name = 'Ecobelleza'
         try:
             list_id = get_list_id(list_name)
-            logger.info(f"Found list ID: {list_id}")
+            logger.info("Found list ID: %s", list_id)
             tasks = fetch_clickup_data(list_id)
-            logger.info(f"Fetched {len(tasks)} tasks from ClickUp")
+            logger.info("Fetched %s tasks from ClickUp", len(tasks))
             usernames = extract_usernames(tasks)
-            logger.info(f"Extracted {len(usernames)} usernames with non-null Instagram handles")
+            logger.info("Extracted %s usernames with non-null Instagram handles", len(usernames))
         except Exception as e:
-            logger.error(f"Error fetching data from ClickUp: {str(e)}")
+            logger.error("Error fetching data from ClickUp: %s", str(e))
             return
 
     if not usernames:
         logger.info("No usernames found to process.")
         return
 
-    logger.info(f"Found {len(usernames)} usernames to process.")
+    logger.info("Found %s usernames to process.", len(usernames))
 
-    user_ids = get_user_ids(usernames, account_data, db_config)
+    user_ids = get_user_ids(usernames, account_data, db_config, fetch_missing=not args.offline)
 
     target_username = 'ecobelleza.oficial'
-    target_user_id = get_user_ids([target_username], account_data, db_config).get(target_username)
+    target_user_id = get_user_ids([target_username], account_data, db_config, fetch_missing=not args.offline).get(target_username)
     
     if not target_user_id:
-        logger.error(f"Could not find or scrape user ID for target username: {target_username}. Exiting.")
+        logger.error("Could not find or scrape user ID for target username: %s. Exiting.", target_username)
         return
 
-    logger.info(f"Target user ID for {target_username}: {target_user_id}")
+    logger.info("Target user ID for %s: %s", target_username, target_user_id)
 
     # Prepare user_data for tagged scraper
     user_data = {str(user_id): username for username, user_id in user_ids.items()}
 
-    # Define csv_filename
-    csv_filename = f"tagged_posts/tagged_posts_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    # Define csv_filename; the run ID names the results CSV and the run's resume checkpoint
+    run_id = args.resume or datetime.now().strftime('%Y%m%d_%H%M%S')
+    csv_filename = f"tagged_posts/tagged_posts_{run_id}.csv"
+    logger.info("Run ID: %s (pass --resume %s to restart this run if it is interrupted)", run_id, run_id)
 
     # Run tagged scraper
     if user_data:
-        scraper = InstagramTaggedScraper(user_data, target_user_id, target_username, csv_filename, json.dumps(account_data), json.dumps(db_config))
-        logger.info(f"Scraping tagged posts for {len(user_data)} users")
-        logger.info(f"Using accounts with IDs: {', '.join(str(id) for id in scraper.account_id_to_index.keys())}")
-        scraper.display_account_status()
-        scraper.scrape_tagged_posts()
+        from Scrapers.tagged_scraper import InstagramTaggedScraper
+        from feed_cache import FeedCache
+        # Apply the cache TTL on disk too; latest() only skips expired entries
+        feed_cache = FeedCache()
+        feed_cache.prune()
+        # One campaign per run, so a new run does not inherit the finished jobs of an earlier one
+        work_queue = WorkQueue('tagged', f"{target_username}:{run_id}") if args.work_queue and not args.offline else None
+        scraper = InstagramTaggedScraper(user_data, target_user_id, target_username, csv_filename, json.dumps(account_data), json.dumps(db_config),
+                                         feed_cache=feed_cache, work_queue=work_queue, run_id=run_id)
+        logger.info("Scraping tagged posts for %s users", len(user_data))
+        logger.info("Using accounts with IDs: %s", ', '.join(str(id) for id in scraper.account_id_to_index.keys()))
+        if args.offline:
+            scraper.reanalyze_cached_feeds()
+        else:
+            scraper.display_account_status()
+            scraper.scrape_tagged_posts()
         successful_taggers = scraper.successful_taggers
         logger.info("Tagged post scraping process completed.")
 
         # Save results to CSV
         results_csv_filename = f"tagged_posts_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        save_results_to_csv(usernames, user_ids, successful_taggers, results_csv_filename)
+        save_results_to_csv(usernames, user_ids, scraper.tagged_posts, results_csv_filename, str(target_user_id))
 
         # Update ClickUp status only if not using file input
         if not args.file:
@@ -276,7 +290,7 @@ def main():
                     user_id = user_ids.get(instagram_handle)
                     if user_id and str(user_id) in successful_taggers:
                         update_clickup_status(task['id'], "aftercare")
-                        logger.info(f"Updated ClickUp status to 'aftercare' for user {instagram_handle} (ID: {user_id})")
+                        logger.info("Updated ClickUp status to 'aftercare' for user %s (ID: %s)", instagram_handle, user_id)
 
     else:
         logger.warning("No user IDs found to scrape tagged posts. Skipping tagged post scraping.")
@@ -0,0 +1,254 @@
+import bisect
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+class Counter:
+    type_name = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram:
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        self.values = {}  # label key -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = [0] * (len(self.buckets) + 2)
+            entry[index] += 1
+            entry[-1] += value
+
+    def time(self, **labels):
+        return _HistogramTimer(self, labels)
+
+    def summary(self, **labels):
+        entry = self.values.get(_label_key(labels))
+        if not entry:
+            return 0, 0.0
+        count = sum(entry[:-1])
+        return count, entry[-1] / count
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, entry in self.values.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, entry):
+                    cumulative += bucket_count
+                    samples.append((f"{self.name}_bucket", key + (('le', bound),), cumulative))
+                count = cumulative + entry[len(self.buckets)]
+                samples.append((f"{self.name}_bucket", key + (('le', '+Inf'),), count))
+                samples.append((f"{self.name}_sum", key, entry[-1]))
+                samples.append((f"{self.name}_count", key, count))
+        return samples
+
+class _HistogramTimer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.monotonic() - self.start, **self.labels)
+
+class MetricsRegistry:
+    """Process-wide counters, gauges and histograms with Prometheus text exposition.
+
+    Updates only touch one dict entry under a per-metric lock. Collectors are
+    callbacks run right before rendering, for values that are cheaper to read
+    on demand (queue depths, account availability) than to push on every change.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self.http_server = None
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.type_name}")
+            return metric
+
+    def counter(self, name, help_text=''):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text=''):
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name, help_text='', buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def register_collector(self, collector):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def unregister_collector(self, collector):
+        with self.lock:
+            if collector in self.collectors:
+                self.collectors.remove(collector)
+
+    def collect(self):
+        with self.lock:
+            collectors = list(self.collectors)
+            metrics = list(self.metrics.values())
+        for collector in collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error("Metrics collector %s failed: %s", collector, e)
+        return metrics
+
+    def render(self):
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for sample_name, key, value in metric.samples():
+                lines.append(f"{sample_name}{_format_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary_line(self):
+        parts = []
+        for metric in self.collect():
+            if isinstance(metric, Histogram):
+                for key in list(metric.values):
+                    count, average = metric.summary(**dict(key))
+                    parts.append(f"{metric.name}{_format_labels(key)}=count:{count},avg:{average:.3f}")
+            else:
+                for name, key, value in metric.samples():
+                    value = f"{value:.2f}" if isinstance(value, float) else value
+                    parts.append(f"{name}{_format_labels(key)}={value}")
+        return ', '.join(parts)
+
+    def write_textfile(self, path):
+        """Write the exposition atomically, for node_exporter's textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_http_server(self, port, host='127.0.0.1'):
+        if self.http_server is not None:
+            return self.http_server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self.http_server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Serving Prometheus metrics on http://%s:%s/metrics", host, port)
+        return self.http_server
+
+class SummaryReporter:
+    """Logs a one-line metrics summary (and optionally refreshes a textfile) every interval seconds."""
+
+    def __init__(self, registry, interval=60, textfile_path=None):
+        self.registry = registry
+        self.interval = interval
+        self.textfile_path = textfile_path
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="metrics-summary", daemon=True)
+        self.thread.start()
+        return self
+
+    def report(self):
+        logger.info("Metrics summary: %s", self.registry.summary_line())
+        if self.textfile_path:
+            self.registry.write_textfile(self.textfile_path)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.report()
+            except Exception as e:
+                logger.error("Error reporting metrics: %s", e)
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self.report()
+
+def record_writer_stats(registry, writer):
+    stats = writer.stats()
+    registry.gauge('writer_queue_depth', 'Items waiting in a write-behind queue').set(stats['queue_depth'], writer=writer.name)
+    registry.gauge('writer_items_flushed', 'Items flushed by a write-behind queue').set(stats['items_flushed'], writer=writer.name)
+    registry.gauge('writer_items_failed', 'Items dropped by failed write-behind flushes').set(stats['items_failed'], writer=writer.name)
+    registry.gauge('writer_flush_errors', 'Failed write-behind flushes').set(stats['flush_errors'], writer=writer.name)
+    registry.gauge('writer_flush_seconds_avg', 'Average write-behind flush latency').set(stats['avg_flush_latency'], writer=writer.name)
+    registry.gauge('writer_flush_seconds_max', 'Slowest write-behind flush').set(stats['max_flush_latency'], writer=writer.name)
+
+REGISTRY = MetricsRegistry()
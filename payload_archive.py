@@ -0,0 +1,69 @@
+import json
+import os
+import time
+import logging
+from write_behind import WriteBehindQueue
+
+logger = logging.getLogger(__name__)
+
+class PayloadArchive:
+    """Raw API responses written off-thread to zstd-compressed JSONL segments.
+
+    Each line holds the target, the request cursor, the fetch time and the
+    untouched payload. Segments are named after the target and rotated once
+    the compressed file reaches max_segment_bytes.
+    """
+
+    def __init__(self, directory, target, max_segment_bytes=64 * 1024 * 1024, compression_level=3):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.target = target
+        self.max_segment_bytes = max_segment_bytes
+        import zstandard  # Only runs that archive payloads pay for the import
+        self.compressor = zstandard.ZstdCompressor(level=compression_level)
+        self.flush_block = zstandard.FLUSH_BLOCK
+        self.segment = None
+        self.segment_file = None
+        self.segment_index = 0
+        self.writer = WriteBehindQueue(
+            self.write_records,
+            name=f"archive-{target}",
+            max_queue_size=1000,
+            batch_size=50,
+            flush_interval=5.0
+        )
+
+    def record(self, cursor, payload):
+        self.writer.put({
+            'target': self.target,
+            'cursor': cursor,
+            'fetched_at': time.time(),
+            'payload': payload
+        })
+
+    def open_segment(self):
+        filename = f"{self.target}_{time.strftime('%Y%m%d_%H%M%S')}_{self.segment_index:04d}.jsonl.zst"
+        path = os.path.join(self.directory, filename)
+        self.segment_file = open(path, 'wb')
+        self.segment = self.compressor.stream_writer(self.segment_file)
+        logger.debug("Opened payload archive segment %s", path)
+
+    def close_segment(self):
+        if self.segment is not None:
+            self.segment.close()  # Also closes segment_file
+            self.segment = None
+            self.segment_file = None
+            self.segment_index += 1
+
+    def write_records(self, records):
+        if self.segment is None:
+            self.open_segment()
+        for record in records:
+            self.segment.write((json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8'))
+        self.segment.flush(self.flush_block)
+        if self.segment_file.tell() >= self.max_segment_bytes:
+            self.close_segment()
+
+    def close(self):
+        self.writer.close()
+        self.close_segment()
@@ -0,0 +1,80 @@
+from functools import lru_cache
+
+# Column name -> (path into the web-profile "user" payload, default when missing).
+# A tuple path walks nested objects, treating a missing or null parent as empty.
+PROFILE_FIELDS = {
+    'user_id': ('pk', None),
+    'username': ('username', None),
+    'full_name': ('full_name', None),
+    'biography': ('biography', None),
+    'follower_count': ('follower_count', None),
+    'following_count': ('following_count', None),
+    'media_count': ('media_count', None),
+    'is_private': ('is_private', None),
+    'is_verified': ('is_verified', None),
+    'category': ('category', None),
+    'external_url': ('external_url', None),
+    'public_email': ('public_email', None),
+    'public_phone_number': ('public_phone_number', None),
+    'is_business': ('is_business', None),
+    'profile_pic_url': ('profile_pic_url', None),
+    'hd_profile_pic_url': (('hd_profile_pic_url_info', 'url'), None),
+    'has_highlight_reels': ('has_highlight_reels', None),
+    'has_guides': ('has_guides', None),
+    'is_interest_account': ('is_interest_account', None),
+    'total_igtv_videos': ('total_igtv_videos', None),
+    'total_clips_count': ('total_clips_count', 0),
+    'total_ar_effects': ('total_ar_effects', None),
+    'is_eligible_for_smb_support_flow': ('is_eligible_for_smb_support_flow', None),
+    'is_eligible_for_lead_center': ('is_eligible_for_lead_center', None),
+    'account_type': ('account_type', None),
+    'is_call_to_action_enabled': ('is_call_to_action_enabled', None),
+    'interop_messaging_user_fbid': ('interop_messaging_user_fbid', None),
+    'has_videos': ('has_videos', None),
+    'total_video_count': ('total_video_count', 0),
+    'has_music_on_profile': ('has_music_on_profile', None),
+    'is_potential_business': ('is_potential_business', None),
+    'is_memorialized': ('is_memorialized', None),
+}
+
+PINNED_CHANNEL_FIELDS = ('title', 'subtitle', 'invite_link', 'number_of_members')
+
+def _field_expression(path, default):
+    if isinstance(path, str):
+        path = (path,)
+    expression = 'user'
+    for key in path[:-1]:
+        expression = f"({expression}.get({key!r}) or {{}})"
+    return f"{expression}.get({path[-1]!r}, {default!r})"
+
+@lru_cache(maxsize=32)
+def compile_extractor(columns, defaults=()):
+    """Build a function that turns a profile payload into a row tuple ordered like columns.
+
+    Columns found in PROFILE_FIELDS are read from the payload; any other column
+    becomes a keyword argument of the generated function, so per-run values
+    such as gender or csv_filename land in the same tuple without a second pass.
+    defaults is a tuple of (column, default) pairs that override the
+    PROFILE_FIELDS default for this caller.
+    """
+    overrides = dict(defaults)
+    context_columns = [column for column in columns if column not in PROFILE_FIELDS]
+    values = [
+        _field_expression(PROFILE_FIELDS[column][0], overrides.get(column, PROFILE_FIELDS[column][1]))
+        if column in PROFILE_FIELDS else column
+        for column in columns
+    ]
+    arguments = ''.join(f", {column}=None" for column in context_columns)
+    source = f"def extract(user{arguments}):\n    return ({', '.join(values)},)\n"
+    namespace = {}
+    exec(compile(source, f"<profile extractor {','.join(columns)}>", 'exec'), namespace)
+    extract = namespace['extract']
+    extract.source = source
+    return extract
+
+def bio_link_urls(user):
+    return [link.get('url') for link in user.get('bio_links') or []]
+
+def pinned_channels(user):
+    channels = (user.get('pinned_channels_info') or {}).get('pinned_channels_list') or []
+    return [tuple(channel.get(field) for field in PINNED_CHANNEL_FIELDS) for channel in channels]
@@ -1,7 +1,7 @@
-import mysql.connector
 import csv
 import os
 from mysql.connector import Error
+from db_utils import get_pool
 
 # Database configuration
 db_config = {
@@ -13,9 +13,7 @@ db_config = {
 
 def connect_to_database():
     try:
-        connection = mysql.connector.connect(**db_config)
-        if connection.is_connected():
-            return connection
+        return get_pool(db_config, workers=1).get_connection()
     except Error as e:
         print(f"Error connecting to MySQL database: {e}")
     return None
@@ -68,9 +66,8 @@ def main():
     except Error as e:
         print(f"Error: {e}")
     finally:
-        if connection.is_connected():
-            connection.close()
-            print("Database connection closed.")
+        connection.close()
+        print("Database connection closed.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import logging
+import numpy as np
+from id_set import IdSet
+
+logger = logging.getLogger(__name__)
+
+ID_DTYPE = np.dtype('<i8')
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+class IdJournal:
+    """IdSet persisted as a .npy snapshot plus an append-only journal of raw int64s.
+
+    append() writes only the IDs seen since the previous checkpoint, so saving
+    state costs O(new IDs) rather than O(all IDs). Once the journal has grown
+    as large as the snapshot, compact() writes a new snapshot (temp file and
+    rename) and truncates the journal.
+    """
+
+    def __init__(self, base_path, min_compact_entries=10000):
+        self.snapshot_path = f"{base_path}.npy"
+        self.journal_path = f"{base_path}.idlog"
+        self.min_compact_entries = min_compact_entries
+        self.snapshot_entries = 0
+        self.journal_entries = 0
+
+    def _read_journal(self):
+        try:
+            with open(self.journal_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return np.empty(0, dtype=ID_DTYPE)
+        complete_length = len(data) - len(data) % ID_DTYPE.itemsize
+        if complete_length < len(data):
+            # A crash mid-append left a torn last entry; drop it so the next append starts aligned
+            logger.warning("Discarding %s trailing bytes from %s", len(data) - complete_length, self.journal_path)
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(complete_length)
+        return np.frombuffer(data[:complete_length], dtype=ID_DTYPE)
+
+    def load(self):
+        ids = IdSet.load(self.snapshot_path)
+        journal_ids = self._read_journal()
+        self.snapshot_entries = len(ids)
+        self.journal_entries = len(journal_ids)
+        ids.update(journal_ids)
+        return ids
+
+    def append(self, ids):
+        if not len(ids):
+            return
+        with open(self.journal_path, 'ab') as f:
+            f.write(np.asarray(ids, dtype=ID_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal_entries += len(ids)
+
+    def needs_compaction(self):
+        return self.journal_entries >= max(self.min_compact_entries, self.snapshot_entries)
+
+    def compact(self, ids):
+        ids.save(self.snapshot_path)
+        # Everything in the journal is now in the snapshot
+        open(self.journal_path, 'wb').close()
+        self.snapshot_entries = len(ids)
+        self.journal_entries = 0
+        logger.info("Compacted %s IDs into %s", self.snapshot_entries, self.snapshot_path)
+
+    def remove(self):
+        for path in (self.snapshot_path, self.journal_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.snapshot_entries = 0
+        self.journal_entries = 0
+
+class JournaledIdSet:
+    """IdSet backed by an IdJournal, for resume bookkeeping.
+
+    Membership is answered from memory; add() only records the ID, and
+    checkpoint() journals everything added since the previous checkpoint.
+    With base_path None nothing is written, for runs whose resume state lives
+    elsewhere (the work queue's jobs table).
+    """
+
+    def __init__(self, base_path, min_compact_entries=10000):
+        self.journal = IdJournal(base_path, min_compact_entries) if base_path else None
+        self.ids = self.journal.load() if self.journal else IdSet()
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def __contains__(self, id_):
+        return id_ in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, id_):
+        with self.lock:
+            if self.ids.add(id_):
+                self.pending.append(int(id_))
+
+    def update(self, ids):
+        with self.lock:
+            self.pending.extend(self.ids.add_many(ids))
+
+    def checkpoint(self):
+        with self.lock:
+            if self.journal is None:
+                self.pending = []
+                return
+            self.journal.append(self.pending)
+            self.pending = []
+            if self.journal.needs_compaction():
+                self.journal.compact(self.ids)
+
+    def clear(self):
+        """Forget every ID and delete the files, once the state is no longer needed for a resume."""
+        with self.lock:
+            self.ids = IdSet()
+            self.pending = []
+            if self.journal is not None:
+                self.journal.remove()
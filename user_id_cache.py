@@ -0,0 +1,161 @@
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from mysql.connector import Error
+from db_utils import get_database_connection, bulk_lookup, bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+FOUND = 'found'
+NOT_FOUND = 'not_found'
+USER_ID_COLUMNS = ('username', 'user_id', 'csv_filename', 'status', 'resolved_at')
+
+class UserIdCache:
+    """Campaign-independent username -> user_id resolution cache.
+
+    Backed by the user_ids table (keyed by username) with an in-process LRU in
+    front. Usernames that Instagram reported as missing are stored too, with a
+    NULL user_id and status 'not_found', so they aren't fetched again until
+    negative_ttl has passed. Rows without resolved_at predate this cache and are
+    treated as fresh hits.
+    """
+
+    def __init__(self, connect=get_database_connection, ttl=timedelta(days=90), negative_ttl=timedelta(days=7), max_size=100000):
+        self.connect = connect
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()  # username -> (user_id or None, resolved_at)
+        self.lock = threading.Lock()
+        self.schema_checked = False
+        self.hits = 0
+        self.misses = 0
+
+    def ensure_schema(self, connection):
+        if self.schema_checked:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+            SELECT COLUMN_NAME
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE()
+            AND TABLE_NAME = 'user_ids'
+            """)
+            existing_columns = {row[0] for row in cursor.fetchall()}
+            if 'status' not in existing_columns:
+                cursor.execute(f"ALTER TABLE user_ids ADD COLUMN status VARCHAR(16) NOT NULL DEFAULT '{FOUND}'")
+                logger.info("Added status column to user_ids table")
+            if 'resolved_at' not in existing_columns:
+                cursor.execute("ALTER TABLE user_ids ADD COLUMN resolved_at DATETIME NULL")
+                logger.info("Added resolved_at column to user_ids table")
+            self.schema_checked = True
+        finally:
+            cursor.close()
+
+    def _is_fresh(self, user_id, resolved_at, now):
+        if resolved_at is None:
+            return user_id is not None
+        return now - resolved_at <= (self.ttl if user_id is not None else self.negative_ttl)
+
+    def _remember(self, username, user_id, resolved_at):
+        self.entries[username] = (user_id, resolved_at)
+        self.entries.move_to_end(username)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def lookup(self, usernames):
+        """Resolve what the cache knows.
+
+        Returns (found, not_found, unknown): a dict of username -> user_id, the
+        usernames known not to exist, and the usernames that still need a fetch.
+        """
+        now = datetime.now()
+        found = {}
+        not_found = set()
+        pending = []
+        with self.lock:
+            for username in dict.fromkeys(usernames):
+                entry = self.entries.get(username)
+                if entry is not None and self._is_fresh(entry[0], entry[1], now):
+                    self.entries.move_to_end(username)
+                    if entry[0] is None:
+                        not_found.add(username)
+                    else:
+                        found[username] = entry[0]
+                else:
+                    pending.append(username)
+
+        if pending:
+            for username, user_id, resolved_at in self._load(pending):
+                with self.lock:
+                    self._remember(username, user_id, resolved_at)
+                if not self._is_fresh(user_id, resolved_at, now):
+                    continue
+                if user_id is None:
+                    not_found.add(username)
+                else:
+                    found[username] = user_id
+
+        unknown = [username for username in pending if username not in found and username not in not_found]
+        with self.lock:
+            self.hits += len(found) + len(not_found)
+            self.misses += len(unknown)
+        return found, not_found, unknown
+
+    def _load(self, usernames):
+        if not self.schema_checked:
+            connection = None
+            try:
+                connection = self.connect()
+                self.ensure_schema(connection)
+            except Error as e:
+                logger.error("Error checking user_ids table schema: %s", e)
+            finally:
+                if connection:
+                    connection.close()
+        try:
+            return bulk_lookup(self.connect, 'user_ids', 'username', usernames, ('username', 'user_id', 'resolved_at'))
+        except Error as e:
+            logger.error("Error loading cached user IDs: %s", e)
+            return []
+
+    def rows(self, results, csv_filename):
+        """Turn (username, user_id or None) pairs into user_ids rows stamped with the current time."""
+        resolved_at = datetime.now().replace(microsecond=0)
+        return [
+            (username, user_id, csv_filename, FOUND if user_id is not None else NOT_FOUND, resolved_at)
+            for username, user_id in results
+        ]
+
+    def store(self, connection, rows):
+        """Upsert rows built by rows() and remember them in-process."""
+        self.ensure_schema(connection)
+        bulk_upsert(connection, 'user_ids', USER_ID_COLUMNS, rows, update_columns=('user_id', 'status', 'resolved_at'))
+        with self.lock:
+            for username, user_id, _, _, resolved_at in rows:
+                self._remember(username, user_id, resolved_at)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries),
+                'max_size': self.max_size
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_user_id_cache():
+    """The process-wide cache, so every entry point shares one LRU."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UserIdCache()
+    return _cache
@@ -0,0 +1,254 @@
+import os
+import socket
+import threading
+import logging
+import concurrent.futures
+from mysql.connector import Error
+from db_utils import get_database_connection, bulk_upsert
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+class WorkQueue:
+    """Campaign work shared by scraper processes through the scrape_jobs table.
+
+    Every worker may enqueue the same items; existing jobs keep their status, so
+    finished work is never handed out again. claim() leases pending jobs, and
+    jobs whose lease expired (a worker died), with SELECT ... FOR UPDATE SKIP
+    LOCKED, so concurrent workers never claim the same row. A heartbeat thread
+    extends the leases this worker holds until each job is completed, failed or
+    released. A job released max_attempts times is marked failed.
+    """
+
+    def __init__(self, kind, campaign, connect=get_database_connection, worker_id=None, lease_seconds=600,
+                 heartbeat_interval=60, max_attempts=3):
+        self.kind = kind
+        self.campaign = campaign
+        self.connect = connect
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.max_attempts = max_attempts
+        self.leases = {}  # item -> job id, for every job this worker holds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.claimed = 0
+        self.completed = 0
+        self.failed = 0
+        self.released = 0
+        self.ensure_schema()
+        self.thread = threading.Thread(target=self._heartbeat, name=f"{kind}-work-queue-heartbeat", daemon=True)
+        self.thread.start()
+
+    def _execute(self, query, params):
+        connection = None
+        try:
+            connection = self.connect()
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            connection.commit()
+            updated = cursor.rowcount
+            cursor.close()
+            return updated
+        finally:
+            if connection:
+                connection.close()
+
+    def ensure_schema(self):
+        self._execute("""
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(32) NOT NULL,
+            campaign VARCHAR(255) NOT NULL,
+            item VARCHAR(255) NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'pending',
+            worker_id VARCHAR(255) NULL,
+            lease_expires_at DATETIME NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            last_error TEXT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_job (kind, campaign, item),
+            KEY claimable_jobs (kind, campaign, status, lease_expires_at)
+        )
+        """, ())
+
+    def enqueue(self, items):
+        """Add items as pending jobs; items that already have a job are left as they are."""
+        rows = [(self.kind, self.campaign, str(item)) for item in dict.fromkeys(items)]
+        if not rows:
+            return 0
+        connection = None
+        try:
+            connection = self.connect()
+            # item = VALUES(item) is a no-op update, so duplicates keep their status
+            bulk_upsert(connection, 'scrape_jobs', ('kind', 'campaign', 'item'), rows, update_columns=('item',))
+        finally:
+            if connection:
+                connection.close()
+        logger.info("Enqueued %s %s jobs for campaign %s", len(rows), self.kind, self.campaign)
+        return len(rows)
+
+    def claim(self, limit):
+        """Lease up to limit claimable jobs to this worker and return their items."""
+        if limit <= 0:
+            return []
+        connection = None
+        try:
+            connection = self.connect()
+            connection.start_transaction()
+            cursor = connection.cursor()
+            cursor.execute("""
+            SELECT id, item FROM scrape_jobs
+            WHERE kind = %s AND campaign = %s
+            AND (status = %s OR (status = %s AND lease_expires_at < NOW()))
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+            """, (self.kind, self.campaign, PENDING, LEASED, limit))
+            jobs = cursor.fetchall()
+            if jobs:
+                placeholders = ', '.join(['%s'] * len(jobs))
+                cursor.execute(f"""
+                UPDATE scrape_jobs
+                SET status = %s, worker_id = %s, attempts = attempts + 1,
+                    lease_expires_at = NOW() + INTERVAL %s SECOND
+                WHERE id IN ({placeholders})
+                """, (LEASED, self.worker_id, self.lease_seconds, *(job_id for job_id, _ in jobs)))
+            connection.commit()
+            cursor.close()
+        except Error as e:
+            logger.error("Error claiming %s jobs for campaign %s: %s", self.kind, self.campaign, e)
+            if connection and connection.is_connected():
+                connection.rollback()
+            return []
+        finally:
+            if connection:
+                connection.close()
+
+        with self.lock:
+            for job_id, item in jobs:
+                self.leases[item] = job_id
+            self.claimed += len(jobs)
+        return [item for _, item in jobs]
+
+    def _finish(self, items, assignments, params, label):
+        with self.lock:
+            job_ids = [self.leases.pop(str(item)) for item in items if str(item) in self.leases]
+        if not job_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(job_ids))
+        try:
+            # The worker_id check drops updates for leases that expired and went to another worker
+            return self._execute(f"""
+            UPDATE scrape_jobs
+            SET {assignments}, worker_id = NULL, lease_expires_at = NULL
+            WHERE id IN ({placeholders}) AND worker_id = %s
+            """, (*params, *job_ids, self.worker_id))
+        except Error as e:
+            logger.error("Error marking %s %s jobs as %s: %s", len(job_ids), self.kind, label, e)
+            return 0
+
+    def complete(self, items):
+        updated = self._finish(items, "status = %s", (DONE,), DONE)
+        with self.lock:
+            self.completed += updated
+        return updated
+
+    def fail(self, items, error=None):
+        updated = self._finish(items, "status = %s, last_error = %s", (FAILED, error), FAILED)
+        with self.lock:
+            self.failed += updated
+        return updated
+
+    def release(self, items, error=None, attempted=True):
+        """Hand jobs back for another attempt, by any worker, unless they are out of attempts.
+
+        With attempted=False the claim is undone without using up an attempt.
+        """
+        if attempted:
+            updated = self._finish(
+                items, "status = IF(attempts >= %s, %s, %s), last_error = %s",
+                (self.max_attempts, FAILED, PENDING, error), "released"
+            )
+        else:
+            updated = self._finish(items, "status = %s, attempts = attempts - 1", (PENDING,), "released")
+        with self.lock:
+            self.released += updated
+        return updated
+
+    def heartbeat(self):
+        with self.lock:
+            job_ids = list(self.leases.values())
+        if not job_ids:
+            return 0
+        placeholders = ', '.join(['%s'] * len(job_ids))
+        return self._execute(f"""
+        UPDATE scrape_jobs
+        SET lease_expires_at = NOW() + INTERVAL %s SECOND
+        WHERE id IN ({placeholders}) AND worker_id = %s AND status = %s
+        """, (self.lease_seconds, *job_ids, self.worker_id, LEASED))
+
+    def _heartbeat(self):
+        while not self.stop_event.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+            except Error as e:
+                logger.error("Error extending %s job leases: %s", self.kind, e)
+
+    def run(self, executor, fn, max_in_flight):
+        """Claim jobs and run fn(item) on executor until no claimable job is left.
+
+        At most max_in_flight jobs are in progress; more are claimed once half of
+        them have finished. Yields each finished future. fn is responsible for
+        calling complete(), fail() or release() once the item's outcome is durable.
+        """
+        futures = set()
+        while True:
+            if len(futures) <= max_in_flight // 2:
+                futures.update(executor.submit(fn, item) for item in self.claim(max_in_flight - len(futures)))
+            if not futures:
+                return
+            done, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            yield from done
+
+    def counts(self):
+        """Job count per status for this campaign, across all workers."""
+        connection = None
+        try:
+            connection = self.connect()
+            cursor = connection.cursor()
+            cursor.execute("""
+            SELECT status, COUNT(*) FROM scrape_jobs
+            WHERE kind = %s AND campaign = %s
+            GROUP BY status
+            """, (self.kind, self.campaign))
+            counts = dict(cursor.fetchall())
+            cursor.close()
+            return counts
+        finally:
+            if connection:
+                connection.close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'held': len(self.leases),
+                'claimed': self.claimed,
+                'completed': self.completed,
+                'failed': self.failed,
+                'released': self.released
+            }
+
+    def close(self):
+        """Stop the heartbeat and hand back every job this worker still holds."""
+        self.stop_event.set()
+        self.thread.join()
+        with self.lock:
+            held = list(self.leases)
+        if held:
+            self.release(held, attempted=False)
+        logger.info("Work queue %s/%s closed for worker %s: %s", self.kind, self.campaign, self.worker_id, self.stats())
@@ -0,0 +1,156 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_FLUSH = object()
+_STOP = object()
+
+class WriteBehindError(RuntimeError):
+    """A batch handed to flush_fn failed, so not everything queued has been written."""
+
+class WriteBehindQueue:
+    """Bounded queue drained by a background thread that hands batches to flush_fn.
+
+    put() blocks while the queue is full, so a slow database pushes back on the
+    fetching threads instead of letting memory grow. A batch is flushed when it
+    reaches batch_size, when flush_interval seconds have passed, when flush() or
+    close() is called, or as soon as stop_event is set.
+
+    A batch whose flush_fn raises is dropped and counted in items_failed. From
+    then on flush() raises WriteBehindError, so callers never checkpoint past
+    data that was lost.
+    """
+
+    def __init__(self, flush_fn, name="writer", max_queue_size=10000, batch_size=500, flush_interval=2.0, stop_event=None):
+        self.flush_fn = flush_fn
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stop_event = stop_event
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.stats_lock = threading.Lock()
+        self.closed = False
+        self.items_enqueued = 0
+        self.items_flushed = 0
+        self.items_failed = 0
+        self.last_error = None
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+        self.thread = threading.Thread(target=self._run, name=f"{name}-write-behind", daemon=True)
+        self.thread.start()
+
+    def put(self, item, timeout=None):
+        if self.closed:
+            raise RuntimeError(f"Write-behind queue '{self.name}' is closed")
+        self.queue.put(item, timeout=timeout)
+        with self.stats_lock:
+            self.items_enqueued += 1
+
+    def put_many(self, items, timeout=None):
+        for item in items:
+            self.put(item, timeout=timeout)
+
+    def flush(self):
+        """Block until everything queued so far has been handed to flush_fn.
+
+        Raises WriteBehindError if any batch has failed, now or earlier.
+        """
+        if not self.closed:
+            self.queue.put(_FLUSH)
+            self.queue.join()
+        with self.stats_lock:
+            error, items_failed = self.last_error, self.items_failed
+        if error is not None:
+            raise WriteBehindError(f"Write-behind queue '{self.name}' failed to write {items_failed} items") from error
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.put(_STOP)
+        self.thread.join()
+        logger.info("Write-behind queue '%s' closed: %s", self.name, self.stats())
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'queue_depth': self.queue.qsize(),
+                'items_enqueued': self.items_enqueued,
+                'items_flushed': self.items_flushed,
+                'items_failed': self.items_failed,
+                'flush_count': self.flush_count,
+                'flush_errors': self.flush_errors,
+                'last_flush_latency': self.last_flush_latency,
+                'avg_flush_latency': self.total_flush_latency / self.flush_count if self.flush_count else 0.0,
+                'max_flush_latency': self.max_flush_latency
+            }
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        stopping = False
+        while not stopping:
+            flush_requests = 0
+            try:
+                item = self.queue.get(timeout=max(0.0, min(deadline - time.monotonic(), 1.0)))
+                # Drain whatever is already waiting so a busy queue flushes full batches
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                    elif item is _FLUSH:
+                        flush_requests += 1
+                    else:
+                        batch.append(item)
+                    if stopping or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self.queue.get_nowait()
+                    except queue.Empty:
+                        break
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            stop_requested = self.stop_event is not None and self.stop_event.is_set()
+            if batch and (len(batch) >= self.batch_size or now >= deadline or flush_requests or stopping or stop_requested):
+                self._flush(batch)
+                batch = []
+            if now >= deadline:
+                deadline = now + self.flush_interval
+            self._mark_done(flush_requests, stopping)
+
+    def _flush(self, batch):
+        start = time.monotonic()
+        error = None
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            logger.error("Write-behind queue '%s' failed to flush %s items: %s", self.name, len(batch), e)
+            error = e
+        latency = time.monotonic() - start
+        with self.stats_lock:
+            if error is None:
+                self.items_flushed += len(batch)
+            else:
+                self.items_failed += len(batch)
+                self.flush_errors += 1
+                self.last_error = error
+            self.flush_count += 1
+            self.last_flush_latency = latency
+            self.total_flush_latency += latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+        for _ in batch:
+            self.queue.task_done()
+
+    def _mark_done(self, flush_requests, stopping):
+        # Sentinels count as queue tasks too; release them once the batch they ended is handled
+        for _ in range(flush_requests):
+            self.queue.task_done()
+        if stopping:
+            self.queue.task_done()